@@ -0,0 +1,66 @@
+# synthetic corpus of repositories
+import os
+import random
+
+# Words used to build the function names of the corpus
+VOCABULARY = ('get', 'set', 'name', 'value', 'to', 'string', 'init', 'test', 'load', 'save', 'update', 'create',
+              'delete', 'find', 'parse', 'read', 'write', 'build', 'run', 'start', 'stop', 'add', 'remove', 'check')
+# Default seed of the random generator, the same seed generates the same corpus
+SEED = 42
+# Shapes of the repositories: files in each folder, depth of the folders and functions in each file
+SHAPES = {
+    'default': {'files_per_folder': 100, 'depth': 1, 'functions_per_file': 5},
+    'flat': {'files_per_folder': 100000, 'depth': 1, 'functions_per_file': 5},
+    'deep': {'files_per_folder': 10, 'depth': 8, 'functions_per_file': 5},
+    'large_files': {'files_per_folder': 100, 'depth': 1, 'functions_per_file': 200},
+}
+
+
+def generate_repository(repository_folder_path, language, files, files_per_folder=100, functions_per_file=5, seed=SEED, depth=1):
+    """
+    Generate a synthetic repository with Python or Java source files
+    :param repository_folder_path: path to the repository folder
+    :param language: language of the files, python or java
+    :param files: number of source files
+    :param files_per_folder: number of files in each folder
+    :param functions_per_file: number of functions or methods in each file
+    :param seed: seed of the random generator
+    :param depth: number of nested folders above each file
+    :return: number of function names written
+    """
+    generator = random.Random(seed)
+    functions = 0
+    for index in range(files):
+        folder = os.path.join(repository_folder_path, f'package_{index // files_per_folder}', *(f'level_{level}' for level in range(1, depth)))
+        if index % files_per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        # every name has between one and three words of the vocabulary
+        names = [[generator.choice(VOCABULARY) for _ in range(generator.randint(1, 3))] for _ in range(functions_per_file)]
+        match language:
+            case 'python':
+                path = os.path.join(folder, f'module_{index}.py')
+                source = ''.join(f'def {"_".join(words)}(self):\n    return {i}\n\n\n' for i, words in enumerate(names))
+            case 'java':
+                path = os.path.join(folder, f'Class{index}.java')
+                methods = ''.join(f'    public int {words[0]}{"".join(w.capitalize() for w in words[1:])}() {{ return {i}; }}\n'
+                                  for i, words in enumerate(names))
+                source = f'package p{index // files_per_folder};\n\npublic class Class{index} {{\n{methods}}}\n'
+            case _:
+                raise ValueError(f'Unknown language: {language}')
+        with open(path, 'w', encoding='utf-8') as source_file:
+            source_file.write(source)
+        functions += len(names)
+    return functions
+
+
+def generate_repository_with_shape(repository_folder_path, language, files, shape='default', seed=SEED):
+    """
+    Generate a synthetic repository with one of the shapes of SHAPES
+    :param repository_folder_path: path to the repository folder
+    :param language: language of the files, python or java
+    :param files: number of source files
+    :param shape: name of the shape
+    :param seed: seed of the random generator
+    :return: number of function names written
+    """
+    return generate_repository(repository_folder_path, language, files, seed=seed, **SHAPES[shape])
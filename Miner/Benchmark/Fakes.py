@@ -0,0 +1,355 @@
+# in-memory stand-in of the Firestore client
+import uuid
+import random
+import threading
+import collections
+from datetime import datetime, timedelta, timezone
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, InvalidArgument, NotFound, ServiceUnavailable
+
+# Maximum number of operations in a batch, as in Firestore
+BATCH_LIMIT = 500
+
+
+class FakeFirestore:
+    """
+    In-memory database with the subset of the Firestore client used by the miner:
+    collections and subcollections, collection groups, documents, creates, batches, get_all, projections, ordered queries and
+    preconditions. Every read and write is counted in statistics, and the writes of each document in document_writes.
+    Batch commits can be made to fail, before any of their writes is applied.
+    """
+
+    def __init__(self, failure_rate=0.0, seed=0):
+        """
+        :param failure_rate: probability of failure of a batch commit
+        :param seed: seed of the failures
+        """
+        # number of the next batch commits that fail
+        self.failures = 0
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        # document path -> (fields, update time)
+        self.documents = {}
+        # reads, writes, commits and queries
+        self.statistics = collections.Counter()
+        # document path -> number of writes
+        self.document_writes = collections.Counter()
+        self.lock = threading.Lock()
+        self._clock = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def collection(self, name):
+        """
+        :param name: name of the collection
+        :return: collection reference
+        """
+        return FakeCollection(self, name)
+
+    def collection_group(self, name):
+        """
+        :param name: id of the collections
+        :return: query of the documents of every collection with this id
+        """
+        return FakeQuery(self, name, group=True)
+
+    def batch(self):
+        """
+        :return: empty batch
+        """
+        return FakeBatch(self)
+
+    def get_all(self, references, field_paths=None):
+        """
+        Read several documents, one read is counted for each of them
+        :param references: document references
+        :param field_paths: fields of the projection, every field by default
+        :return: generator of snapshots
+        """
+        for reference in list(references):
+            yield reference.get(field_paths)
+
+    def write_option(self, last_update_time=None, exists=None):
+        """
+        :param last_update_time: update time the document must have for the write to succeed
+        :param exists: whether the document must exist for the write to succeed
+        :return: precondition of a write
+        """
+        return FakeWriteOption(last_update_time, exists)
+
+    def fail_commit(self):
+        """
+        Draw the failure of a batch commit
+        :return: True if the commit fails
+        """
+        with self.lock:
+            failed = self.failures > 0 or self.random.random() < self.failure_rate
+            if self.failures > 0:
+                self.failures -= 1
+            if failed:
+                self.statistics['failed_commits'] += 1
+        return failed
+
+    def snapshot(self, path, field_paths=None):
+        """
+        Read a document without counting it
+        :param path: path of the document
+        :param field_paths: fields of the projection
+        :return: snapshot
+        """
+        with self.lock:
+            fields, update_time = self.documents.get(path, (None, None))
+            if fields is not None:
+                fields = dict(fields) if field_paths is None else {k: fields[k] for k in field_paths if k in fields}
+        return FakeSnapshot(FakeDocumentReference(self, path), fields, update_time)
+
+    def apply(self, writes):
+        """
+        Apply writes atomically, all of them fail when a precondition fails
+        :param writes: list of tuples (kind, path, fields, merge, option)
+        :return: update time of the writes
+        """
+        with self.lock:
+            for kind, path, _, _, option in writes:
+                if option is not None:
+                    option.check(path, self.documents.get(path))
+                elif kind == 'update' and path not in self.documents:
+                    raise NotFound(f'No document to update: {path}')
+                if kind == 'create' and path in self.documents:
+                    raise AlreadyExists(f'Document already exists: {path}')
+            self._clock += timedelta(microseconds=1)
+            for kind, path, fields, merge, _ in writes:
+                self.statistics['writes'] += 1
+                self.document_writes[path] += 1
+                if kind == 'delete':
+                    self.documents.pop(path, None)
+                    continue
+                current = dict(self.documents[path][0]) if path in self.documents and (merge or kind == 'update') else {}
+                for field, value in fields.items():
+                    current[field] = resolve(value, current.get(field), self._clock)
+                self.documents[path] = (current, self._clock)
+            return self._clock
+
+
+def resolve(value, current, now):
+    """
+    Resolve the transforms of a written value: the increments and the server timestamp of the client
+    :param value: written value
+    :param current: current value of the field
+    :param now: time of the write
+    :return: stored value
+    """
+    if isinstance(value, firestore.Increment):
+        return (current or 0) + value.value
+    if value is firestore.SERVER_TIMESTAMP:
+        return now
+    return value
+
+
+class FakeWriteOption:
+    """
+    Precondition of a write
+    """
+
+    def __init__(self, last_update_time, exists):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+    def check(self, path, document):
+        """
+        :param path: path of the written document
+        :param document: tuple (fields, update time) of the document, None if it does not exist
+        :return: None
+        """
+        if self.exists is not None and self.exists != (document is not None):
+            raise FailedPrecondition(f'Document existence precondition failed: {path}')
+        if self.last_update_time is not None and (document is None or document[1] != self.last_update_time):
+            raise FailedPrecondition(f'Document update time precondition failed: {path}')
+
+
+class FakeQuery:
+    """
+    Query of a collection, or of a collection group, with an optional projection, order and limit
+    """
+
+    def __init__(self, database, path, field_paths=None, order=None, limit=None, group=False):
+        self.database = database
+        self.path = path
+        self.field_paths = field_paths
+        self.order = order
+        self.count = limit
+        # the path of a collection group is the id of its collections
+        self.group = group
+
+    def select(self, field_paths):
+        return FakeQuery(self.database, self.path, list(field_paths), self.order, self.count, self.group)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return FakeQuery(self.database, self.path, self.field_paths, (field, direction), self.count, self.group)
+
+    def limit(self, count):
+        return FakeQuery(self.database, self.path, self.field_paths, self.order, count, self.group)
+
+    def contains(self, path):
+        """
+        :param path: path of a document
+        :return: True if the document is in the collection, or in a collection of the group
+        """
+        if self.group:
+            parts = path.split('/')
+            return len(parts) >= 2 and parts[-2] == self.path
+        prefix = f'{self.path}/'
+        return path.startswith(prefix) and '/' not in path[len(prefix):]
+
+    def stream(self):
+        """
+        Run the query, one read is counted for each document returned
+        :return: generator of snapshots
+        """
+        with self.database.lock:
+            self.database.statistics['queries'] += 1
+            documents = [(path, fields, update_time) for path, (fields, update_time) in self.database.documents.items()
+                         if self.contains(path)]
+        if self.order is not None:
+            field, direction = self.order
+            # like Firestore, the documents without the field are not returned by an ordered query
+            documents = [document for document in documents if field in document[1]]
+            documents.sort(key=lambda document: document[1][field], reverse=direction == 'DESCENDING')
+        if self.count is not None:
+            documents = documents[:self.count]
+        for path, fields, update_time in documents:
+            with self.database.lock:
+                self.database.statistics['reads'] += 1
+            if self.field_paths is not None:
+                fields = {k: fields[k] for k in self.field_paths if k in fields}
+            yield FakeSnapshot(FakeDocumentReference(self.database, path), dict(fields), update_time)
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    """
+    Collection reference
+    """
+
+    def __init__(self, database, path):
+        super().__init__(database, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self):
+        """
+        :return: document reference of a subcollection, None for a collection
+        """
+        return FakeDocumentReference(self.database, self.path.rsplit('/', 1)[0]) if '/' in self.path else None
+
+    def document(self, document_id=None):
+        """
+        :param document_id: id of the document, a new random id by default
+        :return: document reference
+        """
+        if document_id is None:
+            # like Firestore, the new ids of every client are unique
+            document_id = uuid.uuid4().hex[:20]
+        return FakeDocumentReference(self.database, f'{self.path}/{document_id}')
+
+
+class FakeDocumentReference:
+    """
+    Document reference
+    """
+
+    def __init__(self, database, path):
+        self.database = database
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self):
+        return FakeCollection(self.database, self.path.rsplit('/', 1)[0])
+
+    def collection(self, name):
+        return FakeCollection(self.database, f'{self.path}/{name}')
+
+    def get(self, field_paths=None):
+        with self.database.lock:
+            self.database.statistics['reads'] += 1
+        return self.database.snapshot(self.path, field_paths)
+
+    def set(self, fields, merge=False):
+        return FakeWriteResult(self.database.apply([('set', self.path, fields, merge, None)]))
+
+    def create(self, fields):
+        return FakeWriteResult(self.database.apply([('create', self.path, fields, False, None)]))
+
+    def update(self, fields, option=None):
+        return FakeWriteResult(self.database.apply([('update', self.path, fields, True, option)]))
+
+    def delete(self, option=None):
+        return FakeWriteResult(self.database.apply([('delete', self.path, None, False, option)]))
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+class FakeWriteResult:
+    """
+    Result of a write
+    """
+
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class FakeSnapshot:
+    """
+    Snapshot of a document
+    """
+
+    def __init__(self, reference, fields, update_time):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = fields is not None
+        self.update_time = update_time
+        self._fields = fields
+
+    def to_dict(self):
+        return dict(self._fields) if self.exists else None
+
+    def get(self, field):
+        return self._fields[field]
+
+
+class FakeBatch:
+    """
+    Batch of writes applied atomically by commit
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.writes = []
+
+    def set(self, reference, fields, merge=False):
+        self.writes.append(('set', reference.path, fields, merge, None))
+
+    def create(self, reference, fields):
+        self.writes.append(('create', reference.path, fields, False, None))
+
+    def update(self, reference, fields, option=None):
+        self.writes.append(('update', reference.path, fields, True, option))
+
+    def delete(self, reference, option=None):
+        self.writes.append(('delete', reference.path, None, False, option))
+
+    def commit(self):
+        if len(self.writes) > BATCH_LIMIT:
+            raise InvalidArgument(f'Maximum {BATCH_LIMIT} writes allowed per request')
+        if self.database.fail_commit():
+            raise ServiceUnavailable('Commit failed')
+        with self.database.lock:
+            self.database.statistics['commits'] += 1
+        update_time = self.database.apply(self.writes)
+        self.writes = []
+        return update_time
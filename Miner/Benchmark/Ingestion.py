@@ -0,0 +1,176 @@
+# benchmark of the ingestion modes: git clones against streamed source archives
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import collections
+from time import perf_counter
+from Inspector import Cache
+from Inspector import Extractor
+from Inspector import Parser
+from Benchmark import Corpus
+from Benchmark import Stubs
+
+# Seconds between two samples of the used bytes of the file system
+SAMPLE_SECONDS = 0.005
+
+
+class DiskMonitor:
+    """
+    Sample the used bytes of the file system of a folder in a background thread while a repository is ingested.
+    The bytes written to disk are the peak of the used bytes above their value at the start, so the files written and
+    deleted during the ingestion are counted too.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: folder on the file system of the clones and of the temporary files
+        """
+        self.path = path
+        self.baseline = 0
+        self.peak = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """
+        Record the used bytes of the file system
+        :return: None
+        """
+        self.peak = max(self.peak, shutil.disk_usage(self.path).used - self.baseline)
+
+    def run(self):
+        while not self._stopped.wait(SAMPLE_SECONDS):
+            self.sample()
+
+    def __enter__(self):
+        self.baseline = shutil.disk_usage(self.path).used
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exception):
+        self._stopped.set()
+        self._thread.join()
+        self.sample()
+
+
+def create_repositories(working_folder, language, repositories, files):
+    """
+    Generate synthetic repositories and commit each of them in a local git repository
+    :param working_folder: folder where the repositories are generated
+    :param language: language of the repositories
+    :param repositories: number of repositories
+    :param files: number of files of each repository
+    :return: dictionary full name -> path of the repository
+    """
+    paths = {}
+    for index in range(repositories):
+        full_name = f'benchmark/repository{index}'
+        # the clone url of a repository is GITHUB_URL/full_name.git
+        path = os.path.join(working_folder, 'github', f'{full_name}.git')
+        Corpus.generate_repository(path, language, files, seed=Corpus.SEED + index)
+        for command in (['init', '-q'], ['add', '-A'],
+                        ['-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost', 'commit', '-q', '-m', 'corpus']):
+            subprocess.run(['git', *command], cwd=path, check=True, stdout=subprocess.DEVNULL)
+        paths[full_name] = path
+    return paths
+
+
+def benchmark_clone(paths, language, clone_mode, working_folder):
+    """
+    Clone, parse and delete each repository like a consumer does
+    :param paths: dictionary full name -> path of the repository
+    :param language: language of the repositories
+    :param clone_mode: clone mode, full or shallow
+    :param working_folder: folder of the clones
+    :return: dictionary with the results of the clone mode
+    """
+    Extractor.GITHUB_URL = f'file://{os.path.join(working_folder, "github")}'
+    Extractor.CLONING_REPO_PATH = os.path.join(working_folder, 'tmp')
+    words = collections.Counter()
+    disk_bytes = 0
+    start = perf_counter()
+    for full_name in paths:
+        # the clone, with its git objects, is on disk until it is deleted
+        with DiskMonitor(working_folder) as monitor:
+            path = Extractor.clone_repository(full_name, language, clone_mode)
+            words.update(Parser.parse_repository_given_language(path, language, 'javalang'))
+        disk_bytes += monitor.peak
+        shutil.rmtree(path)
+    seconds = perf_counter() - start
+    return result(len(paths), seconds, disk_bytes, words)
+
+
+def benchmark_archive(paths, language, working_folder):
+    """
+    Stream and parse the archive of each repository like a consumer does
+    :param paths: dictionary full name -> path of the repository
+    :param language: language of the repositories
+    :param working_folder: folder on the file system watched for the bytes written
+    :return: dictionary with the results of the archive mode
+    """
+    stub = Stubs.ArchiveStub().start()
+    try:
+        for full_name, path in paths.items():
+            stub.add_repository(full_name, path)
+            # the archives are built before the measure, GitHub serves them ready
+            stub.archive(full_name)
+        Extractor.GITHUB_URL = stub.url
+        words = collections.Counter()
+        disk_bytes = 0
+        start = perf_counter()
+        for full_name in paths:
+            with DiskMonitor(working_folder) as monitor:
+                words.update(Parser.parse_archive_given_language(Extractor.archive_url(full_name), language, 'javalang'))
+            disk_bytes += monitor.peak
+        seconds = perf_counter() - start
+    finally:
+        stub.stop()
+    return result(len(paths), seconds, disk_bytes, words)
+
+
+def result(repositories, seconds, disk_bytes, words):
+    """
+    :param repositories: number of repositories
+    :param seconds: total seconds
+    :param disk_bytes: bytes written to disk, measured on the file system
+    :param words: counter of the words
+    :return: dictionary with the results of a mode
+    """
+    return {
+        'seconds': seconds,
+        'repositories_per_second': repositories / seconds if seconds > 0 else 0.0,
+        'disk_bytes_written': disk_bytes,
+        'disk_bytes_per_repository': disk_bytes / repositories,
+        'words': sum(words.values()),
+    }
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Throughput and disk bytes of the git clones and the streamed source archives')
+    parser.add_argument('-r', '--repositories', required=False, help='Number of repositories', type=int, default=10)
+    parser.add_argument('-f', '--files', required=False, help='Number of files of each repository', type=int, default=500)
+    parser.add_argument('-l', '--language', required=False, help='Language of the repositories', type=str, default='python', choices=('python', 'java'))
+    args = parser.parse_args()
+    # the parse cache would hide the cost of the parse
+    Cache.configure(None)
+    with tempfile.TemporaryDirectory() as working_folder:
+        paths = create_repositories(working_folder, args.language, args.repositories, args.files)
+        results = {mode: benchmark_clone(paths, args.language, mode, working_folder) for mode in ('full', 'shallow')}
+        results['archive'] = benchmark_archive(paths, args.language, working_folder)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
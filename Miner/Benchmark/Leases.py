@@ -0,0 +1,273 @@
+# simulation of a distributed run: several nodes share the ranges and the repositories through leases
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import importlib
+import threading
+import contextlib
+import collections
+from queue import Queue
+from types import SimpleNamespace
+from time import perf_counter, sleep
+from Inspector import Lease
+from Benchmark import Fakes
+from Benchmark import Stubs
+
+# Modules of a node, each node gets its own copy of them like a process of its own
+NODE_MODULES = ('Extractor', 'Journal', 'Leaderboard', 'Lease', 'Registry', 'Sharding', 'Writer')
+# Default number of repositories of each range, all the results of a range are returned by the stub
+REPOSITORIES_PER_RANGE = 100
+# Words of the vocabulary of the simulated repositories, and distinct words of each repository
+VOCABULARY = 300
+REPOSITORY_WORDS = 40
+
+
+def load_node():
+    """
+    Import a fresh copy of the modules of the miner, with their own state
+    :return: namespace with the modules
+    """
+    for name in [name for name in sys.modules if name == 'Inspector' or name.startswith('Inspector.')]:
+        del sys.modules[name]
+    return SimpleNamespace(**{name: importlib.import_module(f'Inspector.{name}') for name in NODE_MODULES})
+
+
+def repository_words(full_name):
+    """
+    Get the simulated word count of a repository, always the same for a name
+    :param full_name: name of the repository including the owner
+    :return: counter of words
+    """
+    generator = random.Random(full_name)
+    return collections.Counter({f'word{generator.randrange(VOCABULARY)}': generator.randint(1, 5) for _ in range(REPOSITORY_WORDS)})
+
+
+class CloneFailures:
+    """
+    Failed clones shared by the nodes: the first clone of a fraction of the repositories fails, whichever node clones it
+    """
+
+    def __init__(self, failure_rate):
+        """
+        :param failure_rate: fraction of the repositories whose first clone fails
+        """
+        self.failure_rate = failure_rate
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    def fail(self, full_name):
+        """
+        :param full_name: name of the repository including the owner
+        :return: True if the clone of the repository fails
+        """
+        with self.lock:
+            if full_name in self.failed or random.Random(f'clone {full_name}').random() >= self.failure_rate:
+                return False
+            self.failed.add(full_name)
+            return True
+
+
+def process_repositories(node, clone_queue, write_queue, repository_seconds, crashed, failures):
+    """
+    Stand-in of the clone workers and the consumers: each repository takes a fixed time
+    :param node: modules of the node
+    :param clone_queue: queue of the repositories claimed by the node
+    :param write_queue: queue of the writer of the node
+    :param repository_seconds: seconds of the work on a repository
+    :param crashed: event set when the node crashes, the repositories are dropped
+    :param failures: failed clones, the repository is given back like a clone worker does
+    :return: None
+    """
+    while (item := clone_queue.get()) is not None:
+        sleep(repository_seconds)
+        if crashed.is_set():
+            continue
+        full_name, language = item
+        if failures.fail(full_name):
+            node.Registry.release_repository(full_name)
+            continue
+        write_queue.put((full_name, language, repository_words(full_name), {'name': full_name, 'language': language}))
+    clone_queue.put(None)
+
+
+def crash(node, crashed, orphans):
+    """
+    Crash a node: its heartbeats stop, it claims, releases and finishes nothing more, and it records its next flush in the journal
+    without applying it; the other nodes reclaim its work once its leases expire
+    :param node: modules of the node
+    :param crashed: event of the crash
+    :param orphans: counter receiving the journal entries left by the node
+    :return: None
+    """
+    crashed.set()
+    node.Lease._stopped.set()
+    node.Lease.claim = lambda kind, key: node.Lease.DONE
+    node.Lease.release = lambda kind, key, done=False: None
+    node.Lease.finish = lambda kind, key, dependencies=(), complete=True: None
+    node.Lease.settle = lambda released, written=False: None
+    node.Lease.finishing = lambda kind: 0
+    node.Lease.unfinished = lambda kind: []
+    node.Journal.recover = lambda database_client, force=False: 0
+    write = node.Journal.write
+
+    def leave_entries(database_client, reference, deltas):
+        orphans['entries'] += 1
+        return 0
+
+    def write_once(database_client, word_deltas, repositories):
+        # the flush is recorded, then the node is gone: its writer drops the rest, the leases of the node expire
+        node.Journal.write = fail
+        node.Lease.lost = lambda kind, keys: list(keys)
+        return write(database_client, word_deltas, repositories)
+
+    def fail(database_client, word_deltas, repositories):
+        raise RuntimeError('node crashed')
+
+    node.Journal.apply_entry = leave_entries
+    node.Journal.write = write_once
+
+
+def run_node(node, ranges, database_client, store, lease_seconds, workers, repository_seconds, crashed, failures, stub_url):
+    """
+    Run the pipeline of a node: the search of the ranges, the simulated work on the repositories and the writer
+    :param node: modules of the node
+    :param ranges: ranges of stars shared by the nodes
+    :param database_client: database client shared by the nodes
+    :param store: store of the leases of the node
+    :param lease_seconds: validity of the leases
+    :param workers: number of threads working on the repositories
+    :param repository_seconds: seconds of the work on a repository
+    :param crashed: event set when the node crashes
+    :param failures: failed clones shared by the nodes
+    :param stub_url: url of the stub of the search API
+    :return: None
+    """
+    node.Extractor.GITHUB_API_URL = stub_url
+    node.Sharding.configure()
+    node.Leaderboard.configure(database_client, 0)
+    node.Lease.configure(store, lease_seconds, 'simulation')
+    node.Journal.recover(database_client, force=True)
+
+    clone_queue = Queue(maxsize=workers)
+    write_queue = Queue()
+    writer = threading.Thread(target=node.Writer.write_words, args=(write_queue, database_client, node.Writer.FLUSH_OPERATIONS, 0.2))
+    threads = [threading.Thread(target=process_repositories, args=(node, clone_queue, write_queue, repository_seconds, crashed, failures))
+               for _ in range(workers)]
+    for thread in [writer, *threads]:
+        thread.start()
+    node.Extractor.mine_gh_api(clone_queue, ranges, database_client)
+    clone_queue.put(None)
+    for thread in threads:
+        thread.join()
+    write_queue.put(None)
+    writer.join()
+    if not crashed.is_set():
+        node.Lease.shutdown()
+
+
+def benchmark_nodes(nodes, ranges, repositories_per_range, workers, repository_seconds, lease_seconds, crash_seconds,
+                    lease_store, working_folder, failure_rate=0.0):
+    """
+    Run nodes at the same time against one in-memory Firestore, then check that every repository is mined and that the
+    words hold the words of each repository exactly once, despite the failed clones and commits
+    :param nodes: number of nodes
+    :param ranges: number of ranges of stars
+    :param repositories_per_range: repositories of each range
+    :param workers: number of threads working on the repositories of each node
+    :param repository_seconds: seconds of the work on a repository
+    :param lease_seconds: validity of the leases
+    :param crash_seconds: seconds after which the last node crashes, None for no crash
+    :param lease_store: store of the leases, one of Lease.LEASE_STORES
+    :param working_folder: folder of the SQLite store
+    :param failure_rate: fraction of the repositories whose first clone fails, and probability of failure of a batch commit
+    :return: dictionary with the results
+    """
+    database_client = Fakes.FakeFirestore(failure_rate)
+    failures = CloneFailures(failure_rate)
+    stub = Stubs.GitHubStub(total_count=lambda query: repositories_per_range, rate_limit=10 ** 6).start()
+    path = os.path.join(working_folder, f'leases{nodes}.sqlite3')
+    crashes = [threading.Event() for _ in range(nodes)]
+    orphans = collections.Counter()
+    threads = []
+    for i in range(nodes):
+        node = load_node()
+        store = node.Lease.FirestoreLeases(database_client) if lease_store == 'firestore' else node.Lease.SqliteLeases(path)
+        threads.append(threading.Thread(target=run_node, args=(node, [f'stars:{j}..{j}' for j in range(ranges)], database_client,
+                                                               store, lease_seconds, workers, repository_seconds, crashes[i], failures,
+                                                               stub.url)))
+        if crash_seconds is not None and nodes > 1 and i == nodes - 1:
+            timer = threading.Timer(crash_seconds, crash, args=(node, crashes[i], orphans))
+            timer.daemon = True
+    start = perf_counter()
+    # the nodes print their progress, stdout is kept for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        for thread in threads:
+            thread.start()
+        if crash_seconds is not None and nodes > 1:
+            timer.start()
+        for thread in threads:
+            thread.join()
+    seconds = perf_counter() - start
+    stub.stop()
+
+    # the totals of the words are in their documents and their shards
+    values = collections.Counter()
+    repositories = []
+    journal = 0
+    for path, (fields, _) in database_client.documents.items():
+        parts = path.split('/')
+        if parts[0] == 'words':
+            values[parts[1]] += fields.get('value', 0)
+        elif parts[0] == 'repos':
+            repositories.append(fields['name'])
+        elif parts[0] == 'journal':
+            journal += 1
+    expected = collections.Counter()
+    for full_name in repositories:
+        expected.update(repository_words(full_name))
+    return {
+        'nodes': nodes,
+        'crashed': crash_seconds is not None and nodes > 1,
+        'seconds': seconds,
+        'repositories': len(repositories),
+        'repositories_per_second': len(repositories) / seconds,
+        'all_mined': len(repositories) == ranges * repositories_per_range,
+        'exactly_once': +values == +expected,
+        'failed_clones': len(failures.failed),
+        'failed_commits': database_client.statistics['failed_commits'],
+        'orphaned_journal_entries': orphans['entries'],
+        'journal_entries_left': journal,
+        'writes': database_client.statistics['writes'],
+    }
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Throughput and exactly-once check of a distributed run with simulated nodes')
+    parser.add_argument('-n', '--nodes', required=False, help='Numbers of nodes to compare', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('-r', '--ranges', required=False, help='Number of ranges of stars', type=int, default=8)
+    parser.add_argument('-p', '--repositories_per_range', required=False, help='Repositories of each range', type=int, default=REPOSITORIES_PER_RANGE)
+    parser.add_argument('-w', '--workers', required=False, help='Threads working on the repositories of each node', type=int, default=4)
+    parser.add_argument('-t', '--repository_seconds', required=False, help='Seconds of the work on a repository', type=float, default=0.02)
+    parser.add_argument('-l', '--lease_seconds', required=False, help='Validity of the leases', type=float, default=2.0)
+    parser.add_argument('-c', '--crash_seconds', required=False, help='Seconds after which the last node of a run crashes', type=float, default=None)
+    parser.add_argument('-s', '--lease_store', required=False, help='Store of the leases', type=str, default='firestore', choices=Lease.LEASE_STORES)
+    parser.add_argument('-f', '--failure_rate', required=False, help='Fraction of the repositories whose first clone fails, and of the batch commits that fail', type=float, default=0.0)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as working_folder:
+        results = [benchmark_nodes(nodes, args.ranges, args.repositories_per_range, args.workers, args.repository_seconds,
+                                   args.lease_seconds, args.crash_seconds, args.lease_store, working_folder, args.failure_rate)
+                   for nodes in args.nodes]
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# differential check and benchmark of the lexer extractors against the full parsers
+import ast
+import sys
+import json
+import argparse
+import sysconfig
+import tempfile
+import collections
+from time import perf_counter
+import javalang
+from Inspector import Lexer
+from Inspector import Parser
+from Benchmark import Corpus
+
+# Languages compared by default
+LANGUAGES = ('python', 'java')
+# Default number of files of the synthetic corpus, when no corpus is given
+FILES = 2000
+# Default maximum number of mismatched files listed in the report
+MISMATCHES_LIMIT = 20
+
+
+def reference_names(source, extension):
+    """
+    Get the function names of a source with the full parser of its extension, the errors are raised
+    :param source: decoded source code
+    :param extension: extension of the source
+    :return: list of function names
+    """
+    if extension == '.py':
+        return [node.name for node in ast.walk(ast.parse(source)) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    return [node.name for _, node in javalang.parse.parse(source).filter(javalang.tree.MethodDeclaration)]
+
+
+def lexer_names(source, extension):
+    """
+    Get the function names of a source with the lexer of its extension
+    :param source: decoded source code
+    :param extension: extension of the source
+    :return: list of function names, Lexer.AmbiguousSource is raised when the full parser is needed
+    """
+    if extension == '.py':
+        return Lexer.python_function_names(source)
+    return Lexer.java_method_names(source)
+
+
+def differential_report(files, extension, mismatches_limit=MISMATCHES_LIMIT):
+    """
+    Extract the function names of files with the full parser and with the lexer, and compare them.
+    The files the full parser rejects are counted apart: the full backend finds no function in them.
+    :param files: paths of the files
+    :param extension: extension of the files
+    :param mismatches_limit: maximum number of mismatched files listed
+    :return: dictionary with the results
+    """
+    results = collections.Counter()
+    mismatches = []
+    reference_seconds = lexer_seconds = 0.0
+    for file in files:
+        try:
+            with open(file, 'rb') as source_file:
+                source = Parser.decode_source(source_file.read())
+        except (OSError, UnicodeDecodeError):
+            results['unreadable'] += 1
+            continue
+        results['files'] += 1
+
+        start = perf_counter()
+        try:
+            reference = reference_names(source, extension)
+        except Exception:
+            reference = None
+        elapsed = perf_counter() - start
+        reference_seconds += elapsed
+
+        start = perf_counter()
+        try:
+            names = lexer_names(source, extension)
+        except Lexer.AmbiguousSource:
+            names = None
+        lexer_seconds += perf_counter() - start
+
+        if names is None:
+            # the fallback of the lexer backend is the full parser
+            results['ambiguous'] += 1
+            lexer_seconds += elapsed
+            continue
+        if reference is None:
+            results['rejected_by_reference'] += 1
+            continue
+        if collections.Counter(names) != collections.Counter(reference):
+            results['mismatched'] += 1
+            if len(mismatches) < mismatches_limit:
+                mismatches.append({'file': file,
+                                   'missing': sorted((collections.Counter(reference) - collections.Counter(names)).elements()),
+                                   'extra': sorted((collections.Counter(names) - collections.Counter(reference)).elements())})
+    return {
+        **{key: results[key] for key in ('files', 'unreadable', 'ambiguous', 'rejected_by_reference', 'mismatched')},
+        'reference_seconds': reference_seconds,
+        'lexer_seconds': lexer_seconds,
+        'speedup': reference_seconds / lexer_seconds if lexer_seconds > 0 else 0.0,
+        'mismatches': mismatches,
+    }
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Differential check and benchmark of the lexer extractors against the full parsers')
+    parser.add_argument('corpus', nargs='?', default=None,
+                        help='Folder with the source files, by default the standard library for python and a synthetic corpus for java')
+    parser.add_argument('-l', '--languages', required=False, help='Languages to compare', nargs='+', default=list(LANGUAGES), choices=LANGUAGES)
+    parser.add_argument('-f', '--files', required=False, help='Number of files of the synthetic corpus', type=int, default=FILES)
+    parser.add_argument('-m', '--mismatches', required=False, help='Maximum number of mismatched files listed', type=int, default=MISMATCHES_LIMIT)
+    args = parser.parse_args()
+
+    results = {}
+    for language in args.languages:
+        extension = Parser.LANGUAGE_EXTENSIONS[language]
+        with tempfile.TemporaryDirectory() as working_folder:
+            corpus = args.corpus
+            if corpus is None and language == 'python':
+                corpus = sysconfig.get_paths()['stdlib']
+            elif corpus is None:
+                corpus = working_folder
+                Corpus.generate_repository(corpus, language, args.files)
+            files = list(Parser.iterate_files_with_extension(corpus, extension))
+            results[language] = {'corpus': corpus if corpus != working_folder else 'synthetic',
+                                 **differential_report(files, extension, args.mismatches)}
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
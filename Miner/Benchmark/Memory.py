@@ -0,0 +1,81 @@
+# memory benchmark of the word pipeline
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from time import perf_counter
+from Inspector import Cache
+from Inspector import Parser
+from Benchmark import Corpus
+
+# Maximum ratio between the peak of the largest repository and the peak of the smallest one, the peak is flat below it
+PEAK_TOLERANCE = 1.5
+
+
+def measure_peak_memory(repository_folder_path, language, java_parser='javalang'):
+    """
+    Parse a repository in the current process and measure the peak of the memory allocated by Python
+    :param repository_folder_path: path to the repository folder
+    :param language: language of the repository
+    :param java_parser: java parser to use
+    :return: dictionary with the peak in bytes, the seconds and the number of words
+    """
+    tracemalloc.start()
+    start = perf_counter()
+    word_count = Parser.parse_repository_given_language(repository_folder_path, language, java_parser)
+    seconds = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'peak_bytes': peak, 'seconds': seconds, 'words': sum(word_count.values())}
+
+
+def benchmark_memory(sizes, language, working_folder):
+    """
+    Generate a synthetic repository of each size, measure the peak memory of its parse and check that it is flat: the
+    peak of the largest repository is at most PEAK_TOLERANCE times the peak of the smallest one
+    :param sizes: numbers of files of the repositories
+    :param language: language of the repositories
+    :param working_folder: folder where the repositories are generated
+    :return: dictionary with the results of each size, the ratio of the peaks and whether the peak is flat
+    """
+    # the parse cache would skip the parsers
+    Cache.configure(None)
+    # warm up the parsers and the memo of the tokenizer with the largest repository: the memo is bounded by
+    # MEMOIZED_IDENTIFIERS names, so it fills up once in a process whatever the size of the repositories that follow
+    warm_up_folder_path = os.path.join(working_folder, f'{language}_warm_up')
+    Corpus.generate_repository(warm_up_folder_path, language, max(sizes))
+    Parser.parse_repository_given_language(warm_up_folder_path, language, 'javalang')
+    shutil.rmtree(warm_up_folder_path)
+    results = {}
+    for size in sizes:
+        repository_folder_path = os.path.join(working_folder, f'{language}_{size}')
+        Corpus.generate_repository(repository_folder_path, language, size)
+        results[size] = measure_peak_memory(repository_folder_path, language)
+        shutil.rmtree(repository_folder_path)
+    ratio = results[max(sizes)]['peak_bytes'] / max(1, results[min(sizes)]['peak_bytes'])
+    return {'sizes': results, 'peak_ratio': ratio, 'flat': ratio <= PEAK_TOLERANCE}
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Peak memory of the word pipeline on synthetic repositories')
+    parser.add_argument('-s', '--sizes', required=False, help='Numbers of files of the repositories', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('-l', '--language', required=False, help='Language of the repositories', type=str, default='python', choices=('python', 'java'))
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as working_folder:
+        results = benchmark_memory(args.sizes, args.language, working_folder)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    if not results['flat']:
+        sys.exit(f'The peak memory grows {results["peak_ratio"]:.2f} times from {min(args.sizes)} to {max(args.sizes)} files')
+
+
+# call main function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# benchmark of the java parsers
+import os
+import sys
+import json
+import glob
+import argparse
+from time import perf_counter
+from Inspector import Cache
+from Inspector import Parser
+
+
+def benchmark_java_parsers(corpus_path, java_parsers=Parser.JAVA_PARSERS):
+    """
+    Parse the Java files of a corpus with each java parser, without the parse cache
+    :param corpus_path: path to the folder with the java files
+    :param java_parsers: java parsers to compare
+    :return: dictionary with the results of each java parser
+    """
+    list_of_files = glob.glob(f'{corpus_path}/**/*.java', recursive=True)
+    size = sum(os.path.getsize(file) for file in list_of_files)
+    # the parse cache would hide the cost of the parsers
+    Cache.configure(None)
+
+    results = {}
+    counts = {}
+    for java_parser in java_parsers:
+        start = perf_counter()
+        counts[java_parser] = Parser.count_words_in_files(list_of_files, '.java', java_parser)
+        seconds = perf_counter() - start
+        results[java_parser] = {
+            'files': len(list_of_files),
+            'bytes': size,
+            'seconds': seconds,
+            'files_per_second': len(list_of_files) / seconds if seconds > 0 else 0.0,
+            'words': sum(counts[java_parser].values()),
+        }
+
+    # words found by one parser and not by the other
+    reference = counts[java_parsers[0]]
+    for java_parser in java_parsers[1:]:
+        difference = (reference - counts[java_parser]) + (counts[java_parser] - reference)
+        results[java_parser][f'words_different_from_{java_parsers[0]}'] = sum(difference.values())
+    return results
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Benchmark of the java parsers on the same corpus')
+    parser.add_argument('corpus', help='Folder with the java files')
+    parser.add_argument('-j', '--java_parsers', required=False, help='Java parsers to compare', nargs='+', default=list(Parser.JAVA_PARSERS))
+    args = parser.parse_args()
+    json.dump(benchmark_java_parsers(args.corpus, args.java_parsers), sys.stdout, indent=2)
+    print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
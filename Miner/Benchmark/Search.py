@@ -0,0 +1,72 @@
+# benchmark of the search client against the local GitHub stub
+import sys
+import json
+import asyncio
+import argparse
+from time import perf_counter
+from Inspector import Search
+from Benchmark import Stubs
+
+
+async def consume_pages(client, queries, duration):
+    """
+    Read the pages of the queries until they are exhausted or the duration is over
+    :param client: search client
+    :param queries: search queries
+    :param duration: maximum number of seconds
+    :return: number of pages read
+    """
+    pages = 0
+    start = perf_counter()
+    async for _ in client.iterate_pages(queries):
+        pages += 1
+        if perf_counter() - start >= duration:
+            break
+    return pages
+
+
+def benchmark_search(queries, duration, rate_limit, window_seconds):
+    """
+    Run the search client against the stub and measure the sustained pages per hour
+    :param queries: number of queries
+    :param duration: maximum number of seconds of the benchmark
+    :param rate_limit: requests allowed by the stub in a window
+    :param window_seconds: duration of a window of the stub
+    :return: dictionary with the results
+    """
+    stub = Stubs.GitHubStub(rate_limit=rate_limit, window_seconds=window_seconds).start()
+    try:
+        client = Search.SearchClient(None, stub.url)
+        start = perf_counter()
+        pages = asyncio.run(consume_pages(client, [f'stars:{i}..{i} language:"Python"' for i in range(queries)], duration))
+        seconds = perf_counter() - start
+    finally:
+        stub.stop()
+    return {
+        'pages': pages,
+        'seconds': seconds,
+        'pages_per_hour': pages / seconds * 3600,
+        'rate_limit_pages_per_hour': rate_limit / window_seconds * 3600,
+        'rejected_requests': stub.rejected,
+        'client': dict(client.statistics),
+    }
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Sustained search pages per hour of the search client against a local stub')
+    parser.add_argument('-q', '--queries', required=False, help='Number of queries', type=int, default=100)
+    parser.add_argument('-d', '--duration', required=False, help='Maximum number of seconds', type=float, default=60)
+    parser.add_argument('-r', '--rate_limit', required=False, help='Requests allowed in a window', type=int, default=Stubs.SEARCH_RATE_LIMIT)
+    parser.add_argument('-w', '--window_seconds', required=False, help='Duration of a rate limit window', type=float, default=6)
+    args = parser.parse_args()
+    json.dump(benchmark_search(args.queries, args.duration, args.rate_limit, args.window_seconds), sys.stdout, indent=2)
+    print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
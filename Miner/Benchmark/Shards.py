@@ -0,0 +1,101 @@
+# benchmark of the sharded counters of the words against the in-memory Firestore
+import sys
+import json
+import random
+import argparse
+import contextlib
+import collections
+from Inspector import Leaderboard
+from Inspector import Sharding
+from Inspector import Writer
+from Benchmark import Corpus
+from Benchmark import Fakes
+
+# Default skew of the frequencies of the words, the exponent of their Zipf distribution
+ZIPF_EXPONENT = 1.1
+
+
+def benchmark_shards(max_shards, duration, flushes_per_second, words, words_per_flush, rollup_seconds,
+                     exponent=ZIPF_EXPONENT, seed=Corpus.SEED):
+    """
+    Run the flushes of the writer for a simulated duration, with word deltas following a Zipf distribution,
+    then check that the documents of the words hold every delta after the last rollup
+    :param max_shards: maximum number of shards of a word, 1 writes every word to its document
+    :param duration: simulated seconds
+    :param flushes_per_second: flushes of the writer per simulated second
+    :param words: number of words of the vocabulary
+    :param words_per_flush: deltas drawn for each flush
+    :param rollup_seconds: simulated seconds between two rollups
+    :param exponent: exponent of the Zipf distribution
+    :param seed: seed of the random generator
+    :return: dictionary with the results
+    """
+    generator = random.Random(seed)
+    vocabulary = [f'word{i}' for i in range(words)]
+    weights = [1 / (rank + 1) ** exponent for rank in range(words)]
+    now = [0.0]
+    Sharding.configure(max_shards, rollup_seconds, clock=lambda: now[0])
+    database_client = Fakes.FakeFirestore()
+    # the leaderboard is measured by its own simulation
+    Leaderboard.configure(database_client, 0)
+
+    expected = collections.Counter()
+    statistics = collections.Counter()
+    flushes = int(duration * flushes_per_second)
+    # the writer prints its progress, stdout is kept for the results
+    with contextlib.redirect_stdout(sys.stderr):
+        for _ in range(flushes):
+            pending_words = collections.defaultdict(collections.Counter)
+            for word in generator.choices(vocabulary, weights, k=words_per_flush):
+                field = generator.choice(list(Writer.LANGUAGE_FIELDS.values()))
+                pending_words[word][field] += 1
+                expected[word] += 1
+            Writer.flush_words(database_client, pending_words, {}, statistics)
+            Writer.rollup_shards(database_client)
+            now[0] += 1 / flushes_per_second
+        Writer.rollup_shards(database_client, force=True)
+
+    # every delta is in the document of its word, and every shard is drained
+    values = {path.split('/')[1]: fields.get('value', 0) for path, (fields, _) in database_client.documents.items()
+              if path.count('/') == 1}
+    shards = [fields for path, (fields, _) in database_client.documents.items() if f'/{Sharding.SHARDS_COLLECTION}/' in path]
+    word_writes = [count for path, count in database_client.document_writes.items() if path.count('/') == 1]
+    shard_writes = [count for path, count in database_client.document_writes.items() if path.count('/') == 3]
+    return {
+        'max_shards': max_shards,
+        'flushes': flushes,
+        'consistent': values == dict(expected) and not any(shard.get('value', 0) for shard in shards),
+        'sharded_words': len({path.split('/')[1] for path in database_client.documents if path.count('/') == 3}),
+        'shards': len(shards),
+        'writes': database_client.statistics['writes'],
+        'reads': database_client.statistics['reads'],
+        'hottest_document_writes_per_second': max(word_writes + shard_writes) / duration,
+        'hottest_word_document_writes_per_second': max(word_writes) / duration,
+        'documents_over_write_rate': sum(1 for count in word_writes + shard_writes
+                                         if count / duration > Sharding.DOCUMENT_WRITES_PER_SECOND),
+    }
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Writes per document of the words with and without sharded counters')
+    parser.add_argument('-s', '--max_shards', required=False, help='Maximum numbers of shards to compare', type=int, nargs='+',
+                        default=[1, Sharding.MAX_SHARDS])
+    parser.add_argument('-d', '--duration', required=False, help='Simulated seconds', type=float, default=600)
+    parser.add_argument('-f', '--flushes_per_second', required=False, help='Flushes of the writer per simulated second', type=float, default=4)
+    parser.add_argument('-w', '--words', required=False, help='Number of words of the vocabulary', type=int, default=5000)
+    parser.add_argument('-p', '--words_per_flush', required=False, help='Word deltas drawn for each flush', type=int, default=400)
+    parser.add_argument('-r', '--rollup_seconds', required=False, help='Simulated seconds between two rollups', type=float, default=Sharding.ROLLUP_SECONDS)
+    args = parser.parse_args()
+    results = [benchmark_shards(max_shards, args.duration, args.flushes_per_second, args.words, args.words_per_flush,
+                                args.rollup_seconds) for max_shards in args.max_shards]
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+# local stand-ins of the GitHub services
+import io
+import json
+import math
+import tarfile
+import hashlib
+import threading
+import collections
+import urllib.parse
+from time import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default rate limit of the stub search API: requests per window
+SEARCH_RATE_LIMIT = 30
+SEARCH_WINDOW_SECONDS = 60
+# Default total count of a query
+TOTAL_COUNT = 250
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local HTTP server of a stub, served from a background thread
+    """
+    daemon_threads = True
+
+    @property
+    def url(self):
+        """
+        :return: base url of the stub
+        """
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        """
+        Serve the requests in a background thread
+        :return: the stub
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving the requests
+        :return: None
+        """
+        self.shutdown()
+        self.server_close()
+
+
+class GitHubStub(StubServer):
+    """
+    Local HTTP server answering the repositories search of the GitHub API with generated results,
+    it applies a search rate limit with the same headers as GitHub, and answers errors queued by fail
+    """
+
+    def __init__(self, total_count=None, rate_limit=SEARCH_RATE_LIMIT, window_seconds=SEARCH_WINDOW_SECONDS):
+        """
+        :param total_count: function query -> total count of the query, TOTAL_COUNT for every query by default
+        :param rate_limit: number of requests allowed in a window
+        :param window_seconds: duration of a window
+        """
+        super().__init__(('127.0.0.1', 0), GitHubStubHandler)
+        self.total_count = total_count or (lambda query: TOTAL_COUNT)
+        self.rate_limit = rate_limit
+        self.window_seconds = window_seconds
+        self.window_reset = 0.0
+        self.window_requests = 0
+        # requests served and requests rejected by the rate limit
+        self.requests = 0
+        self.rejected = 0
+        # tuples (status, Retry-After) answered to the next requests instead of their results
+        self.errors = collections.deque()
+        # queries of the requests served, in their order
+        self.queries = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def fail(self, status, count=1, retry_after=None):
+        """
+        Answer the next requests with an error, before the rate limit is applied
+        :param status: status code of the error
+        :param count: number of requests answered with the error
+        :param retry_after: optional value of the Retry-After header
+        :return: None
+        """
+        with self.lock:
+            self.errors.extend([(status, retry_after)] * count)
+
+    def take_error(self):
+        """
+        :return: tuple (status, Retry-After) of the next queued error, None if there is none
+        """
+        with self.lock:
+            return self.errors.popleft() if self.errors else None
+
+    def take_request(self):
+        """
+        Count a request in the current rate limit window
+        :return: tuple (allowed, remaining, reset)
+        """
+        with self.lock:
+            now = time()
+            if now >= self.window_reset:
+                self.window_reset = math.ceil(now + self.window_seconds)
+                self.window_requests = 0
+            allowed = self.window_requests < self.rate_limit
+            if allowed:
+                self.window_requests += 1
+                self.requests += 1
+            else:
+                self.rejected += 1
+            return allowed, self.rate_limit - self.window_requests, self.window_reset
+
+
+class GitHubStubHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the requests of the stub
+    """
+
+    def do_GET(self):
+        """
+        Answer a search request
+        :return: None
+        """
+        url = urllib.parse.urlsplit(self.path)
+        if url.path != '/search/repositories':
+            self.send_json(404, {'message': 'Not Found'})
+            return
+        error = self.server.take_error()
+        if error is not None:
+            status, retry_after = error
+            self.send_json(status, {'message': 'Queued error'}, {'Retry-After': str(retry_after)} if retry_after is not None else None)
+            return
+        allowed, remaining, reset = self.server.take_request()
+        headers = {'X-RateLimit-Limit': str(self.server.rate_limit), 'X-RateLimit-Remaining': str(remaining),
+                   'X-RateLimit-Reset': str(int(reset))}
+        if not allowed:
+            self.send_json(403, {'message': 'API rate limit exceeded'}, headers)
+            return
+        parameters = urllib.parse.parse_qs(url.query)
+        query = parameters['q'][0]
+        with self.server.lock:
+            self.server.queries.append(query)
+        page = int(parameters.get('page', ['1'])[0])
+        per_page = int(parameters.get('per_page', ['30'])[0])
+        total_count = self.server.total_count(query)
+        first = (page - 1) * per_page
+        last = min(total_count, 1000, first + per_page)
+        # names are stable for a query so the same repositories are returned on every run
+        prefix = abs(hash(query)) % 10 ** 8
+        items = [{'full_name': f'owner{prefix}/repository{i}', 'language': 'Python' if i % 2 == 0 else 'Java'}
+                 for i in range(first, last)]
+        self.send_json(200, {'total_count': total_count, 'incomplete_results': False, 'items': items}, headers)
+
+    def send_json(self, status, body, headers=None):
+        """
+        Send a JSON response
+        :param status: status code
+        :param body: object encoded as JSON
+        :param headers: other headers of the response
+        :return: None
+        """
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        """
+        Keep the benchmarks output clean
+        """
+        pass
+
+
+class ArchiveStub(StubServer):
+    """
+    Local HTTP server answering the source archive downloads of GitHub (/owner/repository/archive/HEAD.tar.gz)
+    with tarballs of local folders, built like git archive: one top folder and the commit in the global header
+    """
+
+    def __init__(self, repositories=None):
+        """
+        :param repositories: dictionary full name -> path of the folder served as the archive of the repository
+        """
+        super().__init__(('127.0.0.1', 0), ArchiveStubHandler)
+        self.repositories = dict(repositories or {})
+        self.commits = {}
+        self.archives = {}
+        # archives served
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add_repository(self, full_name, folder_path, commit=None):
+        """
+        Serve a folder as the archive of a repository
+        :param full_name: name of the repository including the owner
+        :param folder_path: path of the folder
+        :param commit: commit of the archive, derived from the name by default
+        :return: None
+        """
+        with self.lock:
+            self.repositories[full_name] = folder_path
+            self.commits[full_name] = commit or hashlib.sha1(full_name.encode('utf-8')).hexdigest()
+            self.archives.pop(full_name, None)
+
+    def archive(self, full_name):
+        """
+        Build the archive of a repository once, it is kept in memory
+        :param full_name: name of the repository including the owner
+        :return: bytes of the tar.gz archive, None for an unknown repository
+        """
+        with self.lock:
+            if full_name not in self.repositories:
+                return None
+            if full_name not in self.archives:
+                commit = self.commits.setdefault(full_name, hashlib.sha1(full_name.encode('utf-8')).hexdigest())
+                content = io.BytesIO()
+                with tarfile.open(fileobj=content, mode='w:gz', format=tarfile.PAX_FORMAT, pax_headers={'comment': commit}) as archive:
+                    # like git archive, the .git folder of the repository is not archived
+                    archive.add(self.repositories[full_name], arcname=f'{full_name.split("/")[-1]}-{commit[:7]}',
+                                filter=lambda member: None if member.name.split('/')[-1] == '.git' else member)
+                self.archives[full_name] = content.getvalue()
+            self.requests += 1
+            return self.archives[full_name]
+
+
+class ArchiveStubHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the requests of the archive stub
+    """
+
+    def do_GET(self):
+        """
+        Answer an archive download
+        :return: None
+        """
+        path = urllib.parse.urlsplit(self.path).path.strip('/')
+        archive = None
+        if path.endswith('/archive/HEAD.tar.gz'):
+            archive = self.server.archive(path[:-len('/archive/HEAD.tar.gz')])
+        if archive is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-gzip')
+        self.send_header('Content-Length', str(len(archive)))
+        self.end_headers()
+        self.wfile.write(archive)
+
+    def log_message(self, format, *args):
+        """
+        Keep the benchmarks output clean
+        """
+        pass
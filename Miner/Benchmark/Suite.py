@@ -0,0 +1,148 @@
+# offline benchmark suite of the miner
+import os
+import sys
+import json
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import contextlib
+import collections
+import multiprocessing
+from queue import Queue
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from Inspector import Cache
+from Inspector import Parser
+from Inspector import Processor
+from Inspector import Writer
+from Benchmark import Corpus
+from Benchmark import Fakes
+
+# Backends measured by default: language and parser
+BACKENDS = (('python', 'ast'), ('python', 'lexer'), ('java', 'javalang'), ('java', 'srcml'), ('java', 'lexer'))
+
+
+def benchmark_backend(language, parser, files, shape, repositories, seed=Corpus.SEED):
+    """
+    Measure one backend in the current process: the parse of a synthetic repository, then the consumer and the writer
+    over copies of it, against the in-memory database
+    :param language: language of the repositories
+    :param parser: parser of the language to use
+    :param files: number of files of the repository
+    :param shape: shape of the repository, one of Corpus.SHAPES
+    :param repositories: number of repositories going through the consumer and the writer
+    :param seed: seed of the corpus
+    :return: dictionary with the results of the backend
+    """
+    # the parse cache would skip the parsers
+    Cache.configure(None)
+    java_parser, python_parser = (parser, 'ast') if language == 'java' else ('javalang', parser)
+    with tempfile.TemporaryDirectory() as working_folder:
+        template_path = os.path.join(working_folder, 'template')
+        Corpus.generate_repository_with_shape(template_path, language, files, shape, seed)
+
+        # parse
+        statistics = collections.Counter()
+        start = perf_counter()
+        word_count = Parser.parse_repository_given_language(template_path, language, java_parser, None, statistics, python_parser)
+        seconds = perf_counter() - start
+        words = sum(word_count.values())
+
+        # consumer and writer, the consumer deletes the repositories it processes
+        database_client = Fakes.FakeFirestore()
+        queue = Queue()
+        write_queue = Queue()
+        for index in range(repositories):
+            path = os.path.join(working_folder, f'repository_{index}')
+            shutil.copytree(template_path, path)
+            queue.put((path, language, f'benchmark/repository_{index}', {}))
+        queue.put(None)
+        # the consumer and the writer print their progress, stdout is kept for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            start = perf_counter()
+            Processor.process_repo(queue, 0, java_parser, write_queue, python_parser=python_parser)
+            write_queue.put(None)
+            Writer.write_words(write_queue, database_client)
+            pipeline_seconds = perf_counter() - start
+
+    return {
+        'files': statistics['files'],
+        'identifiers': statistics['identifiers'],
+        'words': words,
+        'parse_seconds': seconds,
+        'files_per_second': statistics['files'] / seconds if seconds > 0 else 0.0,
+        'identifiers_per_second': statistics['identifiers'] / seconds if seconds > 0 else 0.0,
+        'words_per_second': words / seconds if seconds > 0 else 0.0,
+        'pipeline_seconds_per_repository': pipeline_seconds / repositories,
+        'firestore_reads_per_repository': database_client.statistics['reads'] / repositories,
+        'firestore_writes_per_repository': database_client.statistics['writes'] / repositories,
+        'firestore_commits_per_repository': database_client.statistics['commits'] / repositories,
+        # ru_maxrss is in kilobytes on Linux, the children are the srcML processes
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'peak_rss_children_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+    }
+
+
+def run_suite(backends, sizes, shape, repositories):
+    """
+    Measure each backend on each size, every measure runs in a new process so its peak RSS is its own
+    :param backends: tuples (language, parser)
+    :param sizes: numbers of files of the repositories
+    :param shape: shape of the repositories, one of Corpus.SHAPES
+    :param repositories: number of repositories going through the consumer and the writer
+    :return: dictionary with the results
+    """
+    results = {'commit': git_commit(), 'python': sys.version.split()[0], 'shape': shape, 'repositories': repositories,
+               'backends': {}}
+    for language, parser in backends:
+        name = f'{language}:{parser}'
+        if parser == 'srcml' and shutil.which('srcml') is None:
+            results['backends'][name] = {'skipped': 'srcml is not installed'}
+            continue
+        results['backends'][name] = {}
+        for size in sizes:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                results['backends'][name][size] = executor.submit(benchmark_backend, language, parser, size, shape,
+                                                                  repositories).result()
+    return results
+
+
+def git_commit():
+    """
+    Get the commit of the measured code, the results of two commits can be compared
+    :return: hash of the commit, None outside of a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON or written to a file
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Offline benchmark of the parse, the consumer and the writer on synthetic repositories')
+    parser.add_argument('-s', '--sizes', required=False, help='Numbers of files of the repositories', type=int, nargs='+', default=[1000])
+    parser.add_argument('--shape', required=False, help='Shape of the repositories', type=str, default='default', choices=list(Corpus.SHAPES))
+    parser.add_argument('-b', '--backends', required=False, help='Backends to measure, as language:parser', nargs='+',
+                        default=[f'{language}:{parser}' for language, parser in BACKENDS])
+    parser.add_argument('-r', '--repositories', required=False, help='Number of repositories going through the consumer and the writer', type=int, default=3)
+    parser.add_argument('-o', '--output', required=False, help='JSON file of the results, stdout by default', type=str, default=None)
+    args = parser.parse_args()
+    backends = [tuple(backend.split(':', 1)) for backend in args.backends]
+    results = run_suite(backends, args.sizes, args.shape, args.repositories)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+# call main function
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# differential check and micro-benchmark of the identifier tokenizer
+import sys
+import json
+import random
+import argparse
+import itertools
+from time import perf_counter
+from Inspector import Parser
+from Inspector import Tokenizer
+from Benchmark import Corpus
+
+# Characters of the exhaustive identifiers, with the cases where lower or upper change the length or depend on the context
+ALPHABET = ('a', 'B', '_', '1', '-', 'ß', 'İ', 'ǅ', 'Σ', '\n')
+# Default maximum length of the exhaustive identifiers
+EXHAUSTIVE_LENGTH = 5
+
+
+def generate_identifiers(count, seed=Corpus.SEED):
+    """
+    Generate realistic identifiers in every naming style
+    :param count: number of identifiers
+    :param seed: seed of the random generator
+    :return: list of identifiers
+    """
+    generator = random.Random(seed)
+    styles = (
+        lambda words: '_'.join(words),
+        lambda words: words[0] + ''.join(word.capitalize() for word in words[1:]),
+        lambda words: ''.join(word.capitalize() for word in words),
+        lambda words: '_'.join(words).upper(),
+        lambda words: '__' + '_'.join(words) + '__',
+        lambda words: '_' + words[0] + ''.join(word.upper() for word in words[1:]),
+        lambda words: words[0] + str(generator.randint(0, 99)) + ''.join(word.capitalize() for word in words[1:]),
+    )
+    return [generator.choice(styles)([generator.choice(Corpus.VOCABULARY) for _ in range(generator.randint(1, 4))])
+            for _ in range(count)]
+
+
+def differential_check(identifiers):
+    """
+    Compare the tokenizer with the functions of the parser on every identifier
+    :param identifiers: identifiers to compare
+    :return: list of the identifiers with a different result
+    """
+    mismatches = []
+    for identifier in identifiers:
+        if not identifier:
+            continue
+        if (Tokenizer.is_snake_case(identifier) != Parser.is_snake_case(identifier)
+                or Tokenizer.is_camel_case(identifier) != Parser.is_camel_case(identifier)
+                or Tokenizer.camel_case_split(identifier) != Parser.camel_case_split(identifier)
+                or Tokenizer.snake_case_split(identifier) != list(Parser.snake_case_split(identifier))):
+            mismatches.append(identifier)
+    return mismatches
+
+
+def reference_count_words(function_names, extension):
+    """
+    Count the words of function names with the functions of the parser
+    :param function_names: list of function names
+    :param extension: extension of the files of the function names
+    :return: list of words
+    """
+    words = []
+    for function_name in function_names:
+        if extension == '.py' and Parser.is_snake_case(function_name):
+            words.extend(Parser.snake_case_split(function_name))
+        elif extension == '.java' and Parser.is_camel_case(function_name):
+            words.extend(Parser.camel_case_split(function_name))
+    return words
+
+
+def benchmark_tokenizer(identifiers, repetitions):
+    """
+    Time the parser functions and the tokenizer batch API on the same function names
+    :param identifiers: function names
+    :param repetitions: number of times the names are counted, the tokenizer memoizes the recurring names
+    :return: dictionary with the seconds and the names per second of each implementation
+    """
+    results = {}
+    for extension in ('.py', '.java'):
+        start = perf_counter()
+        for _ in range(repetitions):
+            reference = reference_count_words(identifiers, extension)
+        reference_seconds = perf_counter() - start
+        Tokenizer.split_identifier.cache_clear()
+        start = perf_counter()
+        for _ in range(repetitions):
+            word_count = Tokenizer.count_words(identifiers, extension)
+        tokenizer_seconds = perf_counter() - start
+        names = len(identifiers) * repetitions
+        results[extension] = {
+            'names': names,
+            'same_words': sorted(word_count.elements()) == sorted(reference),
+            'reference_seconds': reference_seconds,
+            'tokenizer_seconds': tokenizer_seconds,
+            'reference_names_per_second': names / reference_seconds,
+            'tokenizer_names_per_second': names / tokenizer_seconds,
+            'speedup': reference_seconds / tokenizer_seconds,
+        }
+    return results
+
+
+def main():
+    """
+    Main function of the benchmark, the results are printed as JSON
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description='Differential check and micro-benchmark of the identifier tokenizer')
+    parser.add_argument('-n', '--names', required=False, help='Number of realistic function names', type=int, default=100000)
+    parser.add_argument('-r', '--repetitions', required=False, help='Number of times the names are counted', type=int, default=3)
+    parser.add_argument('-e', '--exhaustive_length', required=False, help='Maximum length of the exhaustive identifiers', type=int, default=EXHAUSTIVE_LENGTH)
+    args = parser.parse_args()
+
+    identifiers = generate_identifiers(args.names)
+    exhaustive = [''.join(characters) for length in range(1, args.exhaustive_length + 1)
+                  for characters in itertools.product(ALPHABET, repeat=length)]
+    mismatches = differential_check(identifiers + exhaustive)
+    results = {
+        'checked_identifiers': len(identifiers) + len(exhaustive),
+        'mismatches': mismatches[:100],
+        'benchmark': benchmark_tokenizer(identifiers, args.repetitions),
+    }
+    json.dump(results, sys.stdout, indent=2)
+    print()
+    # a mismatch is an error of the tokenizer
+    sys.exit(1 if mismatches else 0)
+
+
+# call main function
+if __name__ == '__main__':
+    main()
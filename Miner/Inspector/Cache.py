@@ -0,0 +1,148 @@
+# persistent cache of the function names of the source files
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import collections
+from time import time
+
+# Default path of the cache database
+CACHE_PATH = './cache/parse_cache.sqlite3'
+# Default maximum number of files in the cache
+CACHE_ENTRIES = 1000000
+# Number of insertions between two evictions
+EVICTION_INTERVAL = 1000
+# Version of the cached names, it has to be increased when an extractor changes its output
+CACHE_VERSION = 2
+
+# configuration of the cache in this process, None disables the cache
+_path = None
+_max_entries = CACHE_ENTRIES
+# sqlite connections can not be shared between threads
+_local = threading.local()
+_lock = threading.Lock()
+_insertions = 0
+# hits and misses of the run
+statistics = collections.Counter()
+
+
+def configure(path, max_entries=CACHE_ENTRIES):
+    """
+    Configure the cache of this process, it is also the initializer of the parsing processes
+    :param path: path of the cache database, None or an empty path disables the cache
+    :param max_entries: maximum number of files in the cache, the least recently used are evicted
+    :return: None
+    """
+    global _path, _max_entries
+    _path = path or None
+    _max_entries = max_entries
+    if _path is not None:
+        directory = os.path.dirname(_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _connection()
+
+
+def enabled():
+    """
+    Check if the cache is configured
+    :return: True if the cache is enabled, False otherwise
+    """
+    return _path is not None
+
+
+def content_key(content, parser):
+    """
+    Build the key of a source file from its content and the parser that extracts its names
+    :param content: bytes of the source file
+    :param parser: identity of the parser
+    :return: hexadecimal key
+    """
+    digest = hashlib.sha256(f'{parser}:{CACHE_VERSION}:'.encode('utf-8'))
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def get(key):
+    """
+    Get the function names of a source file
+    :param key: key of the source file
+    :return: list of function names, None if the file is not cached
+    """
+    try:
+        connection = _connection()
+        row = connection.execute('SELECT names FROM names WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute('UPDATE names SET last_used = ? WHERE key = ?', (time(), key))
+        return json.loads(row[0])
+    except sqlite3.Error as e:
+        # a busy or broken cache only costs a parse
+        logging.error(f'Error reading the parse cache: {e}')
+        return None
+
+
+def put(key, names):
+    """
+    Store the function names of a source file, the least recently used files are evicted when the cache is full
+    :param key: key of the source file
+    :param names: list of function names
+    :return: None
+    """
+    global _insertions
+    try:
+        connection = _connection()
+        connection.execute('INSERT OR REPLACE INTO names (key, names, last_used) VALUES (?, ?, ?)',
+                           (key, json.dumps(names), time()))
+        with _lock:
+            _insertions += 1
+            evict = _insertions % EVICTION_INTERVAL == 0
+        if evict:
+            (count,) = connection.execute('SELECT COUNT(*) FROM names').fetchone()
+            if count > _max_entries:
+                connection.execute('DELETE FROM names WHERE key IN (SELECT key FROM names ORDER BY last_used LIMIT ?)',
+                                   (count - _max_entries,))
+    except sqlite3.Error as e:
+        logging.error(f'Error writing the parse cache: {e}')
+
+
+def record(parse_statistics):
+    """
+    Add the hits and misses of a repository to the statistics of the run
+    :param parse_statistics: counter with cache_hits and cache_misses
+    :return: None
+    """
+    with _lock:
+        statistics.update({k: parse_statistics[k] for k in ('cache_hits', 'cache_misses')})
+
+
+def summary():
+    """
+    Summarize the hits and misses of the run
+    :return: summary line
+    """
+    with _lock:
+        hits, misses = statistics['cache_hits'], statistics['cache_misses']
+    total = hits + misses
+    rate = hits / total if total > 0 else 0.0
+    return f'Parse cache: {hits} hits, {misses} misses, hit rate {rate:.1%}'
+
+
+def _connection():
+    """
+    Get the connection of the current thread, the table is created with the first connection
+    :return: sqlite connection
+    """
+    connection = getattr(_local, 'connection', None)
+    if connection is None or getattr(_local, 'path', None) != _path:
+        # autocommit and WAL, the parsing processes write to the same database
+        connection = sqlite3.connect(_path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('CREATE TABLE IF NOT EXISTS names (key TEXT PRIMARY KEY, names TEXT NOT NULL, last_used REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS names_last_used ON names (last_used)')
+        _local.connection = connection
+        _local.path = _path
+    return connection
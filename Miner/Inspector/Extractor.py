@@ -1,77 +1,199 @@
 import os
 import logging
-from time import sleep
+import asyncio
+import collections
+from time import perf_counter
 
 from git import Repo
-from github import Github
-from datetime import datetime
+from Inspector import Lease
+from Inspector import Metrics
+from Inspector import Parser
+from Inspector import Registry
+from Inspector import Search
 
 CLONING_REPO_PATH = './tmp'
 GITHUB_URL = 'https://github.com'
+GITHUB_API_URL = Search.GITHUB_API_URL
 GITHUB_API_TOKEN = 'ghp_TOKEN'
+# Maximum number of searches of a range by this node in a distributed run, a range is searched again when some of its
+# repositories have not been mined, like a failed clone
+RANGE_ATTEMPTS = 3
+# Clone modes: full history with every file, depth 1 without blobs and with a sparse checkout of the source files,
+# or no clone at all: the consumers stream the source archive of HEAD
+CLONE_MODES = ('full', 'shallow', 'archive')
 
 
 # producer task
-def mine_gh_api(queue, range_stars, database_client):
+def mine_gh_api(queue, ranges_stars, database_client):
     """
-    Mine the GitHub API for repositories
-    :param queue: Consumer queue
-    :param range_stars: Range of stars to mine (Some may include dates)
+    Mine the GitHub API for repositories, one range after the other
+    :param queue: Clone queue, it receives tuples (name, language) of the repositories to mine
+    :param ranges_stars: Ranges of stars to mine (Some may include dates)
+    :param database_client: Database client
+    :return: None
+    """
+    asyncio.run(search_ranges(queue, ranges_stars, database_client))
+    logging.info('Producer finished - No more repositories to process')
+
+
+async def search_ranges(queue, ranges_stars, database_client):
+    """
+    Search the repositories of the ranges and send the ones that are not mined to the clone queue,
+    the next pages are fetched while the current one waits for the clone workers.
+    In a distributed run each range and each repository is claimed first; the ranges claimed by other nodes are claimed
+    again once their leases are released or expired, until every range is done.
+    A searched range is done once its repositories are written, until then a stopped node leaves it to the others. It is
+    not done and it is searched again when some of its repositories are claimed by other nodes, or given back unwritten;
+    the searches that leave repositories unwritten are made at most RANGE_ATTEMPTS times by this node.
+    :param queue: Clone queue
+    :param ranges_stars: Ranges of stars to mine (Some may include dates)
     :param database_client: Database client
     :return: None
     """
-    # Get the collection reference for repositories
-    db_collection_repos = database_client.collection(u'repos')
+    client = Search.SearchClient(GITHUB_API_TOKEN, GITHUB_API_URL)
+    remaining = list(ranges_stars)
+    # range -> searches of the range by this node that left repositories unwritten
+    attempts = collections.Counter()
+    # ranges whose last search found repositories claimed by other nodes, their next search is not counted
+    waiting = set()
+    while True:
+        # ranges claimed by other nodes, and the claimed ranges with their query in the order of the search
+        held_ranges, claimed = [], []
+        # query -> leases of the repositories claimed from the range, the range is done once they are written
+        dependencies = collections.defaultdict(list)
+        # queries of the ranges with repositories claimed by other nodes
+        held_queries = set()
+        queries = claimed_queries(remaining, claimed, held_ranges)
+        async for query, page in client.iterate_pages(queries):
+            # the pages come in the order of the queries, the ranges before this one have been searched
+            while claimed and claimed[0][0] != query:
+                await finish_range(*claimed.pop(0), dependencies, held_queries, waiting)
+            Metrics.increment('search', len(page))
+            try:
+                # check the whole page against the index of mined repositories
+                full_names = [repo['full_name'] for repo in page if repo.get('language')]
+                held = []
+                unmined = set(await asyncio.to_thread(Registry.filter_unmined_repositories, database_client, full_names, held))
+                if held:
+                    held_queries.add(query)
+                for repo in page:
+                    if repo['full_name'] in unmined:
+                        dependencies[query].append((Lease.REPOSITORY, Registry.repository_document_id(repo['full_name'])))
+                        # add the repository to the clone queue, it blocks while the clone workers are busy
+                        await asyncio.to_thread(queue.put, (repo['full_name'], repo['language'].lower()))
+            except Exception as e:
+                logging.exception(f'Error while processing a page of {query}: {e}')
+        for searched_query, range_stars in claimed:
+            await finish_range(searched_query, range_stars, dependencies, held_queries, waiting)
+
+        remaining = held_ranges
+        for range_stars in Lease.unfinished(Lease.RANGE):
+            if range_stars not in waiting:
+                attempts[range_stars] += 1
+            if attempts[range_stars] < RANGE_ATTEMPTS:
+                remaining.append(range_stars)
+            else:
+                logging.error(f'{range_stars} searched {attempts[range_stars]} times, some of its repositories are not mined')
+        # the searched ranges wait for their repositories to be written, a range that is not done is searched again
+        if not remaining and not Lease.finishing(Lease.RANGE):
+            break
+        logging.info(f'{len(remaining)} ranges held by other nodes or searched again')
+        await asyncio.sleep(Lease.retry_seconds())
+    logging.info(f'Search API: {dict(client.statistics)}')
 
-    # Initialize the GitHub object
-    g = Github(GITHUB_API_TOKEN)
+
+async def finish_range(query, range_stars, dependencies, held_queries, waiting):
+    """
+    Record the end of the search of a range, it is done once its repositories are written. The lease store is called
+    in a thread, the event loop keeps the search requests going
+    :param query: search query of the range
+    :param range_stars: Range of stars (Some may include dates)
+    :param dependencies: query -> leases of the repositories claimed from the range
+    :param held_queries: queries of the ranges with repositories claimed by other nodes
+    :param waiting: set of the ranges waiting for the repositories of other nodes, updated
+    :return: None
+    """
+    complete = query not in held_queries
+    if complete:
+        waiting.discard(range_stars)
+    else:
+        waiting.add(range_stars)
+    await asyncio.to_thread(Lease.finish, Lease.RANGE, range_stars, dependencies.pop(query, ()), complete)
+
+
+async def claimed_queries(ranges_stars, claimed, held_ranges):
+    """
+    Claim each range before its search, every range is claimed when the run is not distributed. The lease store is
+    called in a thread, the event loop keeps the search requests of the ranges claimed before going
+    :param ranges_stars: Ranges of stars (Some may include dates)
+    :param claimed: list receiving tuples (query, range) of the claimed ranges
+    :param held_ranges: list receiving the ranges claimed by another node
+    :return: async generator of the search queries of the ranges claimed by this node
+    """
+    for range_stars in ranges_stars:
+        outcome = await asyncio.to_thread(Lease.claim, Lease.RANGE, range_stars)
+        if outcome == Lease.CLAIMED:
+            claimed.append((search_query(range_stars), range_stars))
+            yield search_query(range_stars)
+        elif outcome == Lease.HELD:
+            held_ranges.append(range_stars)
+
+
+def search_query(range_stars):
+    """
+    Build the search query of a range
+    :param range_stars: Range of stars (Some may include dates)
+    :return: search query
+    """
     # Define the query - range of stars: 0..10, 11..20, 21..30, ... date_start..date_end and language: Python, Java
-    query = f'{range_stars} language:"Python" language:"Java"'
-    # try to trigger the request
-    try:
-        # verify rate limit in order to avoid GitHub API rate limit, it will sleep
-        api_wait_search(g)
-        # trigger the request with the query
-        repositories_req = g.search_repositories(query, sort='stars', order='desc')
-        # get the total count of page 0 (this should be the total count of the query)
-        repositories_req.get_page(0)
-        # get the total count of the query
-        total_count = repositories_req.totalCount
-        # Validate that there are more than 0 results
-        if total_count > 0:
-            # if the total count is lower than TOTAL_COUNT, we evaluate the repositories
-            for repo in repositories_req:
-                # check if the repository is already in the database
-                repo_ref = db_collection_repos.document(repo.full_name.replace("/", "__")).get()
-                if repo_ref.exists:
-                    # if the repository already exists, skip it
-                    continue
-                else:
-                    # clone the repository
-                    path = clone_repository(repo.full_name)
-                    # Check if the repository has been cloned
-                    if path is not None:
-                        # Define a tuple with the path and the language
-                        info_repo = (path, repo.language.lower(), repo.full_name)
-                        # add the repository to the queue
-                        queue.put(info_repo)
-                    else:
-                        logging.error(f'{repo.full_name} has not been cloned')
-
-            queue.put(None)
-            logging.info('Producer finished - No more repositories to process')
+    return f'{range_stars} language:"Python" language:"Java"'
+
+
+# clone task
+def clone_repositories(clone_queue, queue, identifier, clone_mode='full'):
+    """
+    Clone the repositories of the clone queue and send them to the consumers
+    :param clone_queue: Clone queue, items are tuples (name, language)
+    :param queue: Consumer queue
+    :param identifier: identifier of the thread
+    :param clone_mode: clone mode, one of CLONE_MODES
+    :return: None
+    """
+    print(f'Cloner {identifier}: Running')
+    while True:
+        item = clone_queue.get()
+        # check for stop
+        if item is None:
+            # add the signal back for other clone workers
+            clone_queue.put(item)
+            break
+        full_name, language = item
+        if clone_mode == 'archive':
+            # nothing to clone, the consumer downloads the archive
+            Metrics.increment('clone')
+            queue.put((archive_url(full_name), language, full_name, {'clone_mode': clone_mode}))
+            continue
+        # clone the repository
+        statistics = {}
+        path = clone_repository(full_name, language, clone_mode, statistics)
+        # Check if the repository has been cloned
+        if path is not None:
+            Metrics.increment('clone')
+            # add the path, the language, the name and the clone statistics to the queue
+            queue.put((path, language, full_name, statistics))
         else:
-            logging.info(f'No results for query: {query}')
-            pass
-    except Exception as e:
-        logging.exception(f'Error while requesting the GitHub API: {e}')
-        pass
+            logging.error(f'{full_name} has not been cloned')
+            # its range is not done, it is searched again by this node or another one
+            Registry.release_repository(full_name)
 
 
-def clone_repository(full_name):
+def clone_repository(full_name, language=None, clone_mode='full', statistics=None):
     """
     Clone the repository from GitHub and return the path of the cloned repository
     :param full_name: Name of the repository including the owner
+    :param language: language of the repository, the shallow mode only checks out its source files
+    :param clone_mode: clone mode, one of CLONE_MODES
+    :param statistics: optional dictionary filled with the clone mode, the wall time, the bytes transferred and the commit
     :return: destination path of the cloned repository, if it does not exist it will return None
     """
     try:
@@ -79,9 +201,24 @@ def clone_repository(full_name):
         destination_path = f'{CLONING_REPO_PATH}/{full_name.replace("/", "__")}'
         # Check if the repository already exists
         if not os.path.exists(destination_path):
+            start = perf_counter()
             # Clone the repository if it does not exist
-            Repo.clone_from(f'{GITHUB_URL}/{full_name}.git', destination_path)
-            logging.info(f'{full_name} has been cloned')
+            match clone_mode:
+                case 'full':
+                    Repo.clone_from(f'{GITHUB_URL}/{full_name}.git', destination_path)
+                case 'shallow':
+                    shallow_clone(f'{GITHUB_URL}/{full_name}.git', destination_path, Parser.LANGUAGE_EXTENSIONS.get(language))
+                case _:
+                    raise ValueError(f'Unknown clone mode: {clone_mode}')
+            seconds = perf_counter() - start
+            # the objects received are the bytes transferred by git
+            transferred = directory_size(f'{destination_path}/.git/objects')
+            logging.info(f'{full_name} has been cloned ({clone_mode}) in {seconds:.2f} seconds, {transferred} bytes')
+            Metrics.observe('clone_seconds', seconds)
+            Metrics.observe('clone_bytes', transferred)
+            if statistics is not None:
+                statistics.update({'clone_mode': clone_mode, 'clone_seconds': seconds, 'clone_bytes': transferred,
+                                   'commit': Repo(destination_path).head.commit.hexsha})
             # return the path of the cloned repository
             return destination_path
         # If the repository already exists, return the path
@@ -97,20 +234,45 @@ def clone_repository(full_name):
         return None
 
 
-def api_wait_search(git):
+def archive_url(full_name):
     """
-    Wait for the GitHub API to be available
-    :param git: A GitHub object
+    Get the url of the source archive of the HEAD of a repository
+    :param full_name: Name of the repository including the owner
+    :return: url of the tar.gz archive
+    """
+    return f'{GITHUB_URL}/{full_name}/archive/HEAD.tar.gz'
+
+
+def shallow_clone(url, destination_path, extension):
+    """
+    Clone the HEAD of a repository without history nor blobs, then check out only the files with the given extension
+    :param url: url of the repository
+    :param destination_path: destination path of the clone
+    :param extension: extension of the files to check out, if None every file is checked out
     :return: None
     """
-    # Get the rate limit
-    limits = git.get_rate_limit()
-    # If the remaining requests is 2 or less, wait for the reset time
-    if limits.search.remaining <= 2:
-        # Get the reset time in seconds
-        seconds = (limits.search.reset - datetime.now()).total_seconds()
-        print(f'Waiting for {seconds} seconds')
-        logging.info(f'Waiting {seconds} seconds for the GitHub API')
-        # Sleep and wait for the reset time
-        sleep(seconds)
-        logging.info('GitHub API ready')
+    # depth 1 and blob filter: only the commit and the trees are transferred here
+    repo = Repo.clone_from(url, destination_path, depth=1, multi_options=['--filter=blob:none', '--no-checkout'])
+    if extension is not None:
+        # non-cone sparse checkout with a file pattern, written by hand to work on every git version
+        repo.git.config('core.sparseCheckout', 'true')
+        with open(f'{destination_path}/.git/info/sparse-checkout', 'w') as sparse_file:
+            sparse_file.write(f'*{extension}\n')
+    # populate the working tree, the missing blobs of the selected files are fetched on demand
+    repo.git.read_tree('-mu', 'HEAD')
+
+
+def directory_size(path):
+    """
+    Compute the size of a directory
+    :param path: path of the directory
+    :return: size in bytes of the files of the directory
+    """
+    size = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                size += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return size
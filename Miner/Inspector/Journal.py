@@ -0,0 +1,168 @@
+# journal of the word increments of the distributed runs, each of them is applied exactly once
+import logging
+import collections
+from time import monotonic
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from Inspector import Lease
+from Inspector import Leaderboard
+from Inspector import Metrics
+from Inspector import Registry
+from Inspector import Sharding
+
+# Collection of the journal entries
+JOURNAL_COLLECTION = 'journal'
+# Maximum number of operations in a Firestore batch
+BATCH_LIMIT = 500
+# Words of an entry: its increments and the deletion of the entry fit in one batch
+ENTRY_WORDS = BATCH_LIMIT - 1
+
+# time of the last recovery of the entries of the stopped nodes
+_last_recover = None
+# entries of this node whose application failed, they are applied again by the next recovery
+_unapplied = []
+
+
+def intent_operations(repositories, words):
+    """
+    Get the number of operations of the batch recording a flush: an entry for each ENTRY_WORDS words, and the document and
+    the lease of each repository
+    :param repositories: number of repositories of the flush
+    :param words: number of words of the flush
+    :return: number of operations
+    """
+    return -(-words // ENTRY_WORDS) + 2 * repositories
+
+
+def write(database_client, word_deltas, repositories):
+    """
+    Write a flush of the writer exactly once. One batch records the increments as journal entries together with the
+    documents of the repositories and the release of their leases, so the repositories are mined once their increments are
+    recorded; then each entry is applied by a batch that deletes it with a precondition, so an entry applied by another
+    node, after this node was thought stopped, fails as a whole.
+    When the flush is not recorded, the error is raised and the leases are left to the caller: the flush is written
+    again without the repositories whose lease has been lost.
+    :param database_client: database client object
+    :param word_deltas: word -> counter of deltas by language field
+    :param repositories: repository document id -> fields
+    :return: number of operations written
+    """
+    db_collection_journal = database_client.collection(JOURNAL_COLLECTION)
+    db_collection_repos = database_client.collection(u'repos')
+    words = list(word_deltas)
+    entries = []
+    batch = database_client.batch()
+    for i in range(0, len(words), ENTRY_WORDS):
+        deltas = {word: word_deltas[word] for word in words[i:i + ENTRY_WORDS]}
+        reference = db_collection_journal.document()
+        batch.set(reference, {'node': Lease.node(), 'deltas': Registry.encode_word_count(deltas)})
+        entries.append((reference, deltas))
+    for document_id, fields in repositories.items():
+        batch.set(db_collection_repos.document(document_id), fields, merge=True)
+    try:
+        with Lease.fenced(batch, Lease.REPOSITORY, list(repositories)):
+            with Metrics.span('write_commit_seconds'):
+                batch.commit()
+    except Exception:
+        # a commit whose outcome is unknown may have been applied
+        if not recorded(database_client, [reference for reference, _ in entries]):
+            # nothing is written, the leases lost by the fence are found now instead of at the next heartbeat
+            Lease.check(Lease.REPOSITORY, list(repositories))
+            raise
+        logging.warning('Flush recorded despite the error of its commit')
+        Lease.written(Lease.REPOSITORY, list(repositories))
+    operations = len(entries) + 2 * len(repositories)
+    for reference, deltas in entries:
+        try:
+            operations += apply_entry(database_client, reference, deltas)
+        except Exception as e:
+            # the entry stays in the journal, this node applies it again
+            logging.exception(f'Journal entry {reference.id} not applied: {e}')
+            _unapplied.append((reference, deltas))
+    return operations
+
+
+def recorded(database_client, references):
+    """
+    Check if the entries of a flush are in the journal
+    :param database_client: database client object
+    :param references: document references of the entries
+    :return: True if the batch recording them was committed
+    """
+    if not references:
+        return False
+    try:
+        return any(snapshot.exists for snapshot in database_client.get_all(references[:1], field_paths=[u'node']))
+    except Exception as e:
+        logging.exception(f'Journal not read: {e}')
+        return False
+
+
+def apply_entry(database_client, reference, deltas):
+    """
+    Apply the increments of a journal entry and delete it in one batch, unless it has already been applied
+    :param database_client: database client object
+    :param reference: document reference of the entry
+    :param deltas: word -> counter of deltas by language field
+    :return: number of operations written, 0 if the entry was applied by another node
+    """
+    db_collection_words = database_client.collection(u'words')
+    batch = database_client.batch()
+    # word -> document reference and deltas of the words of the entry
+    word_writes = {}
+    for word, fields in deltas.items():
+        word_deltas = {'value': sum(fields.values()), **fields}
+        word_reference, word_fields = Sharding.word_operations(db_collection_words, word, word_deltas)
+        batch.set(word_reference, word_fields, merge=True)
+        word_writes[word] = (word_reference, word_deltas)
+    batch.delete(reference, option=database_client.write_option(exists=True))
+    try:
+        with Metrics.span('write_commit_seconds'):
+            batch.commit()
+    except (FailedPrecondition, NotFound):
+        logging.info(f'Journal entry {reference.id} already applied')
+        return 0
+    for word, (word_reference, word_deltas) in word_writes.items():
+        Sharding.written(word, word_reference, word_deltas)
+    # the leaderboard follows the applied deltas
+    Leaderboard.update(database_client, deltas)
+    return len(deltas) + 1
+
+
+def recover(database_client, force=False):
+    """
+    Apply the journal entries of this node that failed and the entries left by the stopped nodes, at most once per
+    heartbeat interval
+    :param database_client: database client object
+    :param force: recover without waiting, at the start and at the end of the run
+    :return: number of entries applied
+    """
+    global _last_recover
+    if not Lease.enabled() or (not force and _last_recover is not None and monotonic() - _last_recover < Lease.retry_seconds()):
+        return 0
+    _last_recover = monotonic()
+    applied = 0
+    while _unapplied:
+        reference, deltas = _unapplied.pop()
+        try:
+            if apply_entry(database_client, reference, deltas):
+                applied += 1
+        except Exception as e:
+            logging.exception(f'Journal entry {reference.id} not applied: {e}')
+            _unapplied.append((reference, deltas))
+            break
+    # node -> alive, each node is checked once
+    nodes = {}
+    for snapshot in database_client.collection(JOURNAL_COLLECTION).stream():
+        fields = snapshot.to_dict()
+        node = fields.get('node')
+        if node not in nodes:
+            nodes[node] = Lease.alive(node)
+        if nodes[node]:
+            continue
+        deltas = {word: collections.Counter(counter) for word, counter in Registry.decode_word_count(fields['deltas']).items()}
+        if apply_entry(database_client, snapshot.reference, deltas):
+            applied += 1
+    if applied:
+        logging.info(f'Applied {applied} journal entries')
+        Leaderboard.publish(database_client)
+    return applied
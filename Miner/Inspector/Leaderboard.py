@@ -0,0 +1,225 @@
+# precomputed leaderboard of the top words
+import heapq
+import logging
+import collections
+from time import monotonic
+from firebase_admin import firestore
+from Inspector import Lease
+from Inspector import Sharding
+
+# Default number of words of each list of the leaderboard
+LEADERBOARD_SIZE = 36
+# Default minimum number of seconds between two writes of the leaderboard document
+REFRESH_SECONDS = 30.0
+# Number of candidates kept for each list, as a multiple of the size of the list
+CANDIDATES_FACTOR = 4
+# Maximum number of words outside the candidates whose deltas are tracked, the lists are seeded again beyond it
+PENDING_WORDS = 100000
+# Counter field of each list of the leaderboard document
+LISTS = {'overall': 'value', 'python': 'python_value', 'java': 'java_value'}
+
+
+class Board:
+    """
+    Top words of one counter field. The candidates are the words whose value is known exactly, every other word is
+    bounded by the floor (the highest value that is not a candidate) plus the deltas it received since then
+    """
+
+    def __init__(self, field, size):
+        """
+        :param field: counter field of the words
+        :param size: number of words of the list
+        """
+        self.field = field
+        self.size = size
+        self.capacity = size * CANDIDATES_FACTOR
+        # word -> exact value
+        self.candidates = {}
+        # word -> deltas received outside the candidates since the floor was set
+        self.pending = collections.Counter()
+        self.floor = 0
+
+    def seed(self, database_client):
+        """
+        Load the candidates with one query of the highest values of the field
+        :param database_client: database client object
+        :return: None
+        """
+        query = (database_client.collection(u'words').order_by(self.field, direction=firestore.Query.DESCENDING)
+                 .limit(self.capacity))
+        self.candidates = {snapshot.id: snapshot.to_dict().get(self.field, 0) for snapshot in query.stream()}
+        self.pending.clear()
+        # the words outside a full list can not have more than its lowest value
+        self.floor = min(self.candidates.values()) if len(self.candidates) >= self.capacity else 0
+
+    def top(self):
+        """
+        Get the list of the board
+        :return: list of dictionaries with the name and the value of the words, from the highest value
+        """
+        return [{'name': word, 'value': value}
+                for word, value in heapq.nlargest(self.size, self.candidates.items(), key=lambda item: (item[1], item[0]))]
+
+    def threshold(self):
+        """
+        Get the value a word needs to enter the list
+        :return: lowest value of the list, 0 while the list is not full
+        """
+        if len(self.candidates) < self.size:
+            return 0
+        return heapq.nlargest(self.size, self.candidates.values())[-1]
+
+    def apply(self, deltas):
+        """
+        Apply the deltas of a flush
+        :param deltas: word -> delta of the field
+        :return: words outside the candidates that may enter the list, their value has to be read
+        """
+        threshold = self.threshold()
+        suspects = []
+        known = {}
+        for word, delta in deltas.items():
+            if delta == 0:
+                continue
+            if word in self.candidates:
+                self.candidates[word] += delta
+                continue
+            self.pending[word] += delta
+            if self.floor + self.pending[word] >= threshold:
+                # with a floor of 0 the deltas are the whole value of the word, there is nothing to read
+                if self.floor == 0:
+                    known[word] = self.pending[word]
+                else:
+                    suspects.append(word)
+        self.admit(known)
+        return suspects
+
+    def admit(self, values):
+        """
+        Add the words whose value was read to the candidates, the lowest candidates are evicted beyond the capacity
+        :param values: word -> exact value
+        :return: None
+        """
+        for word, value in values.items():
+            self.candidates[word] = value
+            self.pending.pop(word, None)
+        if len(self.candidates) > self.capacity:
+            kept = heapq.nlargest(self.capacity, self.candidates.items(), key=lambda item: (item[1], item[0]))
+            evicted = self.candidates.keys() - {word for word, _ in kept}
+            # an evicted word is bounded by the floor from now on
+            self.floor = max([self.floor] + [self.candidates[word] for word in evicted])
+            for word in evicted:
+                del self.candidates[word]
+
+
+# boards of the leaderboard, None until configured; the writer is their only user
+_boards = None
+_refresh_seconds = REFRESH_SECONDS
+_last_publish = None
+_changed = False
+
+
+def configure(database_client, size=LEADERBOARD_SIZE, refresh_seconds=REFRESH_SECONDS):
+    """
+    Seed the leaderboard from the words already in the database
+    :param database_client: database client object
+    :param size: number of words of each list, 0 disables the leaderboard
+    :param refresh_seconds: minimum number of seconds between two writes of the leaderboard document
+    :return: None
+    """
+    global _boards, _refresh_seconds, _last_publish, _changed
+    _refresh_seconds = refresh_seconds
+    _last_publish = None
+    _changed = True
+    if size <= 0:
+        _boards = None
+        return
+    _boards = {name: Board(field, size) for name, field in LISTS.items()}
+    for board in _boards.values():
+        board.seed(database_client)
+    logging.info(f'Leaderboard seeded with {sum(len(board.candidates) for board in _boards.values())} candidates')
+
+
+def update(database_client, pending_words):
+    """
+    Apply the deltas of a flush of the writer, once they are written.
+    The words that may enter a list are read with one batched read.
+    :param database_client: database client object
+    :param pending_words: word -> counter of deltas by language field
+    :return: None
+    """
+    global _changed
+    if _boards is None or not pending_words:
+        return
+    suspects = {}
+    for board in _boards.values():
+        if board.field == 'value':
+            deltas = {word: sum(counter.values()) for word, counter in pending_words.items()}
+        else:
+            deltas = {word: counter[board.field] for word, counter in pending_words.items()}
+        suspects[board.field] = board.apply(deltas)
+    _changed = True
+
+    words = set().union(*suspects.values())
+    if words:
+        db_collection_words = database_client.collection(u'words')
+        references = [db_collection_words.document(word) for word in words]
+        snapshots = {snapshot.id: snapshot.to_dict() or {}
+                     for snapshot in database_client.get_all(references, field_paths=list(LISTS.values()))
+                     if snapshot.exists}
+        # the deltas of the shards are not in the documents until their rollup
+        for board in _boards.values():
+            board.admit({word: snapshots[word].get(board.field, 0) + Sharding.undrained(word, board.field)
+                         for word in suspects[board.field] if word in snapshots})
+
+    for board in _boards.values():
+        # bound the memory of the deltas outside the candidates; and after negative deltas of a refresh, a list whose
+        # lowest value fell below the floor may miss a word outside the candidates
+        if len(board.pending) > PENDING_WORDS or board.threshold() < board.floor:
+            # the documents hold every delta once the shards are rolled up
+            Sharding.rollup(database_client, force=True)
+            board.seed(database_client)
+
+
+def reseed(database_client):
+    """
+    Seed the boards again from the words in the database, with the deltas of the shards of this node not rolled up yet.
+    In a distributed run every node publishes the document, each one from the values written by all the nodes.
+    :param database_client: database client object
+    :return: None
+    """
+    for board in _boards.values():
+        board.seed(database_client)
+        board.candidates = {word: value + Sharding.undrained(word, board.field) for word, value in board.candidates.items()}
+
+
+def publish(database_client, force=False):
+    """
+    Write the leaderboard document when it changed, at most once every refresh interval. In a distributed run the
+    boards are seeded again first, so the document of a node never drops the words of the others.
+    :param database_client: database client object
+    :param force: write it without waiting for the refresh interval, at the end of the run
+    :return: True if the document is written, False otherwise
+    """
+    global _last_publish, _changed
+    if _boards is None or not _changed:
+        return False
+    if not force and _last_publish is not None and monotonic() - _last_publish < _refresh_seconds:
+        return False
+    if Lease.enabled():
+        # the boards only hold the deltas of this node, the words written by the other nodes are read back
+        try:
+            reseed(database_client)
+        except Exception as e:
+            logging.exception(f'Error while reading the leaderboard: {e}')
+            return False
+    document = {name: board.top() for name, board in _boards.items()}
+    document['updated'] = firestore.SERVER_TIMESTAMP
+    try:
+        database_client.collection(u'leaderboard').document(u'top').set(document)
+    except Exception as e:
+        logging.exception(f'Error while writing the leaderboard: {e}')
+        return False
+    _last_publish = monotonic()
+    _changed = False
+    return True
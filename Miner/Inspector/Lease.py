@@ -0,0 +1,603 @@
+# leases of the ranges and the repositories shared by the miners of a distributed run
+import os
+import uuid
+import socket
+import logging
+import sqlite3
+import threading
+import contextlib
+from time import time
+from google.api_core.exceptions import Conflict, FailedPrecondition, NotFound
+from Inspector import Metrics
+
+# Collection of the lease documents in Firestore
+LEASES_COLLECTION = 'leases'
+# Stores of the leases: Firestore, shared by every node, or a SQLite database, shared by the nodes of one host
+LEASE_STORES = ('firestore', 'sqlite')
+# Default path of the SQLite store
+LEASE_PATH = './cache/leases.sqlite3'
+# Default number of seconds a lease is valid without a heartbeat, the leases of a stopped node are reclaimed after it
+LEASE_SECONDS = 120.0
+# Number of heartbeats during the validity of a lease, a lease survives the loss of the others
+HEARTBEATS_PER_LEASE = 4
+# Kinds of leases: the star/date ranges, the repositories and the nodes, whose lease tells they are alive
+RANGE = 'range'
+REPOSITORY = 'repo'
+NODE = 'node'
+# Outcomes of a claim
+CLAIMED = 'claimed'
+HELD = 'held'
+DONE = 'done'
+
+# store of this process, None when the run is not distributed
+_store = None
+# identifier of this node, unique across the restarts of a container
+_node = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+# name of the run, the ranges are done once per run
+_run = None
+_lease_seconds = LEASE_SECONDS
+# lease key -> token of the last write of the lease by this node
+_held = {}
+# lease key -> tuple with the kind, the key and the keys of the leases its work waits for, the lease is done once their
+# work is written
+_finished = {}
+# finished lease keys waiting for a lease released or lost before its work was written, they are released without being done
+_incomplete = set()
+# tuples (kind, key) of the finished leases released without being done, they are claimed again
+_unfinished = []
+# lock of the held leases, a fenced write and a heartbeat never run at the same time
+_lock = threading.RLock()
+_stopped = threading.Event()
+_heartbeat = None
+
+
+class LeaseLost(Exception):
+    """
+    Raised when a lease held by this node has been reclaimed by another node
+    """
+
+
+class FirestoreLeases:
+    """
+    Leases stored as documents of the leases collection. Each lease is written with a precondition on the update time
+    read or written last, so two nodes never both take a lease; the update time of its last write is the token of the lease.
+    """
+
+    def __init__(self, database_client, clock=time):
+        """
+        :param database_client: database client object
+        :param clock: function returning the current time in seconds since the epoch
+        """
+        self.database_client = database_client
+        self.collection = database_client.collection(LEASES_COLLECTION)
+        self.clock = clock
+
+    def acquire(self, key, owner, seconds):
+        """
+        Take a lease that is free, expired or already held by the owner
+        :param key: lease key
+        :param owner: node taking the lease
+        :param seconds: validity of the lease
+        :return: tuple with the outcome of the claim and the token of the lease
+        """
+        reference = self.collection.document(document_id(key))
+        snapshot = reference.get()
+        fields = {'owner': owner, 'expires': self.clock() + seconds, 'state': HELD}
+        try:
+            if not snapshot.exists:
+                return CLAIMED, update_time(reference.create(fields))
+            current = snapshot.to_dict()
+            if current.get('state') == DONE:
+                return DONE, None
+            if current.get('owner') != owner and current.get('expires', 0) > self.clock():
+                return HELD, None
+            # an expired lease is reclaimed, unless another node reclaims it first
+            option = self.database_client.write_option(last_update_time=snapshot.update_time)
+            return CLAIMED, update_time(reference.update(fields, option=option))
+        except (Conflict, FailedPrecondition, NotFound):
+            return HELD, None
+
+    def renew(self, key, token, seconds):
+        """
+        Extend a lease held by this node
+        :param key: lease key
+        :param token: token of the lease
+        :param seconds: validity of the lease from now
+        :return: new token of the lease, None if it has been lost
+        """
+        reference = self.collection.document(document_id(key))
+        option = self.database_client.write_option(last_update_time=token)
+        try:
+            return update_time(reference.update({'expires': self.clock() + seconds}, option=option))
+        except (FailedPrecondition, NotFound):
+            return None
+
+    def release(self, key, token, done=False):
+        """
+        Give a lease back, or keep it forever once its work is done
+        :param key: lease key
+        :param token: token of the lease
+        :param done: the work of the lease is done, it is never claimed again
+        :return: None
+        """
+        reference = self.collection.document(document_id(key))
+        option = self.database_client.write_option(last_update_time=token)
+        try:
+            if done:
+                reference.update({'state': DONE}, option=option)
+            else:
+                reference.delete(option=option)
+        except (FailedPrecondition, NotFound):
+            logging.warning(f'Lease {key} lost before its release')
+
+    def fence(self, batch, key, token):
+        """
+        Release a lease in a batch, the batch fails if the lease has been lost
+        :param batch: write batch
+        :param key: lease key
+        :param token: token of the lease
+        :return: None
+        """
+        batch.delete(self.collection.document(document_id(key)), option=self.database_client.write_option(last_update_time=token))
+
+    def fenced(self, keys):
+        """
+        The leases released in a batch by fence are gone with the commit of the batch
+        :param keys: dictionary lease key -> token
+        :return: None
+        """
+
+    def alive(self, key):
+        """
+        :param key: lease key
+        :return: True if the lease is held and not expired
+        """
+        fields = self.collection.document(document_id(key)).get().to_dict() or {}
+        return fields.get('state') == HELD and fields.get('expires', 0) > self.clock()
+
+
+class SqliteLeases:
+    """
+    Leases stored in a SQLite database, each write is a transaction on the row of the lease and the version of the row is
+    the token of the lease. The database is shared by the processes of one host: it is the store of the local runs and of the
+    simulations, and it can not fence the writes to Firestore, which are checked before their commit instead.
+    """
+
+    def __init__(self, path=LEASE_PATH, clock=time):
+        """
+        :param path: path of the database, :memory: for a store of this process
+        :param clock: function returning the current time in seconds since the epoch
+        """
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # the transactions are explicit, and the connection is shared by the threads under the lock
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, '
+                                'expires REAL NOT NULL, state TEXT NOT NULL, version INTEGER NOT NULL)')
+        self.clock = clock
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Run statements in a transaction that locks the database for writing
+        :return: context manager yielding the connection
+        """
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def acquire(self, key, owner, seconds):
+        """
+        Take a lease that is free, expired or already held by the owner
+        :param key: lease key
+        :param owner: node taking the lease
+        :param seconds: validity of the lease
+        :return: tuple with the outcome of the claim and the token of the lease
+        """
+        with self.transaction() as connection:
+            row = connection.execute('SELECT owner, expires, state, version FROM leases WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                connection.execute('INSERT INTO leases VALUES (?, ?, ?, ?, 1)', (key, owner, self.clock() + seconds, HELD))
+                return CLAIMED, 1
+            current_owner, expires, state, version = row
+            if state == DONE:
+                return DONE, None
+            if current_owner != owner and expires > self.clock():
+                return HELD, None
+            connection.execute('UPDATE leases SET owner = ?, expires = ?, state = ?, version = ? WHERE key = ?',
+                               (owner, self.clock() + seconds, HELD, version + 1, key))
+            return CLAIMED, version + 1
+
+    def renew(self, key, token, seconds):
+        """
+        Extend a lease held by this node
+        :param key: lease key
+        :param token: token of the lease
+        :param seconds: validity of the lease from now
+        :return: new token of the lease, None if it has been lost
+        """
+        with self.transaction() as connection:
+            cursor = connection.execute('UPDATE leases SET expires = ?, version = version + 1 WHERE key = ? AND version = ?',
+                                        (self.clock() + seconds, key, token))
+        return token + 1 if cursor.rowcount == 1 else None
+
+    def release(self, key, token, done=False):
+        """
+        Give a lease back, or keep it forever once its work is done
+        :param key: lease key
+        :param token: token of the lease
+        :param done: the work of the lease is done, it is never claimed again
+        :return: None
+        """
+        with self.transaction() as connection:
+            if done:
+                cursor = connection.execute('UPDATE leases SET state = ?, version = version + 1 WHERE key = ? AND version = ?',
+                                            (DONE, key, token))
+            else:
+                cursor = connection.execute('DELETE FROM leases WHERE key = ? AND version = ?', (key, token))
+        if cursor.rowcount != 1:
+            logging.warning(f'Lease {key} lost before its release')
+
+    def fence(self, batch, key, token):
+        """
+        Check that a lease is still held before the commit of a batch
+        :param batch: write batch, nothing is added to it
+        :param key: lease key
+        :param token: token of the lease
+        :return: None
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT version FROM leases WHERE key = ?', (key,)).fetchone()
+        if row is None or row[0] != token:
+            raise LeaseLost(f'Lease {key} lost')
+
+    def fenced(self, keys):
+        """
+        Release the leases checked by fence, once their batch is committed
+        :param keys: dictionary lease key -> token
+        :return: None
+        """
+        for key, token in keys.items():
+            self.release(key, token)
+
+    def alive(self, key):
+        """
+        :param key: lease key
+        :return: True if the lease is held and not expired
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT state, expires FROM leases WHERE key = ?', (key,)).fetchone()
+        return row is not None and row[0] == HELD and row[1] > self.clock()
+
+
+def document_id(key):
+    """
+    Get the id of the document of a lease, a document id can not hold a slash
+    :param key: lease key
+    :return: document id in the leases collection
+    """
+    return key.replace('/', '__')
+
+
+def update_time(result):
+    """
+    Get the update time of a write, the token of the leases stored in Firestore
+    :param result: result of the write
+    :return: update time of the written document
+    """
+    return getattr(result, 'update_time', result)
+
+
+def configure(store, lease_seconds=LEASE_SECONDS, run=None):
+    """
+    Start the distributed mode of this process: the lease of the node is taken and a thread renews the held leases
+    :param store: store of the leases (FirestoreLeases or SqliteLeases), None disables the distributed mode
+    :param lease_seconds: number of seconds a lease is valid without a heartbeat
+    :param run: name of the run shared by the nodes, the ranges are done once per run; it is given to every node, a name
+    derived by each node, like its day, would differ between the nodes started on either side of midnight
+    :return: None
+    """
+    global _store, _run, _lease_seconds, _heartbeat
+    shutdown()
+    if store is not None and not run:
+        raise ValueError('A distributed run needs the name of the run shared by the nodes')
+    _store = store
+    if store is None:
+        return
+    _run = run
+    _lease_seconds = lease_seconds
+    if claim(NODE, _node) != CLAIMED:
+        raise LeaseLost(f'Lease of the node {_node} not taken')
+    _stopped.clear()
+    _heartbeat = threading.Thread(target=renew_leases, args=(lease_seconds / HEARTBEATS_PER_LEASE,), daemon=True)
+    _heartbeat.start()
+    logging.info(f'Distributed run {_run} - node {_node}')
+
+
+def shutdown():
+    """
+    Stop the heartbeats and give back the leases of this node, their work is left to the other nodes
+    :return: None
+    """
+    global _store, _heartbeat
+    if _heartbeat is not None:
+        _stopped.set()
+        _heartbeat.join()
+        _heartbeat = None
+    if _store is None:
+        return
+    with _lock:
+        # the lease of the node goes last, its journal is applied
+        for key in sorted(_held, key=lambda held_key: held_key.startswith(f'{NODE}:')):
+            try:
+                _store.release(key, _held[key])
+            except Exception as e:
+                # the lease expires instead
+                logging.warning(f'Lease {key} not released: {e}')
+        _held.clear()
+        _finished.clear()
+        _incomplete.clear()
+        _unfinished.clear()
+    _store = None
+
+
+def enabled():
+    """
+    :return: True if the run is distributed
+    """
+    return _store is not None
+
+
+def node():
+    """
+    :return: identifier of this node
+    """
+    return _node
+
+
+def retry_seconds():
+    """
+    :return: number of seconds between two claims of the work held by the other nodes
+    """
+    return _lease_seconds / HEARTBEATS_PER_LEASE
+
+
+def lease_key(kind, key):
+    """
+    Get the key of a lease, the ranges are leased once per run
+    :param kind: kind of the lease
+    :param key: range, repository document id or node
+    :return: lease key
+    """
+    return f'{kind}:{_run}:{key}' if kind == RANGE else f'{kind}:{key}'
+
+
+def claim(kind, key):
+    """
+    Claim the work of a key for this node, every claim succeeds when the run is not distributed
+    :param kind: kind of the lease
+    :param key: range, repository document id or node
+    :return: CLAIMED, HELD by another node or DONE
+    """
+    if _store is None:
+        return CLAIMED
+    full_key = lease_key(kind, key)
+    with Metrics.span('lease_claim_seconds'):
+        outcome, token = _store.acquire(full_key, _node, _lease_seconds)
+    if outcome == CLAIMED:
+        with _lock:
+            _held[full_key] = token
+    return outcome
+
+
+def release(kind, key, done=False):
+    """
+    Release a lease of this node. Its work is not written: the finished leases waiting for it are not done
+    :param kind: kind of the lease
+    :param key: range, repository document id or node
+    :param done: the work of the key is done, it is never claimed again in the run
+    :return: None
+    """
+    if _store is None:
+        return
+    full_key = lease_key(kind, key)
+    with _lock:
+        token = _held.pop(full_key, None)
+        if token is not None:
+            _store.release(full_key, token, done)
+        settle([full_key])
+
+
+def finish(kind, key, dependencies=(), complete=True):
+    """
+    Record that this node has finished the work of a lease: it is done once the work of the leases it waits for is
+    written, like a range whose repositories are being mined. Until then it is held, a stopped node leaves it to the
+    others. When one of them is released or lost without being written, or when some of the work is left to other
+    nodes, the lease is released without being done and unfinished returns it, so it is claimed again.
+    :param kind: kind of the lease
+    :param key: range, repository document id or node
+    :param dependencies: tuples (kind, key) of the leases of this node it waits for
+    :param complete: False when some of the work of the lease is held by other nodes
+    :return: None
+    """
+    if _store is None:
+        return
+    with _lock:
+        full_key = lease_key(kind, key)
+        _finished[full_key] = (kind, key, {lease_key(*dependency) for dependency in dependencies})
+        if not complete:
+            _incomplete.add(full_key)
+        settle(())
+
+
+def settle(released, written=False):
+    """
+    Release the finished leases that no longer wait for a lease of this node, the lock is held by the caller. They are
+    done if the work of every lease they waited for has been written.
+    :param released: keys of the released leases
+    :param written: the work of the released leases has been written
+    :return: None
+    """
+    for key, (kind, finished_key, dependencies) in list(_finished.items()):
+        if not written and not dependencies.isdisjoint(released):
+            _incomplete.add(key)
+        dependencies.difference_update(released)
+        # a dependency lost to another node is no longer waited for, its work is not written by this node
+        if not dependencies.issubset(_held):
+            _incomplete.add(key)
+            dependencies.intersection_update(_held)
+        if not dependencies:
+            del _finished[key]
+            done = key not in _incomplete
+            _incomplete.discard(key)
+            token = _held.pop(key, None)
+            if token is not None:
+                _store.release(key, token, done=done)
+                if not done:
+                    logging.warning(f'Lease {key} released without being done, some of its work is not written')
+                    _unfinished.append((kind, finished_key))
+
+
+def finishing(kind):
+    """
+    :param kind: kind of the leases
+    :return: number of finished leases of this node still waiting for the work of other leases
+    """
+    with _lock:
+        return sum(1 for finished_kind, _, _ in _finished.values() if finished_kind == kind)
+
+
+def unfinished(kind):
+    """
+    Take the finished leases released without being done, their work has to be claimed again
+    :param kind: kind of the leases
+    :return: list of the keys of the leases
+    """
+    with _lock:
+        keys = [key for unfinished_kind, key in _unfinished if unfinished_kind == kind]
+        _unfinished[:] = [(unfinished_kind, key) for unfinished_kind, key in _unfinished if unfinished_kind != kind]
+    return keys
+
+
+def lost(kind, keys):
+    """
+    :param kind: kind of the leases
+    :param keys: keys claimed by this node
+    :return: keys whose lease is no longer held by this node, another node reclaimed them
+    """
+    if _store is None:
+        return []
+    with _lock:
+        return [key for key in keys if lease_key(kind, key) not in _held]
+
+
+def check(kind, keys):
+    """
+    Renew leases of this node now instead of at the next heartbeat, like after a fenced batch failed: the leases that can
+    not be renewed are lost
+    :param kind: kind of the leases
+    :param keys: keys claimed by this node
+    :return: keys whose lease is lost
+    """
+    if _store is None:
+        return []
+    with _lock:
+        renew_held([lease_key(kind, key) for key in keys])
+        settle(())
+    return lost(kind, keys)
+
+
+@contextlib.contextmanager
+def fenced(batch, kind, keys):
+    """
+    Release leases of this node with the commit of a batch: the batch fails if one of them has been lost, so the work of a
+    reclaimed key is never written twice. The heartbeats wait for the commit, they would change the tokens. The caller
+    leaves out the keys returned by lost first, a lost lease fails the whole batch.
+    :param batch: write batch, committed in the context
+    :param kind: kind of the leases
+    :param keys: repository document ids
+    :return: context manager
+    """
+    if _store is None:
+        yield
+        return
+    full_keys = [lease_key(kind, key) for key in keys]
+    with _lock:
+        missing = [full_key for full_key in full_keys if full_key not in _held]
+        if missing:
+            raise LeaseLost(f'Leases lost: {missing}')
+        tokens = {full_key: _held[full_key] for full_key in full_keys}
+        for full_key, token in tokens.items():
+            _store.fence(batch, full_key, token)
+        yield
+        written(kind, keys)
+
+
+def written(kind, keys):
+    """
+    Release leases of this node whose work has been written by a fenced batch, like a batch committed despite an error
+    :param kind: kind of the leases
+    :param keys: repository document ids
+    :return: None
+    """
+    if _store is None:
+        return
+    full_keys = [lease_key(kind, key) for key in keys]
+    with _lock:
+        _store.fenced({full_key: _held[full_key] for full_key in full_keys if full_key in _held})
+        for full_key in full_keys:
+            _held.pop(full_key, None)
+        settle(full_keys, written=True)
+
+
+def alive(node_identifier):
+    """
+    Check if a node is running, its lease is renewed by its heartbeats
+    :param node_identifier: identifier of the node
+    :return: True if the lease of the node is held
+    """
+    if node_identifier == _node:
+        return True
+    return _store is not None and _store.alive(lease_key(NODE, node_identifier))
+
+
+def renew_leases(interval):
+    """
+    Renew the leases held by this node until it stops; a lease that can not be renewed is lost, another node reclaimed it
+    :param interval: number of seconds between two heartbeats
+    :return: None
+    """
+    while not _stopped.wait(interval):
+        with _lock:
+            renew_held(list(_held))
+            # the finished leases no longer wait for the lost ones
+            settle(())
+
+
+def renew_held(keys):
+    """
+    Renew leases held by this node, the lock is held by the caller
+    :param keys: lease keys
+    :return: None
+    """
+    for key in keys:
+        token = _held.get(key)
+        if token is None:
+            continue
+        try:
+            renewed = _store.renew(key, token, _lease_seconds)
+        except Exception as e:
+            # the next heartbeat tries again before the lease expires
+            logging.warning(f'Lease {key} not renewed: {e}')
+            continue
+        if renewed is None:
+            logging.warning(f'Lease {key} lost, another node reclaimed it')
+            del _held[key]
+        else:
+            _held[key] = renewed
@@ -0,0 +1,172 @@
+# fast-path extractors of the function names, from the tokens of the sources
+import re
+
+# Scan of a python source: each match skips the code, the comments and the single-line strings up to the next
+# multi-line string, definition (def or async def at the start of a line) or unterminated string. The skipped
+# parts run in C, the matches are only the few tokens that matter.
+PYTHON_SKIP = r'''(?:[^'"\#\n\\]+|\\.|'(?!'')[^'\\\n]*(?:\\.[^'\\\n]*)*'|"(?!"")[^"\\\n]*(?:\\.[^"\\\n]*)*"|\#[^\n]*
+    |\n(?![ \t\f]*(?:async[ \t\f]+)?def[ \t\f]))*'''
+PYTHON_TOKENS = re.compile(PYTHON_SKIP + r'''(?:
+    \'\'\'[^'\\]*(?:(?:\\.|'(?!''))[^'\\]*)*\'\'\'|"""[^"\\]*(?:(?:\\.|"(?!""))[^"\\]*)*"""
+    |\n[ \t\f]*(?:async[ \t\f]+)?def[ \t\f]+(?P<name>\w+)
+    |(?P<quote>['"])
+    |\Z)''', re.DOTALL | re.VERBOSE)
+# Comments and literals of a java source, they are blanked before the declarations are searched; a text block
+# ends its first line with a quote that is not blanked
+JAVA_NOISE = re.compile(r"""//[^\n]*|/\*.*?\*/|"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'""", re.DOTALL)
+# Candidate declarations of a java source: a name and its opening parenthesis, after a word, an array or a generic type
+JAVA_CANDIDATES = re.compile(r'(?:(?<![\w$])(?P<word>[A-Za-z_$][\w$]*)\s+|(?P<bracket>[\]>])\s*)(?P<name>[A-Za-z_$][\w$]*)\s*\(')
+# What follows the parameters of a declaration: its body, the end of an abstract method, an old array type or throws
+JAVA_DECLARATION_END = re.compile(r'\s*(?:[{;\[]|throws(?![\w$]))')
+# The sources using these constructs are left to the full parsers: annotation types, records, unicode escapes,
+# text blocks, unterminated literals and comments
+JAVA_AMBIGUOUS = re.compile(r'''@\s*interface(?![\w$])|(?<![\w$])record\s+[A-Za-z_$][\w$]*\s*[(<]|[\\"']|/\*''')
+# Keywords of java, the primitive types and void are types
+JAVA_KEYWORDS = frozenset((
+    'abstract', 'assert', 'break', 'case', 'catch', 'class', 'const', 'continue', 'default', 'do', 'else', 'enum',
+    'extends', 'final', 'finally', 'for', 'goto', 'if', 'implements', 'import', 'instanceof', 'interface', 'native',
+    'new', 'package', 'private', 'protected', 'public', 'return', 'static', 'strictfp', 'super', 'switch',
+    'synchronized', 'this', 'throw', 'throws', 'transient', 'try', 'volatile', 'while', 'true', 'false', 'null',
+    'yield'))
+JAVA_TYPE_KEYWORDS = frozenset(('boolean', 'byte', 'char', 'short', 'int', 'long', 'float', 'double', 'void'))
+
+
+class AmbiguousSource(Exception):
+    """
+    Raised when the tokens of a source are not enough to tell its declarations apart, the full parser is needed
+    """
+
+
+def python_function_names(source):
+    """
+    Get the names of the functions defined in python source code, like the FunctionDef and AsyncFunctionDef
+    nodes of its syntax tree
+    :param source: decoded python source code
+    :return: list of function names, in the order of the source
+    """
+    # the newline before the first line lets a definition start the source, the multi-line strings match empty groups
+    tokens = PYTHON_TOKENS.findall('\n' + source)
+    if any(quote for _, quote in tokens):
+        raise AmbiguousSource('unterminated string')
+    names = [name for name, _ in tokens if name]
+    # the parser normalizes the other identifiers (NFKC)
+    if not all(name.isascii() for name in names):
+        raise AmbiguousSource('identifier out of ascii')
+    return names
+
+
+def java_method_names(source):
+    """
+    Get the names of the methods declared in java source code, like the MethodDeclaration nodes of its syntax tree:
+    the constructors and the elements of the annotation types are not methods
+    :param source: decoded java source code
+    :return: list of method names, in the order of the source
+    """
+    code = JAVA_NOISE.sub(' ', source)
+    if not code.isascii() or JAVA_AMBIGUOUS.search(code):
+        raise AmbiguousSource('construct of the full parsers')
+    names = []
+    for match in JAVA_CANDIDATES.finditer(code):
+        name = match.group('name')
+        if name in JAVA_KEYWORDS or name in JAVA_TYPE_KEYWORDS:
+            continue
+        word = match.group('word')
+        if word is not None:
+            # a keyword starts a statement or an expression, an annotation names no type
+            if (word in JAVA_KEYWORDS and word not in JAVA_TYPE_KEYWORDS) or is_annotation(code, match.start('word')):
+                continue
+        elif match.group('bracket') == '>' and not is_type_arguments_end(code, match.start('bracket')):
+            continue
+        end = closing_parenthesis(code, match.end() - 1)
+        if end is not None and JAVA_DECLARATION_END.match(code, end + 1):
+            names.append(name)
+    return names
+
+
+def is_annotation(code, start):
+    """
+    Check if a word, possibly qualified, is the name of an annotation
+    :param code: java source code without noise
+    :param start: position of the word
+    :return: True if an @ comes before the qualified name
+    """
+    position = previous_character(code, start)
+    while position >= 0 and code[position] == '.':
+        # the qualifier of the name
+        position = previous_character(code, previous_word_start(code, previous_character(code, position)))
+    return position >= 0 and code[position] == '@'
+
+
+def is_type_arguments_end(code, position):
+    """
+    Check if a > closes the type arguments of a type, and not the type parameters of a generic constructor,
+    the type arguments of a generic call, a comparison, a shift or a lambda
+    :param code: java source code without noise
+    :param position: position of the >
+    :return: True if the > ends the type arguments of a type
+    """
+    if position > 0 and code[position - 1] == '-':
+        return False
+    depth = 0
+    while position >= 0:
+        character = code[position]
+        if character == '>':
+            depth += 1
+        elif character == '<':
+            depth -= 1
+            if depth == 0:
+                break
+        elif character in ';{}()=!&|+-*/%^':
+            return False
+        position -= 1
+    else:
+        return False
+    # the type arguments follow the name of their type
+    end = previous_character(code, position)
+    start = previous_word_start(code, end)
+    return start <= end and not code[start].isdigit() and code[start:end + 1] not in JAVA_KEYWORDS
+
+
+def previous_character(code, position):
+    """
+    Find the last character before a position that is not a space
+    :param code: java source code without noise
+    :param position: position to search from, excluded
+    :return: position of the character, -1 if there is none
+    """
+    position -= 1
+    while position >= 0 and code[position].isspace():
+        position -= 1
+    return position
+
+
+def previous_word_start(code, end):
+    """
+    Find the start of the word ending at a position
+    :param code: java source code without noise
+    :param end: position of the last character of the word
+    :return: position of the first character of the word, end + 1 if there is no word
+    """
+    start = end
+    while start >= 0 and (code[start].isalnum() or code[start] in '_$'):
+        start -= 1
+    return start + 1
+
+
+def closing_parenthesis(code, position):
+    """
+    Find the parenthesis closing an opening one
+    :param code: java source code without noise
+    :param position: position of the opening parenthesis
+    :return: position of the closing parenthesis, None if it is not closed
+    """
+    depth = 0
+    for index in range(position, len(code)):
+        character = code[index]
+        if character == '(':
+            depth += 1
+        elif character == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+    return None
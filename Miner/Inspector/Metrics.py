@@ -0,0 +1,186 @@
+# metrics of the pipeline
+import logging
+import threading
+import contextlib
+import collections
+from time import monotonic, perf_counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stages of the pipeline, in order
+STAGES = ('search', 'clone', 'parse', 'write')
+# Default port of the metrics endpoint, 0 disables it
+METRICS_PORT = 8000
+# Default address of the metrics endpoint
+METRICS_HOST = '127.0.0.1'
+# Prefix of the names of the exposed metrics
+PREFIX = 'miner'
+
+# repositories that went through each stage since the start of the run
+_counters = collections.Counter()
+# name -> [count, sum, max] of the observations, the timing spans end with _seconds; max is None without single observations
+_observations = {}
+# name -> function returning the current value of the gauge
+_gauges = {}
+_lock = threading.Lock()
+_start = monotonic()
+
+
+def increment(stage, value=1):
+    """
+    Count repositories that went through a stage
+    :param stage: name of the stage
+    :param value: number of repositories
+    :return: None
+    """
+    with _lock:
+        _counters[stage] += value
+
+
+def observe(name, value, count=1):
+    """
+    Record an observation, or several observations by their total
+    :param name: name of the observation
+    :param value: observed value, the total of the observations when count is more than 1
+    :param count: number of observations, their maximum is only known for a single observation
+    :return: None
+    """
+    with _lock:
+        observation = _observations.get(name)
+        if observation is None:
+            observation = _observations[name] = [0, 0.0, None]
+        observation[0] += count
+        observation[1] += value
+        if count == 1 and (observation[2] is None or value > observation[2]):
+            observation[2] = value
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    Time a block of code
+    :param name: name of the span, it ends with _seconds
+    :return: context manager
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, perf_counter() - start)
+
+
+def register_gauge(name, function):
+    """
+    Register a gauge read when the metrics are collected, like the size of a queue
+    :param name: name of the gauge
+    :param function: function without arguments returning the value of the gauge
+    :return: None
+    """
+    with _lock:
+        _gauges[name] = function
+
+
+def unregister_gauge(name):
+    """
+    Remove a gauge
+    :param name: name of the gauge
+    :return: None
+    """
+    with _lock:
+        _gauges.pop(name, None)
+
+
+def throughput():
+    """
+    Compute the throughput of each stage since the start of the run
+    :return: dictionary stage -> repositories per minute
+    """
+    minutes = max(monotonic() - _start, 1e-9) / 60
+    with _lock:
+        return {stage: _counters[stage] / minutes for stage in STAGES}
+
+
+def snapshot():
+    """
+    Copy the observations and read the gauges
+    :return: tuple with the observations name -> (count, sum, max) and the gauges name -> value
+    """
+    with _lock:
+        observations = {name: tuple(observation) for name, observation in _observations.items()}
+        gauges = dict(_gauges)
+    values = {}
+    for name, function in gauges.items():
+        try:
+            values[name] = function()
+        except Exception as e:
+            logging.error(f'Error reading the gauge {name}: {e}')
+    return observations, values
+
+
+def summary():
+    """
+    Summarize the throughput of the stages, the mean of the spans and the gauges
+    :return: summary line
+    """
+    line = 'Throughput (repos/minute) - ' + ', '.join(f'{stage}: {value:.1f}' for stage, value in throughput().items())
+    observations, gauges = snapshot()
+    if observations:
+        line += ' | Mean - ' + ', '.join(f'{name}: {total / count:.3f}' for name, (count, total, _) in sorted(observations.items()) if count)
+    if gauges:
+        line += ' | ' + ', '.join(f'{name}: {value}' for name, value in sorted(gauges.items()))
+    return line
+
+
+def exposition():
+    """
+    Format the metrics in the Prometheus text format
+    :return: text of the metrics
+    """
+    with _lock:
+        counters = dict(_counters)
+    observations, gauges = snapshot()
+    lines = [f'# TYPE {PREFIX}_repositories_total counter']
+    lines += [f'{PREFIX}_repositories_total{{stage="{stage}"}} {counters.get(stage, 0)}' for stage in STAGES]
+    for name, (count, total, maximum) in sorted(observations.items()):
+        lines += [f'# TYPE {PREFIX}_{name} summary', f'{PREFIX}_{name}_count {count}', f'{PREFIX}_{name}_sum {total}']
+        if maximum is not None:
+            lines += [f'# TYPE {PREFIX}_{name}_max gauge', f'{PREFIX}_{name}_max {maximum}']
+    for name, value in sorted(gauges.items()):
+        lines += [f'# TYPE {PREFIX}_{name} gauge', f'{PREFIX}_{name} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Handler of the metrics endpoint
+    """
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # the scrapes are not logged
+        pass
+
+
+def serve(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serve the metrics in the Prometheus text format from a background thread
+    :param port: port of the endpoint, 0 does not start it
+    :param host: address of the endpoint
+    :return: the server, None if it is not started
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f'Metrics served on http://{host}:{server.server_address[1]}/metrics')
+    return server
@@ -1,156 +1,670 @@
 import ast
-import glob
 import io
+import itertools
 import logging
 import os
 import re
 import subprocess
+import tarfile
+import urllib.request
+from time import perf_counter
+from xml.etree import ElementTree
 
 import javalang
 import collections
 from inflection import camelize
 from inflection import underscore
+from Inspector import Cache
+from Inspector import Lexer
+from Inspector import Tokenizer
+from Inspector import Watchdog
 
 
-def parse_repository_given_language(repository_folder_path, language, java_parser):
+# Number of files sent to a parsing worker at once, big enough to keep the IPC cost low
+PARSE_CHUNK_SIZE = 64
+# Maximum number of chunks submitted to the process pool and not yet merged
+PARSE_CHUNKS_IN_FLIGHT = 32
+# Java parsers that can be selected
+JAVA_PARSERS = ("javalang", "srcml", "lexer")
+# Python parsers that can be selected
+PYTHON_PARSERS = ("ast", "lexer")
+# Maximum number of files given to one srcML invocation, it keeps the command line short enough
+SRCML_BATCH_SIZE = 1000
+# XPath query of the function names and namespace of the srcML elements
+SRCML_FUNCTION_NAMES = "//src:function/src:name"
+SRCML_NAMESPACE = "{http://www.srcML.org/srcML/src}"
+# Extension of the source files of each language
+LANGUAGE_EXTENSIONS = {"python": ".py", "java": ".java"}
+# Seconds of the timeout of the archive downloads
+ARCHIVE_TIMEOUT = 60
+
+
+def parse_repository_given_language(repository_folder_path, language, java_parser, executor=None, statistics=None, python_parser="ast"):
     """
     Parse a repository and return a list of all the functions in the repository
     :param java_parser: java parser to use
     :param repository_folder_path: path to the repository folder
     :param language: language of the files to parse
+    :param executor: optional process pool used to parse the files in parallel
+    :param statistics: optional counter updated with the parse cache hits and misses, the files and the function names
+    :param python_parser: python parser to use
     :return: list of functions
     """
     # Verify if the repository folder exists
     if os.path.isdir(repository_folder_path):
         match language:
             case "python":
-                return parse_repository_given_extension(repository_folder_path, ".py", None)
+                return parse_repository_given_extension(repository_folder_path, ".py", python_parser, executor, statistics)
             case "java":
-                return parse_repository_given_extension(repository_folder_path, ".java", java_parser)
+                return parse_repository_given_extension(repository_folder_path, ".java", java_parser, executor, statistics)
             case _:
                 return "Unknown language"
     else:
         return "No repository found"
 
 
-def parse_repository_given_extension(repository_folder_path, extension, java_parser):
+def parse_repository_given_extension(repository_folder_path, extension, parser, executor=None, statistics=None):
     """
     Parse a repository and return a list of all the functions in the repository
-    :param java_parser: java parser to use
+    :param parser: parser of the extension, the java parser or the python parser
     :param repository_folder_path: path to the repository folder
     :param extension: extension of the files to parse
+    :param executor: optional process pool used to parse the files in parallel, if None the files are parsed serially
+    :param statistics: optional counter updated with the parse cache hits and misses, the files and the function names
     :return: list of functions
     """
     # Verify if the repository folder exists
     if os.path.isdir(repository_folder_path):
-        # Get all files in the repository
-        list_of_files = [file for file in glob.glob(f'{repository_folder_path}/**/*{extension}', recursive=True)]
-        # Get all functions in the files
-        list_of_words = []
-        # Match the extension to the correct function
-        match extension:
-            case ".py":
-                list_of_functions = []
-                for file in list_of_files:
-                    try:
-                        # Get all functions in the file and append them to the list of functions (Python)
-                        list_of_functions.extend(get_python_function_names(file))
-                    except Exception as e:
-                        pass
-                for function_name in list_of_functions:
-                    if is_snake_case(function_name):
-                        list_of_words.extend(snake_case_split(function_name))
-            case ".java":
-                list_of_methods = []
-                for file in list_of_files:
-                    try:
-                        # Get all functions in the file and append them to the list of functions (Java)
-                        # select the correct parser
-                        match java_parser:
-                            case "javalang":
-                                list_of_methods.extend(get_java_function_names_with_javalang(file))
-                            case "srcml":
-                                list_of_methods.extend(get_java_function_names_with_srcml(file))
-                            case _:
-                                return "Unknown java parser"
-                    except javalang.parser.JavaSyntaxError:
-                        pass
-                for method_name in list_of_methods:
-                    if is_camel_case(method_name):
-                        list_of_words.extend(camel_case_split(method_name))
-            case _:
-                return "Unknown extension"
-        # Return the list of words
-        elements_count = collections.Counter(list_of_words)
+        # Validate the extension and the parser before touching the files
+        if extension not in (".py", ".java"):
+            return "Unknown extension"
+        if extension == ".java" and parser not in JAVA_PARSERS:
+            return "Unknown java parser"
+        if extension == ".py" and parser not in (None, *PYTHON_PARSERS):
+            return "Unknown python parser"
+        if statistics is None:
+            statistics = collections.Counter()
+        # Stream the files of the repository, they are never listed at once
+        files = iterate_files_with_extension(repository_folder_path, extension)
+        # Parse the files in the current process
+        if executor is None:
+            return count_words_in_files(files, extension, parser, statistics)
+        # Fan out the files in chunks to the process pool and merge the partial counters
+        elements_count = collections.Counter()
+        for partial_count, partial_statistics in map_chunks(executor, count_words_in_chunk, iterate_chunks(files, PARSE_CHUNK_SIZE),
+                                                            extension, parser):
+            elements_count.update(partial_count)
+            statistics.update(partial_statistics)
         return elements_count
     else:
         return "No repository found"
 
 
-def get_python_function_names(python_file):
+def parse_archive_given_language(archive_url, language, java_parser, executor=None, statistics=None, python_parser="ast"):
+    """
+    Download the source archive (tar.gz) of a repository and count the words of its function names.
+    The archive is streamed: its members are read one after the other from the response and never written to disk.
+    :param archive_url: url of the archive
+    :param language: language of the files to parse
+    :param java_parser: java parser to use
+    :param executor: optional process pool used to parse the files in parallel, if None the files are parsed serially
+    :param statistics: optional counter updated with the parse cache hits and misses, the files, their bytes,
+    their parse time and the function names; the commit of the archive is stored in its commit entry
+    :param python_parser: python parser to use
+    :return: counter with the words
+    """
+    extension = LANGUAGE_EXTENSIONS.get(language)
+    if extension is None:
+        return "Unknown language"
+    if extension == ".java" and java_parser not in JAVA_PARSERS:
+        return "Unknown java parser"
+    if extension == ".py" and python_parser not in (None, *PYTHON_PARSERS):
+        return "Unknown python parser"
+    parser = java_parser if extension == ".java" else python_parser
+    if statistics is None:
+        statistics = collections.Counter()
+    with urllib.request.urlopen(archive_url, timeout=ARCHIVE_TIMEOUT) as response:
+        # r|gz reads the members in order from the stream, without seeking
+        with tarfile.open(fileobj=response, mode="r|gz") as archive:
+            sources = iterate_sources_of_archive(archive, extension, statistics)
+            if executor is None:
+                return count_words_in_sources(sources, extension, parser, statistics)
+            elements_count = collections.Counter()
+            for partial_count, partial_statistics in map_chunks(executor, count_words_in_source_chunk, iterate_chunks(sources, PARSE_CHUNK_SIZE),
+                                                                extension, parser):
+                elements_count.update(partial_count)
+                statistics.update(partial_statistics)
+            return elements_count
+
+
+def iterate_sources_of_archive(archive, extension, statistics=None):
+    """
+    Read the source files with the given extension out of a streamed archive.
+    Like the walk of a repository folder, the hidden files and folders are skipped, and the members over the size budget
+    are skipped without being read.
+    :param archive: tarfile opened in streaming mode
+    :param extension: extension of the files
+    :param statistics: optional counter receiving the commit of the archive and the skipped files
+    :return: generator of tuples (path of the member, bytes of the member)
+    """
+    for member in archive:
+        # git archive stores the commit in the comment of the global header
+        if statistics is not None and "commit" not in statistics and archive.pax_headers.get("comment"):
+            statistics["commit"] = archive.pax_headers["comment"]
+        if not member.isfile() or not member.name.endswith(extension):
+            continue
+        if any(part.startswith(".") for part in member.name.split("/")):
+            continue
+        reason = Watchdog.check_size(member.size)
+        if reason is not None:
+            Watchdog.skip(statistics, member.name, reason)
+            continue
+        source_file = archive.extractfile(member)
+        if source_file is not None:
+            yield member.name, source_file.read()
+
+
+def count_words_in_source_chunk(sources, extension, parser):
+    """
+    Parse a chunk of sources in a parsing worker
+    :param sources: list of tuples (path of the file, bytes of the file)
+    :param extension: extension of the files to parse
+    :param parser: parser of the extension, the java parser or the python parser
+    :return: tuple with the counter of words and the counter of parse statistics
+    """
+    statistics = collections.Counter()
+    return count_words_in_sources(sources, extension, parser, statistics), statistics
+
+
+def count_words_in_sources(sources, extension, parser, statistics=None):
+    """
+    Parse sources held in memory and count the words of their function names
+    :param sources: iterable of tuples (path of the file, bytes of the file)
+    :param extension: extension of the files to parse
+    :param parser: parser of the extension, the java parser or the python parser
+    :param statistics: optional counter updated with the parse cache hits and misses, the files, their bytes,
+    their parse time and the function names
+    :return: counter with the words
+    """
+    return Tokenizer.count_words(iterate_function_names_of_sources(sources, extension, parser, statistics), extension)
+
+
+def iterate_function_names_of_sources(sources, extension, parser, statistics=None):
+    """
+    Get the function names of sources held in memory, each file is checked and parsed under the budgets of the Watchdog
+    :param sources: iterable of tuples (path of the file, bytes of the file)
+    :param extension: extension of the files to parse
+    :param parser: parser of the extension, the java parser or the python parser
+    :param statistics: optional counter updated with the parse cache hits and misses, the files, their bytes,
+    their parse time, the function names and the skipped files
+    :return: generator of function names
+    """
+    if statistics is None:
+        statistics = collections.Counter()
+    for file, content in sources:
+        reason = Watchdog.check_source(content)
+        if reason is not None:
+            Watchdog.skip(statistics, file, reason)
+            continue
+        start = perf_counter()
+        try:
+            with Watchdog.time_budget():
+                names = get_function_names_from_source(content, file, extension, parser, statistics)
+        except Watchdog.BudgetExceeded:
+            Watchdog.skip(statistics, file, 'timeout')
+            continue
+        except Exception as e:
+            logging.error(e)
+            logging.error("Error parsing file: " + file)
+            Watchdog.skip(statistics, file, 'error')
+            continue
+        statistics['parse_file_seconds'] += perf_counter() - start
+        statistics.update({'files': 1, 'identifiers': len(names), 'bytes': len(content)})
+        yield from names
+
+
+def iterate_sources_of_files(files, statistics=None):
+    """
+    Read source files, the files over the size budget are skipped without being read
+    :param files: iterable of the paths of the files
+    :param statistics: optional counter updated with the skipped files
+    :return: generator of tuples (path of the file, bytes of the file)
+    """
+    for file in files:
+        try:
+            reason = Watchdog.check_size(os.path.getsize(file))
+            if reason is not None:
+                Watchdog.skip(statistics, file, reason)
+                continue
+            with io.open(file, "rb") as source_file:
+                content = source_file.read()
+        except Exception as e:
+            logging.error(e)
+            logging.error("Error parsing file: " + file)
+            continue
+        yield file, content
+
+
+def iterate_files_with_extension(repository_folder_path, extension):
+    """
+    Walk a repository with os.scandir and yield its files with the given extension.
+    Like the recursive glob it replaces, hidden files and folders are skipped; symbolic links to folders are not followed.
+    The walk is depth first and keeps one open iterator per level, so its memory depends on the depth of the repository,
+    not on the number of its folders.
+    :param repository_folder_path: path to the repository folder
+    :param extension: extension of the files
+    :return: generator of file paths
+    """
+    stack = []
+    try:
+        stack.append(os.scandir(repository_folder_path))
+        while stack:
+            try:
+                entry = next(stack[-1], None)
+            except OSError as e:
+                logging.error(e)
+                entry = None
+            if entry is None:
+                stack.pop().close()
+                continue
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(os.scandir(entry.path))
+                elif entry.name.endswith(extension) and entry.is_file():
+                    yield entry.path
+            except OSError as e:
+                logging.error(e)
+    except OSError as e:
+        logging.error(e)
+    finally:
+        for entries in stack:
+            entries.close()
+
+
+def iterate_chunks(iterable, size):
+    """
+    Group the elements of an iterable in lists
+    :param iterable: iterable to group
+    :param size: size of the lists, the last one may be shorter
+    :return: generator of lists
+    """
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def map_chunks(executor, function, chunks, *args):
+    """
+    Map a function over chunks in a process pool, with at most PARSE_CHUNKS_IN_FLIGHT chunks submitted at once
+    so the chunks are produced while the workers parse
+    :param executor: process pool, a Watchdog.RecyclingExecutor replaces its processes when they are killed
+    :param function: function called with each chunk followed by args
+    :param chunks: iterable of chunks
+    :param args: other arguments of the function
+    :return: generator of the results, in the order of the chunks
+    """
+    in_flight = collections.deque()
+    for chunk in chunks:
+        in_flight.append((chunk, executor.submit(function, chunk, *args)))
+        if len(in_flight) >= PARSE_CHUNKS_IN_FLIGHT:
+            chunk, future = in_flight.popleft()
+            yield Watchdog.result_or_retry(executor, future, function, chunk, args)
+    while in_flight:
+        chunk, future = in_flight.popleft()
+        yield Watchdog.result_or_retry(executor, future, function, chunk, args)
+
+
+def initialize_worker(cache_path, cache_entries, file_bytes=Watchdog.FILE_BYTES, file_seconds=Watchdog.FILE_SECONDS, heuristics=True):
+    """
+    Initializer of the parsing processes: their parse cache and their budgets
+    :param cache_path: path of the cache database, None or an empty path disables the cache
+    :param cache_entries: maximum number of files in the cache
+    :param file_bytes: maximum size in bytes of a parsed file
+    :param file_seconds: time budget in seconds of the parse of a file
+    :param heuristics: skip the generated and minified files
+    :return: None
+    """
+    Cache.configure(cache_path, cache_entries)
+    Watchdog.configure(file_bytes, file_seconds, heuristics, worker=True)
+
+
+def count_words_in_chunk(list_of_files, extension, parser):
+    """
+    Parse a chunk of files in a parsing worker
+    :param list_of_files: paths of the files to parse
+    :param extension: extension of the files to parse
+    :param parser: parser of the extension, the java parser or the python parser
+    :return: tuple with the counter of words and the counter of parse statistics
+    """
+    statistics = collections.Counter()
+    return count_words_in_files(list_of_files, extension, parser, statistics), statistics
+
+
+def count_words_in_files(files, extension, parser, statistics=None):
+    """
+    Parse files and count the words of their function names, names and words are streamed into the counter
+    :param files: iterable of the paths of the files to parse
+    :param extension: extension of the files to parse
+    :param parser: parser of the extension, the java parser or the python parser
+    :param statistics: optional counter updated with the parse cache hits and misses, the files and the function names
+    :return: counter with the words
+    """
+    return Tokenizer.count_words(iterate_function_names(files, extension, parser, statistics), extension)
+
+
+def iterate_function_names(files, extension, parser, statistics=None):
+    """
+    Get the function names of files
+    :param files: iterable of the paths of the files to parse
+    :param extension: extension of the files to parse
+    :param parser: parser of the extension, the java parser or the python parser
+    :param statistics: optional counter updated with the parse cache hits and misses, the files, their bytes,
+    their parse time and the function names
+    :return: generator of function names
+    """
+    if statistics is None:
+        statistics = collections.Counter()
+    if extension == ".java" and parser == "srcml":
+        # srcML parses each batch of files in one invocation
+        for list_of_files in iterate_chunks(iterate_checked_files(files, statistics), SRCML_BATCH_SIZE):
+            start = perf_counter()
+            names = get_java_function_names_of_files_with_srcml(list_of_files, statistics)
+            statistics['parse_file_seconds'] += perf_counter() - start
+            statistics.update({'files': len(list_of_files), 'identifiers': len(names), 'bytes': files_size(list_of_files)})
+            yield from names
+        return
+    # each file is read once, its content is checked, looked up in the cache and parsed
+    yield from iterate_function_names_of_sources(iterate_sources_of_files(files, statistics), extension, parser, statistics)
+
+
+def iterate_checked_files(files, statistics=None):
+    """
+    Filter the files that are parsed by another process, like srcML, with the checks of the Watchdog
+    :param files: iterable of the paths of the files
+    :param statistics: optional counter updated with the skipped files
+    :return: generator of the paths of the files to parse
+    """
+    for file, content in iterate_sources_of_files(files, statistics):
+        reason = Watchdog.check_source(content)
+        if reason is not None:
+            Watchdog.skip(statistics, file, reason)
+            continue
+        yield file
+
+
+def files_size(files):
+    """
+    Get the total size of files
+    :param files: paths of the files
+    :return: size in bytes, the files that can not be read count for 0
+    """
+    size = 0
+    for file in files:
+        try:
+            size += os.path.getsize(file)
+        except OSError:
+            pass
+    return size
+
+
+def get_function_names_from_source(content, file, extension, parser, statistics=None):
+    """
+    Get the function names of a source held in memory, looking them up first in the parse cache
+    :param content: bytes of the file
+    :param file: path to the file, used in the logs
+    :param extension: extension of the file
+    :param parser: parser of the extension, the java parser or the python parser
+    :param statistics: optional counter updated with the parse cache hits and misses
+    :return: list of function names
+    """
+    key = None
+    if Cache.enabled():
+        key = Cache.content_key(content, parser_identity(extension, parser))
+        names = Cache.get(key)
+        if statistics is not None:
+            statistics['cache_hits' if names is not None else 'cache_misses'] += 1
+        if names is not None:
+            return names
+    match extension, parser:
+        case ".py", "lexer":
+            names = get_python_function_names_from_source_with_lexer(content, file)
+        case ".py", _:
+            names = get_python_function_names_from_source(content, file)
+        case ".java", "javalang":
+            names = get_java_function_names_from_source_with_javalang(content, file)
+        case ".java", "lexer":
+            names = get_java_function_names_from_source_with_lexer(content, file)
+        case ".java", "srcml":
+            names = get_java_function_names_from_source_with_srcml(content, file)
+        case _:
+            names = []
+    if key is not None:
+        Cache.put(key, names)
+    return names
+
+
+def get_java_function_names_of_files_with_srcml(list_of_files, statistics=None):
+    """
+    Get the method names of Java files with srcML, the files missing from the parse cache are parsed together.
+    Only the files srcML has parsed are cached, the others are skipped.
+    :param list_of_files: paths of the java files
+    :param statistics: optional counter updated with the parse cache hits and misses, and the skipped files
+    :return: list of method names
+    """
+    list_of_methods = []
+    missing_files = {}
+    for file in list_of_files:
+        if Cache.enabled():
+            names, key, _ = lookup_function_names(file, ".java:srcml", statistics)
+            if names is not None:
+                list_of_methods.extend(names)
+                continue
+            missing_files[file] = key
+        else:
+            missing_files[file] = None
+    for file, names in iterate_java_function_names_with_srcml(list(missing_files), statistics):
+        if missing_files[file] is not None:
+            Cache.put(missing_files[file], names)
+        list_of_methods.extend(names)
+    return list_of_methods
+
+
+def parser_identity(extension, parser):
+    """
+    Get the identity of the parser of an extension, a part of the keys of the parse cache
+    :param extension: extension of the file
+    :param parser: parser of the extension, None for the default python parser
+    :return: identity of the parser
+    """
+    return f'{extension}:{parser or "ast"}'
+
+
+def lookup_function_names(file, parser, statistics=None):
+    """
+    Look up the function names of a file in the parse cache
+    :param file: path to the file
+    :param parser: identity of the parser
+    :param statistics: optional counter updated with the parse cache hits and misses
+    :return: tuple with the cached names (None on a miss), the key and the content of the file
+    """
+    # Get the content of the file, the cache key is built from it
+    try:
+        with io.open(file, "rb") as source_file:
+            content = source_file.read()
+    except Exception as e:
+        logging.error(e)
+        logging.error("Error parsing file: " + file)
+        return [], None, None
+    key = Cache.content_key(content, parser)
+    names = Cache.get(key)
+    if statistics is not None:
+        statistics['cache_hits' if names is not None else 'cache_misses'] += 1
+    return names, key, content
+
+
+def decode_source(content):
+    """
+    Decode the bytes of a source file like a text file opened in utf-8
+    :param content: bytes of the source file
+    :return: source code with universal newlines
+    """
+    return content.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def get_python_function_names_from_source(content, python_file=""):
     """
     Parse python source code with ast library and get function names
-    :param python_file: path to the python file
+    :param content: bytes of the python file
+    :param python_file: path to the python file, used in the logs
     :return: list of function names
     """
     try:
-        # Get source code from python file
-        source_code = io.open(python_file, "r", encoding="utf-8")
         # Parse source code with ast library
-        tree = ast.parse(source_code.read())
+        tree = ast.parse(decode_source(content))
 
         # Get all function names
-        return [node.name for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
+        return [node.name for node in ast.walk(tree) if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    except Exception as e:
+        logging.error(e)
+        logging.error("Error parsing file: " + python_file)
+        return []
+
+
+def get_python_function_names_from_source_with_lexer(content, python_file=""):
+    """
+    Scan python source code for its definitions and get function names, the ambiguous sources are parsed with ast
+    :param content: bytes of the python file
+    :param python_file: path to the python file, used in the logs
+    :return: list of function names
+    """
+    try:
+        return Lexer.python_function_names(decode_source(content))
+    except Lexer.AmbiguousSource:
+        return get_python_function_names_from_source(content, python_file)
     except Exception as e:
         logging.error(e)
         logging.error("Error parsing file: " + python_file)
         return []
-    finally:
-        source_code.close()
 
 
-def get_java_function_names_with_javalang(java_file):
+def get_java_function_names_from_source_with_javalang(content, java_file=""):
     """
     Parse Java source code with javalang library and get method names
-    :param java_file: path to the java file
+    :param content: bytes of the java file
+    :param java_file: path to the java file, used in the logs
     :return: list of method names
     """
     try:
-        # Get source code from java file
-        source_code = io.open(java_file, "r", encoding="utf-8")
         # Parse source code with javalang library
-        tree = javalang.parse.parse(source_code.read())
+        tree = javalang.parse.parse(decode_source(content))
         # Get all method names
         return [node.name for path, node in tree.filter(javalang.tree.MethodDeclaration)]
     except Exception as e:
         print(e)
         logging.error("Error parsing file: " + java_file)
         return []
-    finally:
-        source_code.close()
 
 
-def get_java_function_names_with_srcml(java_file):
+def get_java_function_names_from_source_with_lexer(content, java_file=""):
     """
-    Parse Java source code with srcml library and get method names
-    :param java_file: path to the java file
+    Scan Java source code for its declarations and get method names, the ambiguous sources are parsed with javalang
+    :param content: bytes of the java file
+    :param java_file: path to the java file, used in the logs
     :return: list of method names
     """
-    j_file = java_file
-    x_file = java_file.replace(".java", ".xml")
-
     try:
-        subprocess.run(f"srcml {j_file} -o  {x_file}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        xpath = subprocess.run(f"srcml --xpath '//src:function/src:name' {x_file}", stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        xpath_output = xpath.stdout.decode("utf-8")
-        matches = re.findall(r'<name>(.+)</name>', xpath_output)
-        return matches
+        return Lexer.java_method_names(decode_source(content))
+    except Lexer.AmbiguousSource:
+        return get_java_function_names_from_source_with_javalang(content, java_file)
     except Exception as e:
         print(e)
         logging.error("Error parsing file: " + java_file)
         return []
 
 
+def get_java_function_names_from_source_with_srcml(content, java_file=""):
+    """
+    Parse Java source code given on the standard input of srcML and get method names.
+    A missing srcML, or a srcML that fails, raises: an empty list would be cached as the names of the file.
+    :param content: bytes of the java file
+    :param java_file: path to the java file, used in the logs
+    :return: list of method names
+    """
+    # without a file srcML needs the language of its input
+    process = subprocess.run(["srcml", "--language", "Java", "--xpath", SRCML_FUNCTION_NAMES], input=content,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if process.returncode != 0:
+        raise RuntimeError(f"srcml exited with {process.returncode} on {java_file}")
+    root = ElementTree.fromstring(process.stdout)
+    # the names of the results are the children of their units, like in the batch parse
+    return ["".join(element.itertext()) for unit in root.iter(f"{SRCML_NAMESPACE}unit")
+            for element in unit if element.tag == f"{SRCML_NAMESPACE}name"]
+
+
+def iterate_java_function_names_with_srcml(java_files, statistics=None):
+    """
+    Parse Java files with one srcML invocation per batch of files and stream the method names out of its output.
+    No XML file is written, srcML applies the XPath query while it parses the sources.
+    A batch that parses no file for the time budget of a file is killed, and a batch whose srcML is missing, crashes or exits with an error
+    yields no result for its files without results: they are skipped, and not cached as files without methods.
+    :param java_files: paths of the java files
+    :param statistics: optional counter updated with the skipped files
+    :return: generator of tuples (path of the file, list of method names)
+    """
+    for i in range(0, len(java_files), SRCML_BATCH_SIZE):
+        batch = java_files[i:i + SRCML_BATCH_SIZE]
+        names = {file: [] for file in batch}
+        # srcML reports the path it has been given, normalized paths are used to match them
+        files = {os.path.normpath(file): file for file in batch}
+        seen = set()
+        budget = None
+        process = None
+        failed = False
+        try:
+            # the arguments are given as a list, so the paths are never interpreted by a shell
+            with subprocess.Popen(["srcml", "--xpath", SRCML_FUNCTION_NAMES, *batch],
+                                  stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as process:
+                budget = Watchdog.batch_budget(process.kill)
+                # each result is a unit holding the filename of its source file
+                stack = []
+                for event, element in ElementTree.iterparse(process.stdout, events=("start", "end")):
+                    if event == "start":
+                        stack.append(element)
+                        continue
+                    stack.pop()
+                    if element.tag == f"{SRCML_NAMESPACE}name" and stack and stack[-1].tag == f"{SRCML_NAMESPACE}unit":
+                        filename = next((unit.get("filename") for unit in reversed(stack) if unit.get("filename")), None)
+                        file = files.get(os.path.normpath(filename)) if filename is not None else None
+                        if file is None and len(batch) == 1:
+                            file = batch[0]
+                        if file is not None:
+                            seen.add(file)
+                            names[file].append("".join(element.itertext()))
+                    elif element.tag == f"{SRCML_NAMESPACE}unit" and len(stack) == 1:
+                        # drop the results already read, the memory does not grow with the output
+                        stack[0].clear()
+                        if budget is not None:
+                            budget.progress()
+        except Exception as e:
+            print(e)
+            logging.error("Error parsing files with srcml: " + ", ".join(batch))
+            failed = True
+        finally:
+            if budget is not None:
+                budget.cancel()
+        if failed or process is None or process.returncode != 0:
+            # the files without results are not known to have no method
+            reason = 'timeout' if budget is not None and budget.expired else 'error'
+            for file in batch:
+                if file not in seen:
+                    Watchdog.skip(statistics, file, reason)
+            yield from ((file, file_names) for file, file_names in names.items() if file in seen)
+            continue
+        yield from names.items()
+
+
 def is_camel_case(function_name):
     """
     Check if a function name is in camel case
@@ -0,0 +1,176 @@
+# adaptive partition of the search space in ranges of stars and creation dates
+import os
+import json
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from Inspector import Extractor
+from Inspector import Search
+
+# Default path of the partition plan, it is reused by the next runs
+PLAN_PATH = './cache/partition_plan.json'
+# Default maximum age in days of a reusable plan
+PLAN_MAX_AGE_DAYS = 30
+# Maximum number of results of a range, below the search limit so a range can grow until it is mined
+RANGE_LIMIT = 900
+# Creation date of the first repositories of GitHub
+START_DATE = date(2007, 10, 1)
+
+
+def plan_ranges(lower_bound, upper_bound, plan_path=PLAN_PATH, max_age_days=PLAN_MAX_AGE_DAYS, client=None):
+    """
+    Get the ranges to mine, every range has at most RANGE_LIMIT results so none is cut off by the search limit.
+    The plan is read from plan_path when it is recent enough, otherwise it is discovered and saved.
+    :param lower_bound: stars below the lower bound make the first range
+    :param upper_bound: stars above the upper bound make the last range
+    :param plan_path: path of the plan, None does not read nor save it
+    :param max_age_days: maximum age in days of a reusable plan
+    :param client: search client, a client with the token of the extractor by default
+    :return: list of ranges from the most popular to the least popular
+    """
+    key = {'lower_bound': lower_bound, 'upper_bound': upper_bound, 'query': Extractor.search_query('')}
+    plan = load_plan(plan_path, key, max_age_days)
+    if plan is None:
+        client = client or Search.SearchClient(Extractor.GITHUB_API_TOKEN, Extractor.GITHUB_API_URL)
+        today = date.today()
+        roots = [(1, lower_bound - 1, None, None), (lower_bound, upper_bound, None, None), (upper_bound + 1, None, None, None)]
+        leaves = asyncio.run(discover(client, [root for root in roots if root[1] is None or root[0] <= root[1]], today))
+        plan = [{'stars': leaf[0], 'count': leaf[1]} for leaf in merge_ranges(leaves)]
+        logging.info(f'Partition plan: {len(plan)} ranges discovered with {client.statistics["requests"]} search requests')
+        save_plan(plan_path, key, plan)
+    # start from the most popular
+    return [format_range(*tuple(r['stars'])) for r in reversed(plan)]
+
+
+async def discover(client, spaces, today):
+    """
+    Split recursively the spaces over RANGE_LIMIT results, first by stars and then by creation date
+    :param client: search client
+    :param spaces: tuples (lowest stars, highest stars or None, first date or None, last date or None)
+    :param today: last creation date
+    :return: list of tuples (space, count) from the least popular to the most popular
+    """
+    leaves = []
+    for space in spaces:
+        count = await client.count(Extractor.search_query(format_range(*space)))
+        if count <= RANGE_LIMIT:
+            if count > 0:
+                leaves.append((space, count))
+            continue
+        halves = split_range(space, today)
+        if halves is None:
+            # a single day with a single number of stars can not be split, its last results are not reachable
+            logging.warning(f'{format_range(*space)} has {count} results, it can not be split')
+            leaves.append((space, count))
+            continue
+        leaves.extend(await discover(client, halves, today))
+    return leaves
+
+
+def split_range(space, today):
+    """
+    Split a space in two halves
+    :param space: tuple (lowest stars, highest stars or None, first date or None, last date or None)
+    :param today: last creation date
+    :return: tuple with the two halves, None if the space can not be split
+    """
+    low, high, first, last = space
+    if high is None:
+        # stars are distributed with a long tail, the open range is split at twice its lower bound
+        return (low, low * 2, first, last), (low * 2 + 1, None, first, last)
+    if low < high:
+        middle = (low + high) // 2
+        return (low, middle, first, last), (middle + 1, high, first, last)
+    first, last = first or START_DATE, last or today
+    if first < last:
+        middle = first + (last - first) // 2
+        return (low, high, first, middle), (low, high, middle + timedelta(days=1), last)
+    return None
+
+
+def merge_ranges(leaves):
+    """
+    Merge the adjacent ranges while their results fit in one range
+    :param leaves: list of tuples (space, count) in order
+    :return: list of tuples (space, count)
+    """
+    merged = []
+    for space, count in leaves:
+        if merged:
+            (low, high, first, last), previous_count = merged[-1]
+            if previous_count + count <= RANGE_LIMIT:
+                # same creation dates and consecutive stars
+                if (first, last) == space[2:] and high is not None and high + 1 == space[0]:
+                    merged[-1] = ((low, space[1], first, last), previous_count + count)
+                    continue
+                # same stars and consecutive creation dates
+                if (low, high) == space[:2] and last is not None and space[2] is not None and last + timedelta(days=1) == space[2]:
+                    merged[-1] = ((low, high, first, space[3]), previous_count + count)
+                    continue
+        merged.append((space, count))
+    return merged
+
+
+def format_range(low, high, first, last):
+    """
+    Format a space as search qualifiers
+    :param low: lowest stars
+    :param high: highest stars, None for no limit
+    :param first: first creation date, None for no limit
+    :param last: last creation date
+    :return: range of stars (Some may include dates)
+    """
+    stars = f'stars:>={low}' if high is None else f'stars:{low}..{high}'
+    if first is None:
+        return stars
+    return f'{stars} created:{to_iso(first)}..{to_iso(last)}'
+
+
+def to_iso(value):
+    """
+    Format a date, it accepts the dates read from a saved plan
+    :param value: date or ISO string
+    :return: ISO string
+    """
+    return value if isinstance(value, str) else value.isoformat()
+
+
+def load_plan(plan_path, key, max_age_days):
+    """
+    Read a saved plan
+    :param plan_path: path of the plan
+    :param key: parameters of the plan, a plan saved with other parameters is not reused
+    :param max_age_days: maximum age in days of the plan
+    :return: list of ranges, None if there is no reusable plan
+    """
+    if not plan_path or not os.path.exists(plan_path):
+        return None
+    try:
+        with open(plan_path, encoding='utf-8') as plan_file:
+            saved = json.load(plan_file)
+        if saved['key'] != key or datetime.now() - datetime.fromisoformat(saved['created']) > timedelta(days=max_age_days):
+            return None
+        logging.info(f'Partition plan: {len(saved["ranges"])} ranges read from {plan_path}')
+        return saved['ranges']
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f'Error reading the partition plan: {e}')
+        return None
+
+
+def save_plan(plan_path, key, plan):
+    """
+    Save a plan so the next runs can reuse it
+    :param plan_path: path of the plan
+    :param key: parameters of the plan
+    :param plan: list of ranges
+    :return: None
+    """
+    if not plan_path:
+        return
+    directory = os.path.dirname(plan_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    serializable = [{'stars': [r['stars'][0], r['stars'][1], to_iso(r['stars'][2]) if r['stars'][2] else None,
+                               to_iso(r['stars'][3]) if r['stars'][3] else None], 'count': r['count']} for r in plan]
+    with open(plan_path, 'w', encoding='utf-8') as plan_file:
+        json.dump({'key': key, 'created': datetime.now().isoformat(), 'ranges': serializable}, plan_file, indent=1)
@@ -1,32 +1,33 @@
 # consumer task
 import shutil
-from time import sleep
-from firebase_admin import firestore
+import logging
+import collections
+from Inspector import Cache
+from Inspector import Metrics
 from Inspector import Parser
+from Inspector import Registry
+from Inspector import Watchdog
 
 
-def process_repo(q, identifier, java_parser, database_client):
+def process_repo(q, identifier, java_parser, write_queue, executor=None, clone_mode='full', python_parser='ast'):
     """
     Function in order to process the repositories
     :param java_parser: selector parser
     :param q: The queue
     :param identifier: identifier of the thread
-    :param database_client: database client object
+    :param write_queue: queue of the writer that aggregates the words and writes them to the database
+    :param executor: optional process pool shared by the consumers to parse the files
+    :param clone_mode: clone mode of the clone workers, in archive mode the items hold the url of the archive
+    :param python_parser: python parser
     :return: None
     """
 
-    # Get the collection reference for words
-    db_collection_words = database_client.collection(u'words')
-    # Get the collection reference for repositories
-    db_collection_repos = database_client.collection(u'repos')
-    # Open batch for updates words
-    batch = database_client.batch()
-
     print(f'Consumer {identifier}: Running')
     # While the queue is not empty it continues to process the repositories
     while True:
-        # get a unit of work, meaning the repository path
-        item = q.get()
+        # get a unit of work, meaning the repository path, the wait is the idle time of the consumer
+        with Metrics.span('consumer_idle_seconds'):
+            item = q.get()
         # check for stop
         if item is None:
             # add the signal back for other consumers
@@ -34,65 +35,67 @@ def process_repo(q, identifier, java_parser, database_client):
             # stop running
             break
         # if the item is not None, we have a repository path
-        # get the path of the repository
+        # get the path of the repository, or the url of its archive
         path = item[0]
         # get the language of the repository
         language = item[1]
+        # get the clone statistics of the repository, stored with the repository document
+        clone_statistics = item[3] if len(item) > 3 else {}
 
         # try to parse the repository
         try:
-            # Get dictionary with the new words to be added
-            word_dict = dict(Parser.parse_repository_given_language(path, language, java_parser))
-
-            # if the dictionary is not empty
-            if len(word_dict) > 0:
-                # iterate through the dictionary
-                for k, v in word_dict.items():
-                    # check if the word is already in the database
-                    doc_ref = db_collection_words.document(k).get()
-                    # Update the word based on the language
-                    match language:
-                        case 'python':
-                            # if the word is in the database, update the word
-                            if doc_ref.exists:
-                                batch.update(db_collection_words.document(k),
-                                             {'value': firestore.Increment(v),
-                                              'python_value': firestore.Increment(v)})
-                            # if the word is not in the database, create the word
-                            else:
-                                batch.set(db_collection_words.document(k),
-                                          {'name': k, 'value': v, 'python_value': v, 'java_value': 0})
-                        case 'java':
-                            # if the word is in the database, update the word
-                            if doc_ref.exists:
-                                batch.update(db_collection_words.document(k),
-                                             {'value': firestore.Increment(v),
-                                              'java_value': firestore.Increment(v)})
-                            # if the word is not in the database, create the word
-                            else:
-                                batch.set(db_collection_words.document(k),
-                                          {'name': k, 'value': v, 'java_value': v, 'python_value': 0})
-                        case _:
-                            continue
+            # Get the counter with the new words to be added
+            parse_statistics = collections.Counter()
+            with Metrics.span('parse_repository_seconds'):
+                if clone_mode == 'archive':
+                    word_count = Parser.parse_archive_given_language(path, language, java_parser, executor, parse_statistics, python_parser)
+                else:
+                    word_count = Parser.parse_repository_given_language(path, language, java_parser, executor, parse_statistics, python_parser)
+            Cache.record(parse_statistics)
+            record_parse(parse_statistics)
+            if not isinstance(word_count, collections.Counter):
+                logging.error(f'{item[2]} has not been parsed: {word_count}')
+                word_count = collections.Counter()
 
-                    # add repository to the database in order to set the mined flag to true
-                    batch.set(db_collection_repos.document(item[2].replace("/", "__")), {'name': item[2], 'cloned': True, 'words': True, 'language': language})
-                    # commit the batch
-                    batch.commit()
-            else:
-                # add repository to the database in order to set the mined flag to true
-                batch.set(db_collection_repos.document(item[2].replace("/", "__")), {'name': item[2], 'cloned': True, 'words': False, 'language': language})
-                # commit the batch
-                batch.commit()
-                print("*" * 100)
-                print(f"Consumer {identifier} is done with {item[0]}")
-                print("*" * 100)
+            # the commit and the word count of the repository are the base of its incremental refresh
+            repository_fields = {'name': item[2], 'cloned': True, 'words': len(word_count) > 0, 'language': language, **clone_statistics,
+                                 **Registry.word_count_fields(word_count)}
+            if 'commit' in parse_statistics:
+                repository_fields['commit'] = parse_statistics['commit']
+            # the files left out by the budgets of the parse, with their reason
+            repository_fields['skipped_count'] = parse_statistics['skipped_files']
+            repository_fields['skipped_files'] = Watchdog.skipped_files(parse_statistics, path, clone_mode == 'archive')
+            # send the words to the writer, the repository is marked as mined together with its words
+            write_queue.put((item[2], language, word_count, repository_fields))
+            print("*" * 100)
+            print(f"Consumer {identifier} is done with {item[0]}")
+            print("*" * 100)
+        except Exception as e:
+            # the consumer keeps running for the next repositories
+            logging.exception(f'{item[2]} has not been processed: {e}')
+            # its range is not done, it is searched again by this node or another one
+            Registry.release_repository(item[2])
         finally:
-            # delete the repository
-            delete_repository(f'{path}/')
+            # delete the repository, an archive is never written to disk
+            if clone_mode != 'archive':
+                delete_repository(f'{path}/')
             pass
 
 
+def record_parse(parse_statistics):
+    """
+    Record the metrics of the parse of a repository, the statistics of the parsing processes come back in the counter
+    :param parse_statistics: counter with the files, their bytes and their parse time
+    :return: None
+    """
+    Metrics.increment('parse')
+    Metrics.observe('repository_files', parse_statistics['files'])
+    Metrics.observe('repository_bytes', parse_statistics['bytes'])
+    Metrics.observe('repository_skipped_files', parse_statistics['skipped_files'])
+    if parse_statistics['files'] > 0:
+        Metrics.observe('parse_file_seconds', parse_statistics['parse_file_seconds'], parse_statistics['files'])
+
+
 def delete_repository(repo_path):
     """
     Function in order to delete the repository
@@ -0,0 +1,251 @@
+# incremental refresh of the mined repositories
+import asyncio
+import logging
+import collections
+import urllib.parse
+import urllib.request
+from queue import Queue
+from threading import Thread
+from Inspector import Extractor
+from Inspector import Parser
+from Inspector import Processor
+from Inspector import Registry
+from Inspector import Search
+from Inspector import Watchdog
+from Inspector import Writer
+
+# Url of the raw files of GitHub
+GITHUB_RAW_URL = 'https://raw.githubusercontent.com'
+# The compare API lists at most 300 files, a longer list may be truncated
+COMPARE_FILES_LIMIT = 300
+# Statuses of a comparison whose base is an ancestor of its head, the changed files lead from one to the other
+COMPARE_LINEAR_STATUSES = ('ahead', 'identical')
+# Default number of repositories refreshed at the same time
+REFRESH_WORKERS = 4
+# Size of the queue of the writer
+QUEUE_SIZE = 10
+# Seconds of the timeout of the raw file downloads
+RAW_TIMEOUT = 30
+
+
+def run(database_client, java_parser, clone_mode='full', executor=None, workers=REFRESH_WORKERS, python_parser='ast'):
+    """
+    Refresh the word counts of the mined repositories whose HEAD moved since they were mined.
+    Only the changed source files are parsed, and their signed deltas go through the writer.
+    :param database_client: database client object
+    :param java_parser: selector parser
+    :param clone_mode: clone mode of the full reparse, when the changed files can not be listed
+    :param executor: optional process pool used by the full reparse
+    :param workers: number of repositories refreshed at the same time
+    :param python_parser: selector parser of the python files
+    :return: counter of the outcomes of the repositories
+    """
+    write_queue = Queue(maxsize=QUEUE_SIZE)
+    writer = Thread(target=Writer.write_words, args=(write_queue, database_client))
+    writer.start()
+    try:
+        statistics = asyncio.run(refresh_repositories(database_client, (java_parser, python_parser), clone_mode, executor, workers, write_queue))
+    finally:
+        write_queue.put(None)
+        writer.join()
+    logging.info(f'Refresh finished - {dict(statistics)}')
+    return statistics
+
+
+async def refresh_repositories(database_client, parsers, clone_mode, executor, workers, write_queue):
+    """
+    Refresh every mined repository with a commit, at most workers at the same time
+    :param database_client: database client object
+    :param parsers: tuple with the selector parsers of the java files and of the python files
+    :param clone_mode: clone mode of the full reparse
+    :param executor: optional process pool used by the full reparse
+    :param workers: number of repositories refreshed at the same time
+    :param write_queue: queue of the writer
+    :return: counter of the outcomes of the repositories
+    """
+    client = Search.SearchClient(Extractor.GITHUB_API_TOKEN, Extractor.GITHUB_API_URL)
+    # the word counts are not projected, they are only read for the repositories that changed
+    documents = await asyncio.to_thread(lambda: [document.to_dict() for document in database_client.collection(u'repos')
+                                                 .select([u'name', u'language', u'commit']).stream()])
+    semaphore = asyncio.Semaphore(workers)
+    statistics = collections.Counter()
+
+    async def refresh(document):
+        async with semaphore:
+            try:
+                statistics[await refresh_repository(client, database_client, document, parsers, clone_mode, executor, write_queue)] += 1
+            except Exception as e:
+                logging.exception(f'{document.get("name")} has not been refreshed: {e}')
+                statistics['failed'] += 1
+
+    await asyncio.gather(*(refresh(document) for document in documents))
+    return statistics
+
+
+async def refresh_repository(client, database_client, document, parsers, clone_mode, executor, write_queue):
+    """
+    Refresh one repository: the words of the files changed between its mined commit and its HEAD are diffed,
+    or the whole repository is parsed again and diffed against its stored word count
+    :param client: GitHub API client
+    :param database_client: database client object
+    :param document: fields of the repository document
+    :param parsers: tuple with the selector parsers of the java files and of the python files
+    :param clone_mode: clone mode of the full reparse
+    :param executor: optional process pool used by the full reparse
+    :param write_queue: queue of the writer
+    :return: outcome of the refresh: skipped, unchanged, patched or reparsed
+    """
+    full_name, language, commit = document.get('name'), document.get('language'), document.get('commit')
+    extension = Parser.LANGUAGE_EXTENSIONS.get(language)
+    if not full_name or not commit or extension is None:
+        return 'skipped'
+    java_parser, python_parser = parsers
+    head = (await client.request(f'/repos/{full_name}/commits/HEAD'))['sha']
+    if head == commit:
+        return 'unchanged'
+
+    # the stored word count is the base of the deltas
+    reference = database_client.collection(u'repos').document(Registry.repository_document_id(full_name))
+    snapshot = await asyncio.to_thread(reference.get, [u'word_blob'])
+    blob = (snapshot.to_dict() or {}).get('word_blob') if snapshot.exists else None
+    if not blob:
+        logging.info(f'{full_name} has no stored word count, it is not refreshed')
+        return 'skipped'
+    word_count = Registry.decode_word_count(blob)
+
+    try:
+        delta = await diff_changed_files(client, full_name, commit, head, extension,
+                                             java_parser if extension == '.java' else python_parser, executor)
+    except Exception as e:
+        logging.info(f'{full_name} changed files can not be diffed, it is parsed again: {e}')
+        delta = None
+    if delta is not None:
+        outcome = 'patched'
+        new_word_count = collections.Counter(word_count)
+        new_word_count.update(delta)
+    else:
+        outcome = 'reparsed'
+        new_word_count, head = await asyncio.to_thread(reparse_repository, full_name, language, java_parser, clone_mode, executor,
+                                                         python_parser)
+        # subtract keeps the negative deltas of the removed words
+        delta = collections.Counter(new_word_count)
+        delta.subtract(word_count)
+
+    delta = collections.Counter({word: value for word, value in delta.items() if value != 0})
+    fields = {'commit': head, **Registry.word_count_fields(+new_word_count)}
+    await asyncio.to_thread(write_queue.put, (full_name, language, delta, fields))
+    logging.info(f'{full_name} refreshed ({outcome}) from {commit[:7]} to {str(head)[:7]}, {len(delta)} words changed')
+    return outcome
+
+
+async def diff_changed_files(client, full_name, base, head, extension, parser, executor=None):
+    """
+    Count the signed word deltas of the source files changed between two commits
+    :param client: GitHub API client
+    :param full_name: Name of the repository including the owner
+    :param base: mined commit
+    :param head: new commit
+    :param extension: extension of the source files of the repository
+    :param parser: selector parser of the extension
+    :param executor: optional process pool parsing the changed files under their time budget
+    :return: counter of the deltas, None when the changed files can not all be listed or do not lead from base to head
+    """
+    compare = await client.request(f'/repos/{full_name}/compare/{base}...{head}')
+    # the files are compared from the merge base: after a force push the base is no longer an ancestor of head
+    # (diverged or behind), and their deltas would not apply to the word count of the base
+    if compare.get('status') not in COMPARE_LINEAR_STATUSES:
+        return None
+    files = compare.get('files', [])
+    if len(files) >= COMPARE_FILES_LIMIT:
+        return None
+    delta = collections.Counter()
+    for file in files:
+        status = file.get('status')
+        # the old side of the file, removed words; a copy leaves its source in place
+        old_path = None if status in ('added', 'copied') else file.get('previous_filename', file['filename'])
+        # the new side of the file, added words
+        new_path = None if status == 'removed' else file['filename']
+        for path, commit, sign in ((old_path, base, -1), (new_path, head, 1)):
+            if path is None or not is_source_path(path, extension):
+                continue
+            content = await asyncio.to_thread(fetch_raw_file, full_name, commit, path)
+            words = await asyncio.to_thread(count_words_of_file, path, content, extension, parser, executor)
+            for word, value in words.items():
+                delta[word] += sign * value
+    return delta
+
+
+def count_words_of_file(path, content, extension, parser, executor=None):
+    """
+    Count the words of a changed file. The time budget of a file only applies in the parsing processes, so the file is
+    parsed in the process pool when there is one; without it only the size and the heuristics apply.
+    :param path: path of the file in the repository
+    :param content: bytes of the file
+    :param extension: extension of the source files
+    :param parser: selector parser of the extension
+    :param executor: optional process pool, a Watchdog.RecyclingExecutor
+    :return: counter of the words, ValueError is raised when the file is skipped: the delta would not match the
+    word count of the repository, which is parsed again instead
+    """
+    sources = [(path, content)]
+    if executor is None:
+        statistics = collections.Counter()
+        words = Parser.count_words_in_sources(sources, extension, parser, statistics)
+    else:
+        future = executor.submit(Parser.count_words_in_source_chunk, sources, extension, parser)
+        words, statistics = Watchdog.result_or_retry(executor, future, Parser.count_words_in_source_chunk, sources, (extension, parser))
+    if statistics['skipped_files']:
+        raise ValueError(f'{path} has been skipped')
+    return words
+
+
+def is_source_path(path, extension):
+    """
+    Check if a path of the repository is parsed by the miner, like the walk of a repository folder
+    :param path: path of the file in the repository
+    :param extension: extension of the source files
+    :return: True if the file is parsed, False otherwise
+    """
+    return path.endswith(extension) and not any(part.startswith('.') for part in path.split('/'))
+
+
+def fetch_raw_file(full_name, commit, path):
+    """
+    Download a file of a repository at a commit
+    :param full_name: Name of the repository including the owner
+    :param commit: commit of the file
+    :param path: path of the file in the repository
+    :return: bytes of the file
+    """
+    url = f'{GITHUB_RAW_URL}/{full_name}/{commit}/{urllib.parse.quote(path)}'
+    with urllib.request.urlopen(url, timeout=RAW_TIMEOUT) as response:
+        return response.read()
+
+
+def reparse_repository(full_name, language, java_parser, clone_mode, executor=None, python_parser='ast'):
+    """
+    Parse the whole HEAD of a repository again
+    :param full_name: Name of the repository including the owner
+    :param language: language of the repository
+    :param java_parser: selector parser
+    :param clone_mode: clone mode, one of Extractor.CLONE_MODES
+    :param executor: optional process pool used to parse the files
+    :param python_parser: selector parser of the python files
+    :return: tuple with the counter of words and the parsed commit
+    """
+    statistics = collections.Counter()
+    if clone_mode == 'archive':
+        word_count = Parser.parse_archive_given_language(Extractor.archive_url(full_name), language, java_parser, executor, statistics,
+                                                        python_parser)
+        return word_count, statistics.get('commit')
+    clone_statistics = {}
+    path = Extractor.clone_repository(full_name, language, clone_mode, clone_statistics)
+    if path is None:
+        raise RuntimeError(f'{full_name} has not been cloned')
+    try:
+        word_count = Parser.parse_repository_given_language(path, language, java_parser, executor, statistics, python_parser)
+    finally:
+        Processor.delete_repository(f'{path}/')
+    if not isinstance(word_count, collections.Counter):
+        raise RuntimeError(f'{full_name} has not been parsed: {word_count}')
+    return word_count, clone_statistics.get('commit')
@@ -0,0 +1,166 @@
+# index of the mined repositories
+import json
+import zlib
+import logging
+import threading
+import collections
+from Inspector import Lease
+
+# Maximum size in bytes of the encoded word count of a repository, a Firestore document is limited to 1 MiB
+WORD_BLOB_LIMIT = 900000
+
+# document ids of the repositories that are mined or being mined in this process
+_mined_repositories = set()
+# lock of the index, it is shared by the producer and the writer
+_lock = threading.Lock()
+
+
+def repository_document_id(full_name):
+    """
+    Get the id of the document of a repository
+    :param full_name: Name of the repository including the owner
+    :return: document id in the repos collection
+    """
+    return full_name.replace("/", "__")
+
+
+def load_mined_repositories(database_client):
+    """
+    Load the index with one bulk read of the repos collection
+    :param database_client: database client object
+    :return: number of repositories in the index
+    """
+    # only the name is projected, the rest of the document is not needed
+    documents = database_client.collection(u'repos').select([u'name']).stream()
+    with _lock:
+        _mined_repositories.update(document.id for document in documents)
+        size = len(_mined_repositories)
+    logging.info(f'{size} mined repositories loaded')
+    return size
+
+
+def filter_unmined_repositories(database_client, full_names, held=None):
+    """
+    Filter a page of search results, the names missing from the index are checked with one batched read.
+    The returned repositories are added to the index so they are not returned twice; in a distributed run they are
+    also claimed, the repositories claimed by another node are left to it.
+    :param database_client: database client object
+    :param full_names: names of the repositories including the owner
+    :param held: optional list receiving the names of the repositories claimed by another node
+    :return: names of the repositories that are not mined
+    """
+    with _lock:
+        unknown = [full_name for full_name in full_names if repository_document_id(full_name) not in _mined_repositories]
+    if not unknown:
+        return []
+
+    # one round-trip for the whole page, a repository may have been mined by another process since the load
+    db_collection_repos = database_client.collection(u'repos')
+    references = [db_collection_repos.document(repository_document_id(full_name)) for full_name in unknown]
+    mined = {snapshot.id for snapshot in database_client.get_all(references, field_paths=[u'name']) if snapshot.exists}
+
+    with _lock:
+        _mined_repositories.update(mined)
+        unmined = []
+        for full_name in unknown:
+            document_id = repository_document_id(full_name)
+            if document_id not in _mined_repositories:
+                _mined_repositories.add(document_id)
+                unmined.append(full_name)
+    if Lease.enabled():
+        unmined = claim_repositories(database_client, unmined, held)
+    return unmined
+
+
+def claim_repositories(database_client, full_names, held=None):
+    """
+    Claim unmined repositories for this node. A repository is checked again once claimed: the node that held it before
+    may have written it since the first read.
+    :param database_client: database client object
+    :param full_names: names of the repositories including the owner, they are in the index
+    :param held: optional list receiving the names of the repositories claimed by another node
+    :return: names of the repositories claimed and not mined
+    """
+    claimed = []
+    for full_name in full_names:
+        outcome = Lease.claim(Lease.REPOSITORY, repository_document_id(full_name))
+        if outcome == Lease.CLAIMED:
+            claimed.append(full_name)
+            continue
+        # the other node may give it back
+        forget_repository(repository_document_id(full_name))
+        if outcome == Lease.HELD and held is not None:
+            held.append(full_name)
+    if not claimed:
+        return []
+    db_collection_repos = database_client.collection(u'repos')
+    references = [db_collection_repos.document(repository_document_id(full_name)) for full_name in claimed]
+    mined = {snapshot.id for snapshot in database_client.get_all(references, field_paths=[u'name']) if snapshot.exists}
+    for document_id in mined:
+        Lease.release(Lease.REPOSITORY, document_id)
+    return [full_name for full_name in claimed if repository_document_id(full_name) not in mined]
+
+
+def mark_repository_mined(document_id):
+    """
+    Add a repository to the index once its document is written
+    :param document_id: document id in the repos collection
+    :return: None
+    """
+    with _lock:
+        _mined_repositories.add(document_id)
+
+
+def forget_repository(document_id):
+    """
+    Remove a repository from the index, it is not mined by this process
+    :param document_id: document id in the repos collection
+    :return: None
+    """
+    with _lock:
+        _mined_repositories.discard(document_id)
+
+
+def release_repository(full_name):
+    """
+    Give back a repository that has not been mined, like a failed clone or parse: it leaves the index, so it is not
+    skipped when it is found again, and in a distributed run its lease is released
+    :param full_name: Name of the repository including the owner
+    :return: None
+    """
+    document_id = repository_document_id(full_name)
+    if Lease.enabled():
+        Lease.release(Lease.REPOSITORY, document_id)
+    forget_repository(document_id)
+
+
+def encode_word_count(word_count):
+    """
+    Encode the word count of a repository compactly: JSON compressed with zlib
+    :param word_count: counter with the words of the repository
+    :return: bytes of the encoded word count
+    """
+    return zlib.compress(json.dumps(dict(word_count), separators=(',', ':'), sort_keys=True).encode('utf-8'), 9)
+
+
+def decode_word_count(blob):
+    """
+    Decode the word count of a repository
+    :param blob: bytes of the encoded word count
+    :return: counter with the words of the repository
+    """
+    return collections.Counter(json.loads(zlib.decompress(blob).decode('utf-8')))
+
+
+def word_count_fields(word_count):
+    """
+    Build the fields of the repository document holding its word count, they are the base of the incremental refresh
+    :param word_count: counter with the words of the repository
+    :return: dictionary with the word_blob field, None when the encoded word count is too big for a document
+    """
+    blob = encode_word_count(+word_count)
+    if len(blob) > WORD_BLOB_LIMIT:
+        logging.warning(f'Word count of {len(blob)} bytes not stored, the repository will not be refreshed')
+        # a stale word count must not be kept, the refresh would diff against it
+        return {'word_blob': None}
+    return {'word_blob': blob}
@@ -0,0 +1,84 @@
+# scheduler of the pipeline
+import logging
+import threading
+from queue import Queue
+from threading import Thread
+from Inspector import Extractor
+from Inspector import Metrics
+from Inspector import Processor
+from Inspector import Writer
+
+# Default number of threads of each stage
+CLONE_WORKERS = 2
+CONSUMERS = 2
+# Default size of the queues between the stages, a full queue blocks the stage that feeds it
+QUEUE_SIZE = 10
+# Default number of seconds between two throughput reports
+REPORT_SECONDS = 60
+
+
+def run(ranges_stars, database_client, java_parser, clone_mode='full', executor=None, clone_workers=CLONE_WORKERS,
+        consumers=CONSUMERS, queue_size=QUEUE_SIZE, report_seconds=REPORT_SECONDS, python_parser='ast'):
+    """
+    Run the whole pipeline over every range with long-lived stages:
+    one producer searching the ranges, clone workers, consumers parsing the repositories and the writer
+    :param ranges_stars: Ranges of stars to mine (Some may include dates)
+    :param database_client: database client object
+    :param java_parser: selector parser
+    :param clone_mode: clone mode, one of Extractor.CLONE_MODES
+    :param executor: optional process pool shared by the consumers to parse the files
+    :param clone_workers: number of clone threads
+    :param consumers: number of consumer threads
+    :param queue_size: size of the queues between the stages
+    :param report_seconds: number of seconds between two reports of the metrics
+    :param python_parser: python parser
+    :return: None
+    """
+    # bounded queues: search -> clone -> parse -> write
+    clone_queue = Queue(maxsize=queue_size)
+    queue = Queue(maxsize=queue_size)
+    write_queue = Queue(maxsize=queue_size)
+    # the depth of the queues shows the stage that holds the pipeline back
+    gauges = {'clone_queue_depth': clone_queue.qsize, 'parse_queue_depth': queue.qsize, 'write_queue_depth': write_queue.qsize}
+    for name, function in gauges.items():
+        Metrics.register_gauge(name, function)
+
+    # start the stages from the last one
+    writer = Thread(target=Writer.write_words, args=(write_queue, database_client))
+    processors = [Thread(target=Processor.process_repo, args=(queue, i, java_parser, write_queue, executor, clone_mode, python_parser)) for i in range(consumers)]
+    cloners = [Thread(target=Extractor.clone_repositories, args=(clone_queue, queue, i, clone_mode)) for i in range(clone_workers)]
+    extractor = Thread(target=Extractor.mine_gh_api, args=(clone_queue, ranges_stars, database_client))
+    for thread in [writer, *processors, *cloners, extractor]:
+        thread.start()
+
+    # report the throughput while the pipeline runs
+    stopped = threading.Event()
+    reporter = Thread(target=report_throughput, args=(stopped, report_seconds), daemon=True)
+    reporter.start()
+
+    # stop the stages one after the other, each one drains its queue before stopping
+    extractor.join()
+    clone_queue.put(None)
+    for cloner in cloners:
+        cloner.join()
+    queue.put(None)
+    for processor in processors:
+        processor.join()
+    write_queue.put(None)
+    writer.join()
+
+    stopped.set()
+    for name in gauges:
+        Metrics.unregister_gauge(name)
+    logging.info(Metrics.summary())
+
+
+def report_throughput(stopped, report_seconds):
+    """
+    Log the summary of the metrics periodically
+    :param stopped: event set when the pipeline is stopped
+    :param report_seconds: number of seconds between two reports
+    :return: None
+    """
+    while not stopped.wait(report_seconds):
+        logging.info(Metrics.summary())
@@ -0,0 +1,204 @@
+# asynchronous client of the GitHub search API
+import json
+import math
+import asyncio
+import logging
+import collections
+import urllib.error
+import urllib.parse
+import urllib.request
+from time import time
+from Inspector import Metrics
+
+GITHUB_API_URL = 'https://api.github.com'
+# Results per page of the search API (maximum allowed by GitHub)
+SEARCH_PAGE_SIZE = 100
+# The search API only gives access to the first 1000 results of a query
+SEARCH_RESULTS_LIMIT = 1000
+# Default number of pages fetched ahead of the consumer of the pages
+PREFETCH_PAGES = 5
+# Requests kept in reserve at the end of a rate limit window
+RESERVED_REQUESTS = 1
+# Attempts of a request before giving up
+MAX_ATTEMPTS = 5
+# Seconds of the request timeout
+REQUEST_TIMEOUT = 30
+
+
+class SearchClient:
+    """
+    Client of the search API that tracks the rate limit from the headers of every response and spreads the remaining
+    requests over the rest of the window, instead of waiting for the whole window when the limit is reached
+    """
+
+    def __init__(self, token, api_url=GITHUB_API_URL, page_size=SEARCH_PAGE_SIZE):
+        """
+        :param token: GitHub API token, None for anonymous requests
+        :param api_url: url of the API, a local stub in the benchmarks
+        :param page_size: results per page
+        """
+        self.token = token
+        self.api_url = api_url
+        self.page_size = page_size
+        # rate limit of the last response, unknown before the first request
+        self.limit = None
+        self.remaining = None
+        self.reset = 0.0
+        # requests, pages, waits and rate limited responses
+        self.statistics = collections.Counter()
+        self._lock = None
+
+    async def search_repositories(self, query, page=1, per_page=None):
+        """
+        Request a page of the repositories search
+        :param query: search query
+        :param page: page number, starting from 1
+        :param per_page: results per page, the page size of the client by default
+        :return: decoded response with total_count and items
+        """
+        parameters = {'q': query, 'sort': 'stars', 'order': 'desc', 'page': page, 'per_page': per_page or self.page_size}
+        return await self.request(f'/search/repositories?{urllib.parse.urlencode(parameters)}')
+
+    async def count(self, query):
+        """
+        Get the total count of a query with a one result page
+        :param query: search query
+        :return: total count of the query
+        """
+        return (await self.search_repositories(query, per_page=1))['total_count']
+
+    async def iterate_pages(self, queries, prefetch=PREFETCH_PAGES):
+        """
+        Iterate over the pages of several queries, a background task fetches up to prefetch pages ahead
+        :param queries: search queries, an iterable or an async iterable
+        :param prefetch: number of pages fetched ahead
+        :return: async generator of tuples (query, list of repositories)
+        """
+        pages = asyncio.Queue(maxsize=prefetch)
+        fetcher = asyncio.create_task(self._fetch_pages(queries, pages))
+        try:
+            while (page := await pages.get()) is not None:
+                yield page
+        finally:
+            fetcher.cancel()
+
+    async def _fetch_pages(self, queries, pages):
+        """
+        Fetch every page of the queries, a query that fails is skipped
+        :param queries: search queries, an iterable or an async iterable
+        :param pages: queue receiving tuples (query, list of repositories) and None at the end
+        :return: None
+        """
+        try:
+            async for query in iterate_queries(queries):
+                try:
+                    response = await self.search_repositories(query)
+                    total_count = response['total_count']
+                    if total_count == 0:
+                        logging.info(f'No results for query: {query}')
+                        continue
+                    await pages.put((query, response['items']))
+                    # the search API only returns the first SEARCH_RESULTS_LIMIT results
+                    for page in range(2, math.ceil(min(total_count, SEARCH_RESULTS_LIMIT) / self.page_size) + 1):
+                        response = await self.search_repositories(query, page)
+                        await pages.put((query, response['items']))
+                except Exception as e:
+                    logging.exception(f'Error while requesting the GitHub API: {e}')
+        finally:
+            await pages.put(None)
+
+    async def request(self, path):
+        """
+        Send a GET request to the API, waiting for the rate limit and retrying the rate limited responses
+        :param path: path and query string of the request
+        :return: decoded JSON response
+        """
+        for attempt in range(MAX_ATTEMPTS):
+            await self._wait_rate_limit()
+            with Metrics.span('search_request_seconds'):
+                status, headers, body = await asyncio.to_thread(self._get, f'{self.api_url}{path}')
+            self._update_rate_limit(headers)
+            self.statistics['requests'] += 1
+            if status == 200:
+                self.statistics['pages'] += 1
+                return json.loads(body)
+            if status in (403, 429):
+                # rate limited: wait for the reset, or for the delay asked by a secondary rate limit
+                self.statistics['rate_limited'] += 1
+                retry_after = headers.get('Retry-After')
+                seconds = float(retry_after) if retry_after else max(self.reset - time(), 0.0) + 1
+                logging.info(f'GitHub API rate limited, retrying in {seconds:.1f} seconds')
+                await asyncio.sleep(seconds)
+                continue
+            if status >= 500:
+                # server error, retry with an exponential backoff
+                await asyncio.sleep(2 ** attempt)
+                continue
+            raise RuntimeError(f'GitHub API error {status}: {body[:200]!r}')
+        raise RuntimeError(f'GitHub API request failed after {MAX_ATTEMPTS} attempts: {path}')
+
+    async def _wait_rate_limit(self):
+        """
+        Wait before sending a request, the remaining requests are spread over the rest of the window
+        :return: None
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.remaining is None:
+                return
+            window = self.reset - time()
+            if window > 0:
+                if self.remaining <= RESERVED_REQUESTS:
+                    seconds = window + 1
+                elif self.limit and self.remaining < self.limit / 2:
+                    # past half of the window budget, pace the requests
+                    seconds = window / (self.remaining - RESERVED_REQUESTS + 1)
+                else:
+                    seconds = 0.0
+                if seconds > 0:
+                    self.statistics['waits'] += 1
+                    Metrics.observe('search_wait_seconds', seconds)
+                    await asyncio.sleep(seconds)
+            # the request about to be sent is counted before its response arrives
+            self.remaining = max(self.remaining - 1, 0) if window > 0 else None
+
+    def _update_rate_limit(self, headers):
+        """
+        Track the rate limit from the headers of a response
+        :param headers: headers of the response
+        :return: None
+        """
+        if headers.get('X-RateLimit-Remaining') is not None:
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+            self.reset = float(headers.get('X-RateLimit-Reset', 0))
+            self.limit = int(headers.get('X-RateLimit-Limit', 0)) or None
+
+    def _get(self, url):
+        """
+        Send a GET request, it runs in a thread of the event loop
+        :param url: url of the request
+        :return: tuple with the status, the headers and the body
+        """
+        request = urllib.request.Request(url, headers={'Accept': 'application/vnd.github+json'})
+        if self.token:
+            request.add_header('Authorization', f'token {self.token}')
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+
+async def iterate_queries(queries):
+    """
+    Iterate over the search queries, produced at once or asynchronously like the ranges claimed before their search
+    :param queries: iterable or async iterable of search queries
+    :return: async generator of the search queries
+    """
+    if hasattr(queries, '__aiter__'):
+        async for query in queries:
+            yield query
+    else:
+        for query in queries:
+            yield query
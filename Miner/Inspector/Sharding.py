@@ -0,0 +1,223 @@
+# sharded counters of the hot words
+import math
+import random
+import logging
+import collections
+from time import monotonic
+from firebase_admin import firestore
+from Inspector import Metrics
+
+# Subcollection of the shards of a word document
+SHARDS_COLLECTION = 'shards'
+# Counter fields of the words, summed by the rollup
+COUNTER_FIELDS = ('value', 'python_value', 'java_value')
+# Default maximum number of shards of a word, 1 disables the sharding
+MAX_SHARDS = 10
+# Sustained writes per second to one document, Firestore throttles the documents written more often
+DOCUMENT_WRITES_PER_SECOND = 1.0
+# Fraction of the write rate of a document given to each shard, the shards are picked at random so they get uneven writes
+SHARD_UTILIZATION = 0.5
+# Half-life in seconds of the write rate observed for a word
+RATE_HALF_LIFE = 60.0
+# Minimum number of seconds a write rate is observed over, a burst of writes is not a sustained rate
+RATE_MIN_WINDOW = 10.0
+# Default number of seconds between two rollups
+ROLLUP_SECONDS = 60.0
+# Maximum number of operations in a Firestore batch
+BATCH_LIMIT = 500
+
+# configuration of the shards of this process
+_max_shards = MAX_SHARDS
+_rollup_seconds = ROLLUP_SECONDS
+_writes_per_second = DOCUMENT_WRITES_PER_SECOND
+_clock = monotonic
+# word -> [decayed number of writes, time of the last write, time of the first write]
+_rates = {}
+# word -> counter of the deltas written to its shards and not rolled up yet, by counter field
+_undrained = collections.defaultdict(collections.Counter)
+_last_rollup = None
+
+
+def configure(max_shards=MAX_SHARDS, rollup_seconds=ROLLUP_SECONDS, writes_per_second=DOCUMENT_WRITES_PER_SECOND,
+              clock=monotonic):
+    """
+    Configure the shards of the words written by this process
+    :param max_shards: maximum number of shards of a word, 1 writes every word to its document
+    :param rollup_seconds: minimum number of seconds between two rollups
+    :param writes_per_second: sustained writes per second to one document
+    :param clock: function returning the current time in seconds
+    :return: None
+    """
+    global _max_shards, _rollup_seconds, _writes_per_second, _clock, _last_rollup
+    _max_shards = max(1, max_shards)
+    _rollup_seconds = rollup_seconds
+    _writes_per_second = writes_per_second
+    _clock = clock
+    _rates.clear()
+    _undrained.clear()
+    _last_rollup = clock()
+
+
+def observe_write(word):
+    """
+    Record a write of a word and estimate its write rate, the writes decay with a half-life of RATE_HALF_LIFE
+    :param word: written word
+    :return: write rate of the word in writes per second
+    """
+    now = _clock()
+    rate = _rates.get(word)
+    if rate is None:
+        rate = _rates[word] = [0.0, now, now]
+    rate[0] = rate[0] * 0.5 ** ((now - rate[1]) / RATE_HALF_LIFE) + 1
+    rate[1] = now
+    # the decayed count over the decayed duration of the observation, a constant rate is estimated from its start
+    lifetime = RATE_HALF_LIFE / math.log(2)
+    window = lifetime * (1 - math.exp(-(now - rate[2]) / lifetime))
+    return rate[0] / max(window, RATE_MIN_WINDOW)
+
+
+def shard_count(word):
+    """
+    Record a write of a word and get its number of shards, enough to keep each shard under the write rate of a document
+    :param word: written word
+    :return: number of shards, 1 writes the word to its document
+    """
+    rate = observe_write(word)
+    if _max_shards <= 1:
+        return 1
+    return max(1, min(_max_shards, math.ceil(rate / (_writes_per_second * SHARD_UTILIZATION))))
+
+
+def word_operations(db_collection_words, word, deltas):
+    """
+    Build the write of the deltas of a word: the cold words increment their document, the hot words increment one of
+    their shards picked at random, their document is updated by the rollup. Once the write is committed, it is recorded
+    with written
+    :param db_collection_words: collection reference of the words
+    :param word: written word
+    :param deltas: counter field -> delta
+    :return: tuple with the document reference and the fields written with a merge
+    """
+    shards = shard_count(word)
+    if shards <= 1:
+        # the increments create the missing words, so there is no need to read them first
+        return db_collection_words.document(word), {'name': word, **{field: firestore.Increment(deltas.get(field, 0)) for field in COUNTER_FIELDS}}
+    reference = db_collection_words.document(word).collection(SHARDS_COLLECTION).document(str(random.randrange(shards)))
+    return reference, {field: firestore.Increment(deltas.get(field, 0)) for field in COUNTER_FIELDS}
+
+
+def written(word, reference, deltas):
+    """
+    Record the committed write of the deltas of a word, the deltas written to a shard wait for the rollup. A batch
+    that fails writes nothing to the shards, so its writes are not recorded
+    :param word: written word
+    :param reference: document reference returned by word_operations
+    :param deltas: counter field -> delta
+    :return: None
+    """
+    if reference.parent.id == SHARDS_COLLECTION:
+        _undrained[word].update(deltas)
+
+
+def undrained(word, field):
+    """
+    Get the deltas of a word written to its shards by this process and not rolled up yet
+    :param word: word
+    :param field: counter field
+    :return: delta missing from the document of the word
+    """
+    counter = _undrained.get(word)
+    return counter[field] if counter is not None else 0
+
+
+def rollup(database_client, force=False):
+    """
+    Move the deltas of the shards written by this process to the documents of their words, at most once every
+    rollup interval. Each shard is drained by the opposite increment in the batch that increments its word, so the
+    deltas written to the shards meanwhile are kept, and the total of a word and its shards never changes.
+    :param database_client: database client object
+    :param force: roll up without waiting for the rollup interval, at the end of the run
+    :return: number of words rolled up
+    """
+    global _last_rollup
+    if not _undrained or (not force and _clock() - _last_rollup < _rollup_seconds):
+        return 0
+    _last_rollup = _clock()
+    words = list(_undrained)
+    db_collection_words = database_client.collection(u'words')
+    drained = {}
+    try:
+        with Metrics.span('rollup_seconds'):
+            drain_words(database_client, [db_collection_words.document(word) for word in words], drained)
+    finally:
+        # the words of the batches committed before an error are drained, their shards were read after their writes
+        for word in drained:
+            _undrained.pop(word, None)
+    logging.info(f'Rolled up the shards of {len(drained)} words')
+    return len(drained)
+
+
+def recover(database_client):
+    """
+    Roll up the shards left by a previous run, like a run stopped before its last rollup
+    :param database_client: database client object
+    :return: number of words rolled up
+    """
+    references = {}
+    for snapshot in database_client.collection_group(SHARDS_COLLECTION).select(list(COUNTER_FIELDS)).stream():
+        if any((snapshot.to_dict() or {}).get(field, 0) for field in COUNTER_FIELDS):
+            word_reference = snapshot.reference.parent.parent
+            references[word_reference.id] = word_reference
+    if references:
+        drain_words(database_client, list(references.values()), {})
+        logging.info(f'Rolled up the shards of {len(references)} words left by a previous run')
+    return len(references)
+
+
+def drain_words(database_client, references, drained):
+    """
+    Read the shards of words and move their deltas to the documents of the words, in batches of at most BATCH_LIMIT
+    operations; the shards of a word are always in the batch of its document
+    :param database_client: database client object
+    :param references: document references of the words
+    :param drained: dictionary receiving word -> counter of the drained deltas by counter field, once committed
+    :return: None
+    """
+    # word -> totals of the words of the batch being built
+    batch_totals = {}
+    operations = []
+    for reference in references:
+        shards = [(snapshot.reference, snapshot.to_dict() or {}) for snapshot in
+                  reference.collection(SHARDS_COLLECTION).select(list(COUNTER_FIELDS)).stream()]
+        shards = [(shard, fields) for shard, fields in shards if any(fields.get(field, 0) for field in COUNTER_FIELDS)]
+        if not shards:
+            drained[reference.id] = collections.Counter()
+            continue
+        totals = collections.Counter()
+        for _, fields in shards:
+            totals.update({field: fields.get(field, 0) for field in COUNTER_FIELDS})
+        group = [(reference, {'name': reference.id, **{field: firestore.Increment(totals[field]) for field in COUNTER_FIELDS}})]
+        group += [(shard, {field: firestore.Increment(-fields.get(field, 0)) for field in COUNTER_FIELDS}) for shard, fields in shards]
+        if len(operations) + len(group) > BATCH_LIMIT:
+            commit_operations(database_client, operations)
+            drained.update(batch_totals)
+            operations, batch_totals = [], {}
+        operations += group
+        batch_totals[reference.id] = totals
+    commit_operations(database_client, operations)
+    drained.update(batch_totals)
+
+
+def commit_operations(database_client, operations):
+    """
+    Commit merged writes in one batch
+    :param database_client: database client object
+    :param operations: list of tuples (document reference, fields)
+    :return: None
+    """
+    if not operations:
+        return
+    batch = database_client.batch()
+    for reference, fields in operations:
+        batch.set(reference, fields, merge=True)
+    batch.commit()
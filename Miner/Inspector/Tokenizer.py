@@ -0,0 +1,86 @@
+# identifier tokenizer
+import re
+import functools
+import collections
+
+# Pattern of inflection's camelize, compiled once
+CAMELIZE_PATTERN = re.compile(r"(?:^|_)(.)")
+# Pattern of the camel case split, compiled once
+CAMEL_CASE_SPLIT_PATTERN = re.compile('.+?(?:(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|$)')
+# Maximum number of function names memoized by split_identifier
+MEMOIZED_IDENTIFIERS = 1 << 16
+
+
+def is_snake_case(function_name):
+    """
+    Check if a function name is in snake case, same result as comparing it with inflection's underscore
+    :param function_name: function name to check
+    :return: True if the function name is in snake case, False otherwise
+    """
+    # underscore only inserts underscores next to upper case letters and replaces hyphens before lowering the name,
+    # so the name is unchanged exactly when it has no hyphen and is already in lower case
+    return "-" not in function_name and function_name == function_name.lower()
+
+
+def is_camel_case(function_name):
+    """
+    Check if a function name is in camel case, same result as comparing it with inflection's camelize(name, False)
+    :param function_name: function name to check
+    :return: True if the function name is in camel case, False otherwise
+    """
+    first = function_name[0]
+    # without an underscore followed by a character, camelize only changes the first character
+    if "_" not in function_name[:-1] and first != "\n" and len(first.upper()) == 1:
+        return first == first.lower()
+    # otherwise do what camelize does, with the compiled pattern
+    return function_name == first.lower() + CAMELIZE_PATTERN.sub(lambda m: m.group(1).upper(), function_name)[1:]
+
+
+def camel_case_split(function_name):
+    """
+    Split a camel case function name into words
+    :param function_name: function name to split
+    :return: list of words in lowercase
+    """
+    return [m.group(0).lower() for m in CAMEL_CASE_SPLIT_PATTERN.finditer(function_name)]
+
+
+def snake_case_split(function_name):
+    """
+    Split a snake case function name into words
+    :param function_name: function name to split
+    :return: list of words in lowercase
+    """
+    return [word.lower() for word in function_name.split("_") if word]
+
+
+@functools.lru_cache(maxsize=MEMOIZED_IDENTIFIERS)
+def split_identifier(function_name, extension):
+    """
+    Split a function name that follows the naming convention of its language, names like get_name or toString recur
+    across repositories so the result is memoized
+    :param function_name: function name to split
+    :param extension: extension of the file of the function name
+    :return: tuple of words in lowercase, empty if the name does not follow the naming convention
+    """
+    match extension:
+        case ".py":
+            return tuple(snake_case_split(function_name)) if is_snake_case(function_name) else ()
+        case ".java":
+            return tuple(camel_case_split(function_name)) if is_camel_case(function_name) else ()
+        case _:
+            return ()
+
+
+def count_words(function_names, extension):
+    """
+    Count the words of a batch of function names, the names are streamed and the recurring ones are not split again
+    :param function_names: iterable of function names
+    :param extension: extension of the files of the function names
+    :return: counter with the words
+    """
+    word_count = collections.Counter()
+    for function_name in function_names:
+        for word in split_identifier(function_name, extension):
+            word_count[word] += 1
+    return word_count
@@ -0,0 +1,330 @@
+# budgets of the parse of each file
+import re
+import signal
+import logging
+import threading
+import contextlib
+import collections
+from concurrent.futures import CancelledError
+from time import monotonic
+from concurrent.futures.process import BrokenProcessPool
+
+# Default maximum size in bytes of a parsed file
+FILE_BYTES = 1000000
+# Default wall-clock budget in seconds of the parse of a file
+FILE_SECONDS = 10.0
+# CPU budget of a parsing process on a file, as a multiple of the wall-clock budget; beyond it the process is killed
+HARD_BUDGET_FACTOR = 3
+# Bytes at the start of a file searched for the markers of the generated files
+HEADER_BYTES = 2048
+# Markers of the generated files, in lower case: the @generated tag and the banners of known generators. The generic
+# phrases like "generated by" or "do not edit" also appear in the license headers, they are not markers on their own
+GENERATED_MARKERS = (b'@generated', b'generated by the protocol buffer compiler', b'generated by the grpc python protocol compiler',
+                     b'autogenerated by thrift compiler', b'this file was automatically generated by swig',
+                     b'generated by the javatm architecture for xml binding', b'autogenerated by avro',
+                     b'form implementation generated from reading ui file')
+# Banners of the generators following the "Code generated ... DO NOT EDIT." convention, ANTLR and the Django migrations
+GENERATED_BANNERS = re.compile(rb'^\W*(code generated .* do not edit|generated from .* by antlr|generated by django \d)', re.MULTILINE)
+# Files of at least MINIFIED_BYTES with a mean line length above MINIFIED_LINE_LENGTH are minified
+MINIFIED_BYTES = 10000
+MINIFIED_LINE_LENGTH = 500
+# Maximum number of skipped files listed in the report of a repository
+SKIPPED_REPORT_LIMIT = 100
+
+# budgets of this process, the parsing processes receive them from their initializer
+_file_bytes = FILE_BYTES
+_file_seconds = FILE_SECONDS
+_heuristics = True
+# the CPU budget kills the process, it is only set in the parsing processes
+_worker = False
+
+
+class BudgetExceeded(BaseException):
+    """
+    Raised in the parse of a file that exceeds its time budget. It is not an Exception, so the extractors,
+    which catch every Exception of the parsers, let it through.
+    """
+
+
+def configure(file_bytes=FILE_BYTES, file_seconds=FILE_SECONDS, heuristics=True, worker=False):
+    """
+    Configure the budgets of this process
+    :param file_bytes: maximum size in bytes of a parsed file, 0 for no limit
+    :param file_seconds: wall-clock budget in seconds of the parse of a file, 0 for no limit
+    :param heuristics: skip the generated and minified files
+    :param worker: True in the parsing processes, the process is killed beyond the CPU budget
+    :return: None
+    """
+    global _file_bytes, _file_seconds, _heuristics, _worker
+    _file_bytes = file_bytes
+    _file_seconds = file_seconds
+    _heuristics = heuristics
+    _worker = worker
+
+
+def check_size(size):
+    """
+    Check the size of a file before reading it
+    :param size: size in bytes of the file
+    :return: reason to skip the file, None if it is parsed
+    """
+    if _file_bytes and size > _file_bytes:
+        return 'size'
+    return None
+
+
+def check_source(content):
+    """
+    Check a file before parsing it
+    :param content: bytes of the file
+    :return: reason to skip the file (size, generated or minified), None if it is parsed
+    """
+    reason = check_size(len(content))
+    if reason is not None or not _heuristics:
+        return reason
+    header = content[:HEADER_BYTES].lower()
+    if any(marker in header for marker in GENERATED_MARKERS) or GENERATED_BANNERS.search(header):
+        return 'generated'
+    if len(content) >= MINIFIED_BYTES and len(content) / (content.count(b'\n') + 1) > MINIFIED_LINE_LENGTH:
+        return 'minified'
+    return None
+
+
+def skip(statistics, file, reason):
+    """
+    Record a skipped file in the parse statistics, they travel back from the parsing processes in the counter
+    :param statistics: counter of the parse statistics
+    :param file: path of the file
+    :param reason: reason of the skip
+    :return: None
+    """
+    logging.info(f'{file} skipped: {reason}')
+    if statistics is not None:
+        statistics[('skipped', reason, file)] += 1
+        statistics['skipped_files'] += 1
+
+
+def skipped_files(statistics, root='', archive=False):
+    """
+    Build the report of the skipped files of a repository
+    :param statistics: counter of the parse statistics
+    :param root: prefix removed from the paths, the folder of the repository
+    :param archive: the paths are members of an archive, their top folder is removed
+    :return: list of dictionaries with the path and the reason, at most SKIPPED_REPORT_LIMIT
+    """
+    report = []
+    for key in statistics:
+        if isinstance(key, tuple) and key[0] == 'skipped':
+            path = key[2]
+            if archive:
+                path = path.split('/', 1)[-1]
+            elif root and path.startswith(root):
+                path = path[len(root):].lstrip('/')
+            report.append({'path': path, 'reason': key[1]})
+    return sorted(report, key=lambda entry: entry['path'])[:SKIPPED_REPORT_LIMIT]
+
+
+class BatchBudget:
+    """
+    Wall-clock budget of a batch of files parsed together by another process, like srcML. The process is killed when
+    it reports no parsed file for the budget of one file, so the budget does not grow with the size of the batch.
+    """
+
+    def __init__(self, kill):
+        """
+        :param kill: function without arguments killing the process
+        """
+        self.kill = kill
+        self.deadline = monotonic() + _file_seconds
+        self.expired = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def progress(self):
+        """
+        Record a parsed file, the next one gets the budget of a file
+        :return: None
+        """
+        self.deadline = monotonic() + _file_seconds
+
+    def run(self):
+        while not self._stopped.wait(max(self.deadline - monotonic(), 0)):
+            if monotonic() >= self.deadline:
+                self.expired = True
+                self.kill()
+                return
+
+    def cancel(self):
+        """
+        Stop the budget once the batch is parsed
+        :return: None
+        """
+        self._stopped.set()
+
+
+def batch_budget(kill):
+    """
+    Start the budget of a batch of files parsed together by another process
+    :param kill: function without arguments killing the process
+    :return: BatchBudget, None for no limit
+    """
+    return BatchBudget(kill) if _file_seconds else None
+
+
+@contextlib.contextmanager
+def time_budget():
+    """
+    Run the parse of a file under its time budget. The wall-clock budget raises BudgetExceeded, it needs the main
+    thread of the process, so it applies in the parsing processes and not in the threads of the miner: without
+    parsing processes (-w 0) only the size and the heuristics apply. A parser stuck in C code only sees it once it
+    returns, so the parsing processes also get a CPU budget that kills them.
+    :return: context manager
+    """
+    if not _file_seconds or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def exceeded(signum, frame):
+        raise BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, exceeded)
+    signal.setitimer(signal.ITIMER_REAL, _file_seconds)
+    if _worker:
+        # the default action of SIGPROF terminates the process, even in the middle of C code
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        signal.setitimer(signal.ITIMER_PROF, _file_seconds * HARD_BUDGET_FACTOR)
+    try:
+        yield
+    finally:
+        if _worker:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class RecyclingExecutor:
+    """
+    Process pool replaced by a new one when one of its processes is killed, by the CPU budget or by a crash.
+    The tasks suspected of the kill run again alone in a pool of one process, isolated from the other consumers.
+    """
+
+    def __init__(self, factory, workers):
+        """
+        :param factory: function creating a process pool, called with its number of processes
+        :param workers: number of processes of the shared pool
+        """
+        self.factory = factory
+        self.workers = workers
+        self.executor = factory(workers)
+        self.generation = 0
+        self.recycled = 0
+        self.lock = threading.Lock()
+        # pool of one process running the isolated tasks one after the other, created on the first one
+        self.isolation = None
+        self.isolation_lock = threading.Lock()
+
+    def submit(self, function, *args):
+        """
+        Submit a task to the current process pool
+        :param function: function of the task
+        :param args: arguments of the function
+        :return: future of the task, tagged with the generation of its pool
+        """
+        with self.lock:
+            try:
+                future = self.executor.submit(function, *args)
+            except BrokenProcessPool:
+                # the pool broke before the futures of its other tasks were read
+                self._replace()
+                future = self.executor.submit(function, *args)
+            future.generation = self.generation
+        return future
+
+    def recycle(self, future):
+        """
+        Replace the process pool of a future broken by a killed process, once for all its futures
+        :param future: broken future
+        :return: None
+        """
+        with self.lock:
+            if getattr(future, 'generation', self.generation) == self.generation:
+                self._replace()
+
+    def _replace(self):
+        """
+        Replace the process pool, the lock is held by the caller
+        :return: None
+        """
+        broken = self.executor
+        self.executor = self.factory(self.workers)
+        self.generation += 1
+        self.recycled += 1
+        logging.warning(f'Parsing processes recycled ({self.recycled} since the start)')
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def isolate(self, function, *args):
+        """
+        Run a task alone in the pool of one process, the pool is replaced when the task breaks it
+        :param function: function of the task
+        :param args: arguments of the function
+        :return: result of the task, BrokenProcessPool is raised when the task kills its process
+        """
+        with self.isolation_lock:
+            if self.isolation is None:
+                self.isolation = self.factory(1)
+            try:
+                return self.isolation.submit(function, *args).result()
+            except BrokenProcessPool:
+                self.isolation.shutdown(wait=False, cancel_futures=True)
+                self.isolation = None
+                raise
+
+    def shutdown(self, wait=True):
+        """
+        :param wait: wait for the running tasks
+        :return: None
+        """
+        with self.lock:
+            self.executor.shutdown(wait=wait)
+        with self.isolation_lock:
+            if self.isolation is not None:
+                self.isolation.shutdown(wait=wait)
+
+
+def result_or_retry(executor, future, function, chunk, args):
+    """
+    Get the result of a chunk of files parsed in the process pool. The pool is shared by the consumers, so a process
+    killed by one file breaks the chunks of the others too: a broken chunk is parsed again in the recycled pool, and
+    when it breaks again its files are parsed one by one in isolation. A file is only skipped when it breaks the pool
+    of one process by itself.
+    :param executor: process pool, a RecyclingExecutor to survive the killed processes
+    :param future: future of the chunk
+    :param function: function called with a chunk followed by args, it returns the counter of words and the statistics
+    :param chunk: files of the chunk, paths or tuples (path, bytes)
+    :param args: other arguments of the function
+    :return: tuple with the counter of words and the counter of parse statistics
+    """
+    try:
+        return future.result()
+    except (BrokenProcessPool, CancelledError):
+        # a recycled pool cancels the tasks it did not start
+        if not isinstance(executor, RecyclingExecutor):
+            raise
+        executor.recycle(future)
+    retry = executor.submit(function, chunk, *args)
+    try:
+        return retry.result()
+    except (BrokenProcessPool, CancelledError):
+        executor.recycle(retry)
+    words, statistics = collections.Counter(), collections.Counter()
+    for file in chunk:
+        try:
+            partial_words, partial_statistics = executor.isolate(function, [file], *args)
+        except BrokenProcessPool:
+            # the file alone kills the parsing process
+            skip(statistics, file if isinstance(file, str) else file[0], 'killed')
+            continue
+        words.update(partial_words)
+        statistics.update(partial_statistics)
+    return words, statistics
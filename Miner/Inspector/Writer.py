@@ -0,0 +1,266 @@
+# writer task
+import logging
+import collections
+from queue import Empty
+from time import monotonic, perf_counter, sleep
+from Inspector import Journal
+from Inspector import Leaderboard
+from Inspector import Lease
+from Inspector import Metrics
+from Inspector import Registry
+from Inspector import Sharding
+
+# Maximum number of operations in a Firestore batch
+BATCH_LIMIT = 500
+# Default number of pending operations that triggers a flush
+FLUSH_OPERATIONS = 500
+# Default number of seconds between two flushes
+FLUSH_SECONDS = 5.0
+# Attempts of a flush that has to be written before the batch grows, the repositories are given back after them
+FLUSH_ATTEMPTS = 5
+# Counter field of the words for each language
+LANGUAGE_FIELDS = {'python': 'python_value', 'java': 'java_value'}
+
+
+def write_words(q, database_client, flush_operations=FLUSH_OPERATIONS, flush_seconds=FLUSH_SECONDS):
+    """
+    Aggregate in memory the word deltas sent by the consumers and write them behind to the database
+    :param q: The queue, items are tuples (repository name, language, counter of words, repository fields)
+    :param database_client: database client object
+    :param flush_operations: number of pending operations that triggers a flush
+    :param flush_seconds: maximum number of seconds between two flushes
+    :return: None
+    """
+    # word -> counter of deltas by language field
+    pending_words = collections.defaultdict(collections.Counter)
+    # repository document id -> fields of the repository document
+    pending_repositories = {}
+    # in a distributed run, repository document id -> language field and counter of the words of the repository, the words
+    # of a repository reclaimed by another node are taken out of the flush
+    pending_counts = {}
+    # flush statistics of the run
+    statistics = collections.Counter()
+    last_flush = monotonic()
+    # a failed flush is retried by the time threshold, not by every item that follows it
+    retry_at = last_flush
+
+    print('Writer: Running')
+    while True:
+        try:
+            # wait for the next item at most until the time threshold
+            item = q.get(timeout=max(0.0, flush_seconds - (monotonic() - last_flush)))
+        except Empty:
+            # time threshold reached, flush what has been aggregated
+            flush_words(database_client, pending_words, pending_repositories, statistics, pending_counts)
+            recover_journal(database_client)
+            rollup_shards(database_client)
+            last_flush = monotonic()
+            continue
+        # check for stop, do a final flush
+        if item is None:
+            flush_words(database_client, pending_words, pending_repositories, statistics, pending_counts)
+            recover_journal(database_client, force=True)
+            rollup_shards(database_client, force=True)
+            Leaderboard.publish(database_client, force=True)
+            if pending_repositories:
+                logging.error(f'Writer stopped with {len(pending_repositories)} repositories not written')
+                give_back_repositories(pending_words, pending_repositories, pending_counts)
+            break
+        full_name, language, word_count, repository_fields = item
+        # in a distributed run a flush is recorded by one batch, the repository is kept for the next one if it does not fit
+        if Lease.enabled() and Journal.intent_operations(len(pending_repositories) + 1, len(pending_words) + len(word_count)) > BATCH_LIMIT:
+            # the batch can not grow, a failed flush is retried without the repositories whose lease is lost; after
+            # FLUSH_ATTEMPTS the error is taken as permanent and the repositories are given back to be mined again
+            attempts = 1
+            while not flush_words(database_client, pending_words, pending_repositories, statistics, pending_counts):
+                if attempts == FLUSH_ATTEMPTS:
+                    logging.error(f'Flush failed {attempts} times, {len(pending_repositories)} repositories not written')
+                    give_back_repositories(pending_words, pending_repositories, pending_counts)
+                    break
+                attempts += 1
+                sleep(flush_seconds)
+            rollup_shards(database_client)
+            last_flush = monotonic()
+        # aggregate the deltas of the repository
+        field = LANGUAGE_FIELDS.get(language)
+        if field is not None:
+            for word, delta in word_count.items():
+                pending_words[word][field] += delta
+        pending_repositories[Registry.repository_document_id(full_name)] = repository_fields
+        if Lease.enabled():
+            pending_counts[Registry.repository_document_id(full_name)] = (field, word_count)
+        # size threshold reached
+        if len(pending_words) + len(pending_repositories) >= flush_operations and monotonic() >= retry_at:
+            if not flush_words(database_client, pending_words, pending_repositories, statistics, pending_counts):
+                retry_at = monotonic() + flush_seconds
+            rollup_shards(database_client)
+            last_flush = monotonic()
+        # time threshold reached while the items keep coming, the queue is never empty long enough for the timeout
+        elif monotonic() - last_flush >= flush_seconds:
+            flush_words(database_client, pending_words, pending_repositories, statistics, pending_counts)
+            recover_journal(database_client)
+            rollup_shards(database_client)
+            last_flush = monotonic()
+
+    if statistics['flushes'] > 0:
+        logging.info(f'Writer finished - {statistics["flushes"]} flushes, '
+                     f'{statistics["operations"] / statistics["flushes"]:.1f} operations per flush, '
+                     f'{statistics["seconds"] / statistics["flushes"]:.3f} seconds per flush')
+
+
+def flush_words(database_client, pending_words, pending_repositories, statistics, pending_counts=None):
+    """
+    Write the aggregated words and the mined repositories with upserts, through the journal in a distributed run
+    :param database_client: database client object
+    :param pending_words: word -> counter of deltas by language field, emptied by the flush
+    :param pending_repositories: repository document id -> fields, emptied by the flush
+    :param statistics: counter updated with the number of flushes, operations and seconds
+    :param pending_counts: in a distributed run, repository document id -> language field and counter of words, emptied by the flush
+    :return: True if everything is written, False if what is left is kept for the next flush
+    """
+    if Lease.enabled():
+        drop_lost_repositories(pending_words, pending_repositories, pending_counts or {})
+    if not pending_words and not pending_repositories:
+        return True
+    repositories = list(pending_repositories)
+
+    start = perf_counter()
+    operations = 0
+    written = False
+    try:
+        if Lease.enabled():
+            # the increments go through the journal, they are applied exactly once whichever node applies them;
+            # a flush that is not recorded is kept for the next one
+            operations = Journal.write(database_client, dict(pending_words), dict(pending_repositories))
+            pending_words.clear()
+            pending_repositories.clear()
+            if pending_counts is not None:
+                pending_counts.clear()
+        else:
+            # the committed batches leave the pending words and repositories, the others are written by the next flush
+            operations = write_operations(database_client, pending_words, pending_repositories)
+        # keep the index of mined repositories up to date
+        for document_id in repositories:
+            Registry.mark_repository_mined(document_id)
+        Metrics.increment('write', len(repositories))
+        # the leaderboard follows the written deltas, its document is written at most once per refresh interval
+        Leaderboard.publish(database_client)
+        written = True
+    except Exception as e:
+        logging.exception(f'Error while writing the words: {e}')
+    seconds = perf_counter() - start
+
+    statistics.update({'flushes': 1, 'operations': operations})
+    statistics['seconds'] += seconds
+    logging.info(f'Writer flushed {operations} operations in {seconds:.3f} seconds')
+    return written
+
+
+def drop_lost_repositories(pending_words, pending_repositories, pending_counts):
+    """
+    Take the repositories whose lease has been lost out of a flush, with their words: the node that reclaimed them
+    writes them, the other repositories of the flush are still written by this node
+    :param pending_words: word -> counter of deltas by language field
+    :param pending_repositories: repository document id -> fields
+    :param pending_counts: repository document id -> language field and counter of the words of the repository
+    :return: None
+    """
+    for document_id in Lease.lost(Lease.REPOSITORY, list(pending_repositories)):
+        logging.warning(f'{document_id} has been reclaimed by another node, it is left out of the flush')
+        field, word_count = pending_counts.pop(document_id, (None, {}))
+        if field is not None:
+            for word, delta in word_count.items():
+                pending_words[word][field] -= delta
+                if not any(pending_words[word].values()):
+                    del pending_words[word]
+        del pending_repositories[document_id]
+        Registry.forget_repository(document_id)
+
+
+def give_back_repositories(pending_words, pending_repositories, pending_counts):
+    """
+    Drop the repositories that can not be written with their words: they leave the index and in a distributed run their
+    lease is released, so they are mined again by this node or another one
+    :param pending_words: word -> counter of deltas by language field, emptied
+    :param pending_repositories: repository document id -> fields, emptied
+    :param pending_counts: repository document id -> language field and counter of the words of the repository, emptied
+    :return: None
+    """
+    for document_id in pending_repositories:
+        try:
+            Lease.release(Lease.REPOSITORY, document_id)
+        except Exception as e:
+            # the lease expires instead
+            logging.warning(f'Lease of {document_id} not released: {e}')
+        Registry.forget_repository(document_id)
+    pending_words.clear()
+    pending_repositories.clear()
+    pending_counts.clear()
+
+
+def write_operations(database_client, word_deltas, repositories):
+    """
+    Write the words and then the repositories with upserts, in batches of at most BATCH_LIMIT operations.
+    The words and the repositories of each committed batch are removed, so after an error only what is left is unwritten.
+    :param database_client: database client object
+    :param word_deltas: word -> counter of deltas by language field
+    :param repositories: repository document id -> fields
+    :return: number of operations written
+    """
+    # Get the collection reference for words
+    db_collection_words = database_client.collection(u'words')
+    # Get the collection reference for repositories
+    db_collection_repos = database_client.collection(u'repos')
+
+    # the repositories go last so they are only marked as mined once their words are written
+    keys = [(word_deltas, word) for word in word_deltas] + [(repositories, document_id) for document_id in repositories]
+    for i in range(0, len(keys), BATCH_LIMIT):
+        batch = database_client.batch()
+        # word -> document reference and deltas of the words of the batch
+        word_writes = {}
+        for pending, key in keys[i:i + BATCH_LIMIT]:
+            if pending is word_deltas:
+                # the hot words are written to one of their shards, the others to their document
+                deltas = {'value': sum(word_deltas[key].values()), **word_deltas[key]}
+                reference, fields = Sharding.word_operations(db_collection_words, key, deltas)
+                batch.set(reference, fields, merge=True)
+                word_writes[key] = (reference, deltas)
+            else:
+                batch.set(db_collection_repos.document(key), repositories[key], merge=True)
+        with Metrics.span('write_commit_seconds'):
+            batch.commit()
+        for word, (reference, deltas) in word_writes.items():
+            Sharding.written(word, reference, deltas)
+        written = {}
+        for pending, key in keys[i:i + BATCH_LIMIT]:
+            if pending is word_deltas:
+                written[key] = word_deltas[key]
+            del pending[key]
+        Leaderboard.update(database_client, written)
+    return len(keys)
+
+
+def recover_journal(database_client, force=False):
+    """
+    Apply the journal entries of the distributed run left by the stopped nodes, or by a failed application of this node
+    :param database_client: database client object
+    :param force: recover without waiting, at the end of the run
+    :return: None
+    """
+    try:
+        Journal.recover(database_client, force)
+    except Exception as e:
+        logging.exception(f'Error while recovering the journal: {e}')
+
+
+def rollup_shards(database_client, force=False):
+    """
+    Write the totals of the shards of the hot words back to their documents, at most once every rollup interval
+    :param database_client: database client object
+    :param force: roll up without waiting for the rollup interval, at the end of the run
+    :return: None
+    """
+    try:
+        Sharding.rollup(database_client, force)
+    except Exception as e:
+        logging.exception(f'Error while rolling up the shards: {e}')
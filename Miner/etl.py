@@ -1,14 +1,27 @@
 import argparse
+import logging
+import multiprocessing
 import shutil
 
 import firebase_admin
-from queue import Queue
-from threading import Thread
+from concurrent.futures import ProcessPoolExecutor
+from Inspector import Cache
 from Inspector import Extractor
-from Inspector import Processor
+from Inspector import Journal
+from Inspector import Leaderboard
+from Inspector import Lease
+from Inspector import Metrics
+from Inspector import Parser
+from Inspector import Partitioner
+from Inspector import Refresher
+from Inspector import Registry
+from Inspector import Scheduler
+from Inspector import Sharding
+from Inspector import Watchdog
 from datetime import timedelta, datetime
 from firebase_admin import credentials, firestore
 CLONING_REPO_PATH = './tmp'
+PARTITIONS = ('fixed', 'adaptive')
 
 
 def range_stars(start, stop, step):
@@ -66,31 +79,97 @@ def main():
     parser.add_argument('-l', '--lower_bound', required=False, help='Lower bound of the range of stars', type=int, default=300)
     parser.add_argument('-u', '--upper_bound', required=False, help='Upper bound of the range of stars', type=int, default=6000)
     parser.add_argument('-s', '--step', required=False, help='Step of the range of stars', type=int, default=10)
-    parser.add_argument('-j', '--java_parser', required=False, help='Select parser', type=str, default='javalang')
+    parser.add_argument('-j', '--java_parser', required=False, help='Select parser', type=str, default='javalang', choices=Parser.JAVA_PARSERS)
+    parser.add_argument('-p', '--python_parser', required=False, help='Select parser of the python files', type=str, default='ast', choices=Parser.PYTHON_PARSERS)
+    parser.add_argument('-w', '--parse-workers', required=False, help='Number of parsing processes (0 parses in the consumer threads)', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('-c', '--clone_mode', required=False, help='Clone mode', type=str, default='full', choices=Extractor.CLONE_MODES)
+    parser.add_argument('--parse_cache', required=False, help='Path of the parse cache database (empty disables the cache)', type=str, default=Cache.CACHE_PATH)
+    parser.add_argument('--parse_cache_entries', required=False, help='Maximum number of files in the parse cache', type=int, default=Cache.CACHE_ENTRIES)
+    parser.add_argument('--clone_workers', required=False, help='Number of clone threads', type=int, default=Scheduler.CLONE_WORKERS)
+    parser.add_argument('--consumers', required=False, help='Number of consumer threads', type=int, default=Scheduler.CONSUMERS)
+    parser.add_argument('--queue_size', required=False, help='Size of the queues between the stages', type=int, default=Scheduler.QUEUE_SIZE)
+    parser.add_argument('--report_seconds', required=False, help='Seconds between two throughput reports', type=int, default=Scheduler.REPORT_SECONDS)
+    parser.add_argument('--partition', required=False, help='Partition of the ranges of stars', type=str, default='fixed', choices=PARTITIONS)
+    parser.add_argument('--partition_plan', required=False, help='Path of the adaptive partition plan (empty does not save it)', type=str, default=Partitioner.PLAN_PATH)
+    parser.add_argument('--partition_max_age', required=False, help='Maximum age in days of a reusable partition plan', type=int, default=Partitioner.PLAN_MAX_AGE_DAYS)
+    parser.add_argument('--leaderboard_size', required=False, help='Number of words of each list of the leaderboard (0 disables it)', type=int, default=Leaderboard.LEADERBOARD_SIZE)
+    parser.add_argument('--leaderboard_seconds', required=False, help='Minimum seconds between two writes of the leaderboard', type=float, default=Leaderboard.REFRESH_SECONDS)
+    parser.add_argument('--max_shards', required=False, help='Maximum number of shards of a hot word (1 disables the sharding)', type=int, default=Sharding.MAX_SHARDS)
+    parser.add_argument('--rollup_seconds', required=False, help='Seconds between two rollups of the shards of the words', type=float, default=Sharding.ROLLUP_SECONDS)
+    parser.add_argument('--metrics_port', required=False, help='Port of the Prometheus metrics endpoint (0 disables it)', type=int, default=Metrics.METRICS_PORT)
+    parser.add_argument('--metrics_host', required=False, help='Address of the Prometheus metrics endpoint', type=str, default=Metrics.METRICS_HOST)
+    parser.add_argument('-r', '--refresh', required=False, help='Refresh the word counts of the mined repositories instead of mining new ones', action='store_true')
+    parser.add_argument('--refresh_workers', required=False, help='Number of repositories refreshed at the same time', type=int, default=Refresher.REFRESH_WORKERS)
+    parser.add_argument('--file_bytes', required=False, help='Maximum size in bytes of a parsed file (0 for no limit)', type=int, default=Watchdog.FILE_BYTES)
+    parser.add_argument('--file_seconds', required=False, help='Time budget in seconds of the parse of a file (0 for no limit)', type=float, default=Watchdog.FILE_SECONDS)
+    parser.add_argument('--keep_generated', required=False, help='Parse the generated and minified files', action='store_true')
+    parser.add_argument('-d', '--distributed', required=False, help='Share the ranges and the repositories with the other miners through leases', action='store_true')
+    parser.add_argument('--lease_store', required=False, help='Store of the leases of a distributed run', type=str, default='firestore', choices=Lease.LEASE_STORES)
+    parser.add_argument('--lease_path', required=False, help='Path of the SQLite store of the leases', type=str, default=Lease.LEASE_PATH)
+    parser.add_argument('--lease_seconds', required=False, help='Seconds a lease is valid without a heartbeat', type=float, default=Lease.LEASE_SECONDS)
+    parser.add_argument('--lease_run', required=False, help='Name of the distributed run shared by the miners, required by the distributed mode', type=str, default=None)
     args = parser.parse_args()
-
-    ran_stars = range_stars(args.lower_bound, args.upper_bound, args.step)
-
-    for ran_star in ran_stars:
-        try:
-            # create the shared queue
-            queue = Queue(maxsize=10)
-            # start the processor threads
-            processors = [Thread(target=Processor.process_repo, args=(queue, i, args.java_parser, database_client)) for i in range(2)]
-            for processor in processors:
-                processor.start()
-            # start the extractor thread
-            extractor = Thread(target=Extractor.mine_gh_api, args=(queue, ran_star, database_client))
-            extractor.start()
-            # wait for all threads to finish
-            extractor.join()
-            for processor in processors:
-                processor.join()
-        except Exception as e:
-            print(e)
-            continue
-        finally:
-            shutil.rmtree(CLONING_REPO_PATH)
+    if args.distributed and args.refresh:
+        parser.error('the refresh mode (-r) is not distributed')
+    if args.distributed and not args.lease_run:
+        parser.error('the distributed mode (-d) needs the name of the run shared by the miners (--lease_run)')
+
+    # serve the metrics of the run
+    Metrics.serve(args.metrics_port, args.metrics_host)
+
+    # open the parse cache, it is kept between runs
+    Cache.configure(args.parse_cache, args.parse_cache_entries)
+
+    # budgets of the parse of each file
+    Watchdog.configure(args.file_bytes, args.file_seconds, not args.keep_generated)
+
+    # create the process pool shared by the consumers, spawn avoids forking the gRPC threads of the Firestore client;
+    # it is replaced when a parsing process is killed by its budget
+    executor = None
+    if args.parse_workers > 0:
+        executor = Watchdog.RecyclingExecutor(lambda workers: ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=Parser.initialize_worker,
+            initargs=(args.parse_cache, args.parse_cache_entries, args.file_bytes, args.file_seconds, not args.keep_generated)),
+            args.parse_workers)
+
+    # load the index of mined repositories once, the search results are checked against it
+    Registry.load_mined_repositories(database_client)
+    # shards of the hot words, the shards left by a previous run are rolled up before the leaderboard is seeded
+    Sharding.configure(args.max_shards, args.rollup_seconds)
+    Sharding.recover(database_client)
+    # seed the leaderboard maintained by the writer
+    Leaderboard.configure(database_client, args.leaderboard_size, args.leaderboard_seconds)
+
+    if args.distributed:
+        # the leases share the work with the other miners, the increments recorded by the stopped ones are applied first
+        store = Lease.FirestoreLeases(database_client) if args.lease_store == 'firestore' else Lease.SqliteLeases(args.lease_path)
+        Lease.configure(store, args.lease_seconds, args.lease_run)
+        Journal.recover(database_client, force=True)
+
+    try:
+        if args.refresh:
+            # apply the changes of the mined repositories since they were mined
+            Refresher.run(database_client, args.java_parser, args.clone_mode, executor, args.refresh_workers, args.python_parser)
+        else:
+            match args.partition:
+                case 'adaptive':
+                    # ranges sized from the result counts of the search API, so no range is cut off by the search limit
+                    ran_stars = Partitioner.plan_ranges(args.lower_bound, args.upper_bound, args.partition_plan, args.partition_max_age)
+                case _:
+                    ran_stars = range_stars(args.lower_bound, args.upper_bound, args.step)
+            # run the pipeline over every range, the stages are kept alive between the ranges
+            Scheduler.run(ran_stars, database_client, args.java_parser, args.clone_mode, executor,
+                          args.clone_workers, args.consumers, args.queue_size, args.report_seconds, args.python_parser)
+    finally:
+        shutil.rmtree(CLONING_REPO_PATH, ignore_errors=True)
+        # give back the leases of the work left, the other miners take it
+        Lease.shutdown()
+
+    # stop the parsing processes
+    if executor is not None:
+        executor.shutdown()
+
+    logging.info(Cache.summary())
 
 
 # call main function
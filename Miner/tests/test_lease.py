@@ -0,0 +1,158 @@
+# checks of the leases of a distributed run against the in-memory Firestore
+import queue
+import collections
+import pytest
+from Inspector import Leaderboard
+from Inspector import Lease
+from Inspector import Registry
+from Inspector import Sharding
+from Inspector import Writer
+from Benchmark import Fakes
+
+# validity of the leases, the heartbeats do not run during a check
+LEASE_SECONDS = 1000.0
+RANGE = 'stars:1..1'
+
+
+@pytest.fixture
+def now():
+    return [0.0]
+
+
+@pytest.fixture
+def database_client(now):
+    database_client = Fakes.FakeFirestore()
+    Sharding.configure()
+    Leaderboard.configure(database_client, 0)
+    Lease.configure(Lease.FirestoreLeases(database_client, clock=lambda: now[0]), LEASE_SECONDS, 'check')
+    yield database_client
+    Lease.configure(None)
+
+
+def lease_state(database_client, kind, key):
+    fields, _ = database_client.documents.get(f'{Lease.LEASES_COLLECTION}/{Lease.document_id(Lease.lease_key(kind, key))}', (None, None))
+    return fields.get('state') if fields is not None else None
+
+
+def claim_range(repositories):
+    """
+    Claim a range and its repositories, then finish the search of the range
+    """
+    assert Lease.claim(Lease.RANGE, RANGE) == Lease.CLAIMED
+    for document_id in repositories:
+        assert Lease.claim(Lease.REPOSITORY, document_id) == Lease.CLAIMED
+    Lease.finish(Lease.RANGE, RANGE, [(Lease.REPOSITORY, document_id) for document_id in repositories])
+
+
+def mined(word_count, language='python'):
+    field = Writer.LANGUAGE_FIELDS[language]
+    return field, collections.Counter(word_count)
+
+
+def pending(repositories):
+    """
+    Aggregate the words of repositories like the writer, with their word counts kept for the leases lost before a flush
+    """
+    pending_words = collections.defaultdict(collections.Counter)
+    pending_repositories, pending_counts = {}, {}
+    for document_id, (field, word_count) in repositories.items():
+        for word, delta in word_count.items():
+            pending_words[word][field] += delta
+        pending_repositories[document_id] = {'name': document_id}
+        pending_counts[document_id] = (field, word_count)
+    return pending_words, pending_repositories, pending_counts
+
+
+def word_values(database_client):
+    return {path.split('/')[1]: fields.get('value', 0) for path, (fields, _) in database_client.documents.items()
+            if path.startswith('words/') and path.count('/') == 1}
+
+
+def test_range_is_done_once_its_repositories_are_written(database_client):
+    claim_range(['a', 'b'])
+    words, repositories, counts = pending({'a': mined({'get': 1}), 'b': mined({'get': 2})})
+    assert Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    assert lease_state(database_client, Lease.RANGE, RANGE) == Lease.DONE
+    assert Lease.unfinished(Lease.RANGE) == []
+    assert Lease.finishing(Lease.RANGE) == 0
+
+
+def test_range_is_not_done_when_a_repository_is_given_back(database_client):
+    claim_range(['a', 'b'])
+    # a failed clone of b
+    Lease.release(Lease.REPOSITORY, 'b')
+    assert Lease.finishing(Lease.RANGE) == 1
+    words, repositories, counts = pending({'a': mined({'get': 1})})
+    assert Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    # the range is given back to be searched again
+    assert lease_state(database_client, Lease.RANGE, RANGE) is None
+    assert Lease.unfinished(Lease.RANGE) == [RANGE]
+    assert Lease.claim(Lease.RANGE, RANGE) == Lease.CLAIMED
+
+
+def test_range_is_not_done_when_some_repositories_are_held_by_another_node(database_client):
+    assert Lease.claim(Lease.RANGE, RANGE) == Lease.CLAIMED
+    Lease.finish(Lease.RANGE, RANGE, (), complete=False)
+    assert lease_state(database_client, Lease.RANGE, RANGE) is None
+    assert Lease.unfinished(Lease.RANGE) == [RANGE]
+
+
+def test_failed_flush_keeps_the_repositories_and_their_leases(database_client):
+    claim_range(['a', 'b'])
+    words, repositories, counts = pending({'a': mined({'get': 1}), 'b': mined({'get': 2})})
+    database_client.failures = 1
+    assert not Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    assert set(repositories) == {'a', 'b'}
+    assert Lease.lost(Lease.REPOSITORY, ['a', 'b']) == []
+    assert Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    assert word_values(database_client) == {'get': 3}
+    assert lease_state(database_client, Lease.RANGE, RANGE) == Lease.DONE
+
+
+def test_lost_lease_only_leaves_out_its_repository(database_client, now):
+    claim_range(['a', 'b'])
+    # the lease of b expires and another node reclaims it
+    now[0] += 2 * LEASE_SECONDS
+    other = Lease.FirestoreLeases(database_client, clock=lambda: now[0])
+    assert other.acquire(Lease.lease_key(Lease.REPOSITORY, 'b'), 'other', LEASE_SECONDS)[0] == Lease.CLAIMED
+    words, repositories, counts = pending({'a': mined({'get': 1, 'set': 1}), 'b': mined({'get': 2})})
+    # the fence fails the first flush and finds the lost lease, the next one writes a alone
+    assert not Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    assert Lease.lost(Lease.REPOSITORY, ['a', 'b']) == ['b']
+    assert Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    assert word_values(database_client) == {'get': 1, 'set': 1}
+    assert {path for path in database_client.documents if path.startswith('repos/')} == {'repos/a'}
+    assert 'b' not in Registry._mined_repositories
+    # the range waited for b, which is not written by this node
+    assert lease_state(database_client, Lease.RANGE, RANGE) is None
+    assert Lease.unfinished(Lease.RANGE) == [RANGE]
+
+
+def test_leaderboard_holds_the_words_of_every_node(database_client):
+    Leaderboard.configure(database_client, 2)
+    # another node writes its words after this node seeded its leaderboard
+    database_client.collection('words').document('other').set({'value': 10, 'java_value': 10})
+    claim_range(['a'])
+    words, repositories, counts = pending({'a': mined({'get': 1})})
+    # the flush publishes the leaderboard
+    assert Writer.flush_words(database_client, words, repositories, collections.Counter(), counts)
+    fields, _ = database_client.documents['leaderboard/top']
+    assert fields['overall'] == [{'name': 'other', 'value': 10}, {'name': 'get', 'value': 1}]
+    assert fields['java'][0] == {'name': 'other', 'value': 10}
+
+
+def test_writer_gives_back_the_repositories_of_a_flush_that_keeps_failing(database_client, monkeypatch):
+    # every repository fills a batch, the flush before the next one has to be written
+    monkeypatch.setattr(Writer, 'BATCH_LIMIT', 1)
+    claim_range(['a', 'b'])
+    database_client.failures = 10 * Writer.FLUSH_ATTEMPTS
+    q = queue.Queue()
+    for document_id in ('a', 'b'):
+        q.put((document_id, 'python', collections.Counter({'get': 1}), {'name': document_id}))
+    q.put(None)
+    Writer.write_words(q, database_client, flush_seconds=0)
+    assert not [path for path in database_client.documents if path.startswith('repos/')]
+    assert Lease.lost(Lease.REPOSITORY, ['a', 'b']) == ['a', 'b']
+    # the range is given back to be searched again, its repositories are claimed again
+    assert Lease.unfinished(Lease.RANGE) == [RANGE]
+    assert Lease.claim(Lease.REPOSITORY, 'a') == Lease.CLAIMED
@@ -0,0 +1,121 @@
+# differential checks of the lexer extractors against the full parsers
+import collections
+from Inspector import Lexer
+from Benchmark import Lexer as LexerBenchmark
+
+PYTHON_SOURCES = {
+    'decorators': '''
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def cached(value):
+    return value
+
+
+@property
+@staticmethod
+def decorated(): pass
+
+
+class Model:
+    @classmethod
+    def create(cls, *args, **kwargs):
+        return cls()
+
+    @name.setter
+    def name(self, value):
+        self._name = value
+''',
+    'nested_and_async': '''
+async def fetch(session):
+    async def retry():
+        def backoff(attempt):
+            return 2 ** attempt
+        return backoff
+    return await retry()
+
+
+def outer():
+    def inner():
+        pass
+    callback = lambda x: x
+    return inner
+
+
+class Outer:
+    class Inner:
+        async def run(self):
+            pass
+''',
+    'strings_and_comments': """
+def documented():
+    '''
+def not_a_function():
+    '''
+    text = "def neither(): pass"  # def nor_this():
+    return text
+""",
+}
+
+JAVA_SOURCES = {
+    'generics': '''
+import java.util.*;
+
+public class Container<T extends Comparable<T>> {
+    private final List<Map<String, List<T>>> values = new ArrayList<>();
+
+    public <R extends Comparable<R>> List<R> map(Function<? super T, ? extends R> mapper) {
+        return Collections.<R>emptyList();
+    }
+
+    public static <K, V> Map<K, List<V>> group(Collection<V> items) throws IllegalStateException {
+        return new HashMap<>();
+    }
+
+    Map<String, int[]>[] arrays(int[][] matrix) {
+        return null;
+    }
+
+    public Container() {
+        super();
+    }
+}
+''',
+    'annotations': '''
+public abstract class Service implements Runnable {
+    @Override
+    public void run() {
+        execute(new Runnable() {
+            @Override public void run() { }
+        });
+    }
+
+    @SuppressWarnings("unchecked")
+    @Deprecated(since = "1.2")
+    protected abstract <T> T execute(@Nonnull Runnable task);
+
+    @Inject
+    private void setDependency(final Dependency dependency) { }
+
+    interface Callback {
+        @Nullable String call(int code);
+    }
+}
+''',
+}
+
+
+def compare(sources, extension):
+    for name, source in sources.items():
+        # the constructs of the sources are handled by the lexer, not left to the full parser
+        names = Lexer.python_function_names(source) if extension == '.py' else Lexer.java_method_names(source)
+        assert collections.Counter(names) == collections.Counter(LexerBenchmark.reference_names(source, extension)), name
+
+
+def test_python_lexer_matches_ast():
+    compare(PYTHON_SOURCES, '.py')
+
+
+def test_java_lexer_matches_javalang():
+    compare(JAVA_SOURCES, '.java')
@@ -0,0 +1,38 @@
+# checks of the incremental refresh of the mined repositories
+import asyncio
+import collections
+from Inspector import Refresher
+
+BASE = 'a' * 40
+HEAD = 'b' * 40
+
+
+class CompareClient:
+    """
+    Stand-in of the GitHub API client answering the compare of two commits
+    """
+
+    def __init__(self, status, files):
+        self.response = {'status': status, 'files': files}
+        self.paths = []
+
+    async def request(self, path):
+        self.paths.append(path)
+        return self.response
+
+
+def diff(client):
+    return asyncio.run(Refresher.diff_changed_files(client, 'owner/repository', BASE, HEAD, '.py', 'ast'))
+
+
+def test_diverged_commits_are_parsed_again():
+    for status in ('diverged', 'behind'):
+        client = CompareClient(status, [{'filename': 'module.py', 'status': 'modified'}])
+        # a force push: the changed files are compared from the merge base, not from the mined commit
+        assert diff(client) is None
+        assert client.paths == [f'/repos/owner/repository/compare/{BASE}...{HEAD}']
+
+
+def test_commits_ahead_are_diffed():
+    client = CompareClient('ahead', [{'filename': 'README.md', 'status': 'modified'}])
+    assert diff(client) == collections.Counter()
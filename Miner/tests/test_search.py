@@ -0,0 +1,115 @@
+# checks of the search client against the local GitHub stub
+import asyncio
+import pytest
+from Inspector import Search
+from Benchmark import Stubs
+
+
+@pytest.fixture
+def stub():
+    stub = Stubs.GitHubStub(rate_limit=1000).start()
+    yield stub
+    stub.stop()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """
+    Record the waits of the client instead of sleeping
+    """
+    recorded = []
+    sleep = asyncio.sleep
+
+    async def record(seconds):
+        recorded.append(seconds)
+        await sleep(0)
+
+    monkeypatch.setattr(Search.asyncio, 'sleep', record)
+    return recorded
+
+
+async def collect_pages(client, queries):
+    return [page async for page in client.iterate_pages(queries)]
+
+
+def test_every_page_of_a_query(stub):
+    stub.total_count = lambda query: 250
+    client = Search.SearchClient(None, stub.url)
+    pages = asyncio.run(collect_pages(client, ['stars:1..1']))
+    assert [len(items) for _, items in pages] == [100, 100, 50]
+    assert len({item['full_name'] for _, items in pages for item in items}) == 250
+    assert client.statistics['pages'] == 3
+
+
+def test_pages_stop_at_the_results_limit(stub):
+    stub.total_count = lambda query: 5000
+    client = Search.SearchClient(None, stub.url)
+    pages = asyncio.run(collect_pages(client, ['stars:1..1']))
+    assert sum(len(items) for _, items in pages) == Search.SEARCH_RESULTS_LIMIT
+
+
+def test_rate_limit_is_paced_without_rejections():
+    stub = Stubs.GitHubStub(total_count=lambda query: 300, rate_limit=3, window_seconds=1).start()
+    try:
+        client = Search.SearchClient(None, stub.url)
+        pages = asyncio.run(collect_pages(client, ['stars:1..1', 'stars:2..2']))
+    finally:
+        stub.stop()
+    assert len(pages) == 6
+    assert stub.rejected == 0
+    assert client.statistics['waits'] >= 1
+    assert client.statistics['rate_limited'] == 0
+
+
+def test_rate_limited_response_waits_for_retry_after(stub, sleeps):
+    stub.fail(429, retry_after=7)
+    client = Search.SearchClient(None, stub.url)
+    response = asyncio.run(client.search_repositories('stars:1..1'))
+    assert len(response['items']) == 100
+    assert sleeps == [7.0]
+    assert client.statistics['rate_limited'] == 1
+    assert client.statistics['requests'] == 2
+
+
+def test_rate_limited_response_waits_for_the_reset(stub, sleeps):
+    stub.fail(403)
+    client = Search.SearchClient(None, stub.url)
+    asyncio.run(client.search_repositories('stars:1..1'))
+    # nothing is known of the window before the first response, the client waits one second
+    assert sleeps == [1]
+    assert client.statistics['rate_limited'] == 1
+
+
+def test_server_errors_are_retried_with_backoff(stub, sleeps):
+    stub.fail(502, count=2)
+    client = Search.SearchClient(None, stub.url)
+    response = asyncio.run(client.search_repositories('stars:1..1'))
+    assert response['total_count'] == Stubs.TOTAL_COUNT
+    assert sleeps == [1, 2]
+
+
+def test_request_gives_up_after_max_attempts(stub, sleeps):
+    stub.fail(500, count=Search.MAX_ATTEMPTS)
+    client = Search.SearchClient(None, stub.url)
+    with pytest.raises(RuntimeError, match='attempts'):
+        asyncio.run(client.search_repositories('stars:1..1'))
+    assert len(sleeps) == Search.MAX_ATTEMPTS
+    assert stub.requests == 0
+
+
+def test_client_errors_are_not_retried(stub, sleeps):
+    stub.fail(422)
+    client = Search.SearchClient(None, stub.url)
+    with pytest.raises(RuntimeError, match='422'):
+        asyncio.run(client.search_repositories('stars:1..1'))
+    assert sleeps == []
+    assert client.statistics['requests'] == 1
+
+
+def test_failing_query_is_skipped(stub, sleeps):
+    stub.total_count = lambda query: 50
+    stub.fail(422)
+    client = Search.SearchClient(None, stub.url)
+    pages = asyncio.run(collect_pages(client, ['stars:1..1', 'stars:2..2']))
+    assert [query for query, _ in pages] == ['stars:2..2']
+    assert stub.queries == ['stars:2..2']
@@ -0,0 +1,76 @@
+# checks of the sharded counters of the words against the in-memory Firestore
+import collections
+import pytest
+from Inspector import Journal
+from Inspector import Leaderboard
+from Inspector import Sharding
+from Inspector import Writer
+from Benchmark import Fakes
+
+# words written to their shards
+HOT_WORDS = ('get', 'set', 'init')
+
+
+@pytest.fixture
+def database_client():
+    # every word is hot enough for the most shards
+    Sharding.configure(max_shards=4, rollup_seconds=0, writes_per_second=0.001, clock=lambda: 0.0)
+    database_client = Fakes.FakeFirestore()
+    Leaderboard.configure(database_client, 0)
+    yield database_client
+    Sharding.configure()
+
+
+def pending(words):
+    pending_words = collections.defaultdict(collections.Counter)
+    for word in words:
+        pending_words[word]['python_value'] += 1
+    return pending_words
+
+
+def word_values(database_client):
+    return {path.split('/')[1]: fields.get('value', 0) for path, (fields, _) in database_client.documents.items()
+            if path.count('/') == 1}
+
+
+def shard_values(database_client):
+    return [fields.get('value', 0) for path, (fields, _) in database_client.documents.items()
+            if f'/{Sharding.SHARDS_COLLECTION}/' in path]
+
+
+def test_hot_words_are_rolled_up_into_their_documents(database_client):
+    statistics = collections.Counter()
+    for _ in range(5):
+        assert Writer.flush_words(database_client, pending(HOT_WORDS), {}, statistics)
+    assert any(shard_values(database_client))
+    assert all(Sharding.undrained(word, 'value') == 5 for word in HOT_WORDS)
+    assert Sharding.rollup(database_client, force=True) == len(HOT_WORDS)
+    assert word_values(database_client) == {word: 5 for word in HOT_WORDS}
+    assert not any(shard_values(database_client))
+    assert all(Sharding.undrained(word, 'value') == 0 for word in HOT_WORDS)
+
+
+def test_failed_flush_leaves_nothing_to_roll_up(database_client):
+    statistics = collections.Counter()
+    pending_words = pending(HOT_WORDS)
+    database_client.failures = 1
+    assert not Writer.flush_words(database_client, pending_words, {}, statistics)
+    assert all(Sharding.undrained(word, 'value') == 0 for word in HOT_WORDS)
+    # the deltas are kept and written once by the next flush
+    assert Writer.flush_words(database_client, pending_words, {}, statistics)
+    assert all(Sharding.undrained(word, 'value') == 1 for word in HOT_WORDS)
+    Sharding.rollup(database_client, force=True)
+    assert word_values(database_client) == {word: 1 for word in HOT_WORDS}
+
+
+def test_applied_journal_entry_leaves_nothing_to_roll_up(database_client):
+    deltas = {word: collections.Counter({'java_value': 2}) for word in HOT_WORDS}
+    reference = database_client.collection(Journal.JOURNAL_COLLECTION).document()
+    reference.set({'node': 'node', 'deltas': b''})
+    assert Journal.apply_entry(database_client, reference, deltas) == len(HOT_WORDS) + 1
+    # another application fails on the precondition of the deleted entry
+    assert Journal.apply_entry(database_client, reference, deltas) == 0
+    assert all(Sharding.undrained(word, 'value') == 2 for word in HOT_WORDS)
+    Sharding.rollup(database_client, force=True)
+    assert word_values(database_client) == {word: 2 for word in HOT_WORDS}
+    assert not any(shard_values(database_client))
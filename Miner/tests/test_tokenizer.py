@@ -0,0 +1,33 @@
+# differential checks of the identifier tokenizer against the functions of the parser
+import collections
+from Inspector import Tokenizer
+from Benchmark import Tokenizer as TokenizerBenchmark
+
+# identifiers at the edges of the naming conventions
+EDGE_IDENTIFIERS = (
+    # leading, trailing and repeated underscores
+    '_private', '__init__', '__name', '_', '___', 'trailing_', 'double__underscore', '_camelCase', '__Pascal',
+    # digits
+    'x2', 'get2Items', 'utf8_decode', 'utf8Decode', 'v2_api', 'sha256', 'md5Hash', 'item_1', 'item1_value', 'a1B2c3',
+    # all caps
+    'MAX_SIZE', 'ABC', 'A', 'HTTP', 'IO_ERROR', 'X_1',
+    # mixed acronyms
+    'HTTPServer', 'parseHTTPResponse', 'getURLForID', 'XMLHttpRequest', 'ioError', 'IOError', 'toJSON', 'is_HTTP_ok',
+    'getHTTP2Stream', 'aB', 'Ab', 'snake_Case', 'camelCase', 'PascalCase', 'lower',
+)
+
+
+def test_edge_identifiers_match_the_parser():
+    assert TokenizerBenchmark.differential_check(EDGE_IDENTIFIERS) == []
+
+
+def test_generated_identifiers_match_the_parser():
+    assert TokenizerBenchmark.differential_check(TokenizerBenchmark.generate_identifiers(2000)) == []
+
+
+def test_counted_words_match_the_parser():
+    for extension in ('.py', '.java'):
+        expected = collections.Counter(TokenizerBenchmark.reference_count_words(EDGE_IDENTIFIERS, extension))
+        assert Tokenizer.count_words(EDGE_IDENTIFIERS, extension) == expected
+        for identifier in EDGE_IDENTIFIERS:
+            assert list(Tokenizer.split_identifier(identifier, extension)) == TokenizerBenchmark.reference_count_words([identifier], extension)
@@ -0,0 +1,111 @@
+# checks of the budgets of the parse of each file
+import io
+import os
+import time
+import tarfile
+import signal
+import threading
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from Inspector import Parser
+from Inspector import Watchdog
+
+# file killing the parsing process that reads it
+POISON = 'poison'
+
+
+def parse_chunk(files):
+    """
+    Stand-in of the parse of a chunk in a parsing process, each file counts one word
+    """
+    words = collections.Counter()
+    for file in files:
+        if file == POISON:
+            os.kill(os.getpid(), signal.SIGKILL)
+        # the chunks of the consumers are parsed at the same time
+        time.sleep(0.2)
+        words[file] += 1
+    return words, collections.Counter({'files': len(files)})
+
+
+def test_a_killed_process_only_skips_its_file():
+    executor = Watchdog.RecyclingExecutor(
+        lambda workers: ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')), 2)
+    chunks = {'innocent': ['a', 'b', 'c'], 'guilty': ['d', POISON]}
+    futures = {name: executor.submit(parse_chunk, chunk) for name, chunk in chunks.items()}
+    results = {}
+
+    def consume(name):
+        results[name] = Watchdog.result_or_retry(executor, futures[name], parse_chunk, chunks[name], ())
+
+    # both consumers share the pool broken by the poisoned file
+    threads = [threading.Thread(target=consume, args=(name,)) for name in chunks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    executor.shutdown()
+
+    words, statistics = results['innocent']
+    assert words == collections.Counter({'a': 1, 'b': 1, 'c': 1})
+    assert statistics['skipped_files'] == 0
+    words, statistics = results['guilty']
+    assert words == collections.Counter({'d': 1})
+    assert statistics[('skipped', 'killed', POISON)] == 1
+    assert statistics['skipped_files'] == 1
+    assert executor.recycled >= 1
+
+
+def test_license_headers_are_not_generated():
+    Watchdog.configure()
+    license_header = (b'# Copyright 2020 The Authors. Licensed under the Apache License, Version 2.0.\n'
+                      b'# Documentation generated by Sphinx is published separately. DO NOT EDIT the header of this file.\n')
+    assert Watchdog.check_source(license_header + b'def run():\n    pass\n') is None
+
+
+def test_generator_banners_are_generated():
+    Watchdog.configure()
+    for header in (b'# -*- coding: utf-8 -*-\n# Generated by the protocol buffer compiler.  DO NOT EDIT!\n',
+                   b'// Code generated by mockery v2.20.0. DO NOT EDIT.\n',
+                   b'// Generated from Expr.g4 by ANTLR 4.13.1\n',
+                   b'# Generated by Django 4.2.1 on 2023-05-01 10:00\n',
+                   b'/**\n * @generated\n */\n'):
+        assert Watchdog.check_source(header + b'class A {}\n') == 'generated'
+
+
+def test_batch_budget_follows_the_progress_of_the_batch():
+    Watchdog.configure(file_seconds=0.3)
+    killed = threading.Event()
+    budget = Watchdog.batch_budget(killed.set)
+    # each file is parsed within its budget, the batch lasts longer than the budget of one file
+    for _ in range(5):
+        time.sleep(0.1)
+        budget.progress()
+    assert not killed.is_set()
+    # no file parsed within the budget of a file
+    assert killed.wait(1)
+    assert budget.expired
+    budget.cancel()
+    Watchdog.configure()
+
+
+def test_archive_members_over_the_size_budget_are_not_read(monkeypatch):
+    Watchdog.configure(file_bytes=100)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, content in (('repository/small.py', b'def run():\n    pass\n'), ('repository/large.py', b'#' * 1000)):
+            member = tarfile.TarInfo(name)
+            member.size = len(content)
+            archive.addfile(member, io.BytesIO(content))
+    extracted = []
+    extractfile = tarfile.TarFile.extractfile
+    monkeypatch.setattr(tarfile.TarFile, 'extractfile', lambda self, member: extracted.append(member.name) or extractfile(self, member))
+    buffer.seek(0)
+    statistics = collections.Counter()
+    with tarfile.open(fileobj=buffer, mode='r|gz') as archive:
+        sources = list(Parser.iterate_sources_of_archive(archive, '.py', statistics))
+    Watchdog.configure()
+    assert [name for name, _ in sources] == ['repository/small.py']
+    assert extracted == ['repository/small.py']
+    assert statistics[('skipped', 'size', 'repository/large.py')] == 1
@@ -0,0 +1,43 @@
+# checks of the write-behind writer against the in-memory Firestore
+import collections
+from time import sleep
+from Inspector import Leaderboard
+from Inspector import Sharding
+from Inspector import Writer
+from Benchmark import Fakes
+
+# seconds between two flushes of the writer
+FLUSH_SECONDS = 0.2
+
+
+class SteadyQueue:
+    """
+    Stand-in of the queue of the writer fed faster than the time threshold: an item is always ready before the timeout
+    """
+
+    def __init__(self, items, database_client):
+        self.items = list(items)
+        self.database_client = database_client
+        # repository documents written before the stop of the writer
+        self.written = None
+
+    def get(self, timeout=None):
+        sleep(FLUSH_SECONDS / 20)
+        if self.items:
+            return self.items.pop(0)
+        self.written = [path for path in self.database_client.documents if path.startswith('repos/')]
+        return None
+
+
+def test_steady_items_are_flushed_by_the_time_threshold():
+    database_client = Fakes.FakeFirestore()
+    Sharding.configure()
+    Leaderboard.configure(database_client, 0)
+    items = [(f'owner/repository{index}', 'python', collections.Counter({'get': 1}), {'name': f'owner/repository{index}'})
+             for index in range(100)]
+    q = SteadyQueue(items, database_client)
+    Writer.write_words(q, database_client, 10 ** 6, FLUSH_SECONDS)
+    # the items of about 4 time thresholds are written before the final flush
+    assert len(q.written) >= 50
+    fields, _ = database_client.documents['words/get']
+    assert fields['value'] == 100
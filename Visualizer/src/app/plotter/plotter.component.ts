@@ -1,5 +1,5 @@
 import { Component, OnInit } from '@angular/core';
-import { firestoreWords } from 'src/common/networking/firebase';
+import { firestoreLeaderboard } from 'src/common/networking/firebase';
 
 @Component({
   selector: 'app-plotter',
@@ -16,9 +16,9 @@ export class PlotterComponent implements OnInit {
 ngOnInit(): void {
 
   
-  firestoreWords.limit(36).orderBy('value', 'desc').onSnapshot(snapshot => {
+  firestoreLeaderboard.onSnapshot(doc => {
     
-    this.single = snapshot.docs.map(doc => doc.data());
+    this.single = doc.data()?.overall ?? [];
 
   });
 
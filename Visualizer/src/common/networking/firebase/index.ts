@@ -19,10 +19,12 @@ const firebaseInterfaces = (() => {
     return {
         firestore: 
         {
-            firestoreWordsCollection: firestoreDb.collection('words')
+            firestoreWordsCollection: firestoreDb.collection('words'),
+            firestoreLeaderboardDocument: firestoreDb.collection('leaderboard').doc('top')
         },
         storage: storageRef,
     };
 })();
 
 export const firestoreWords = firebaseInterfaces.firestore.firestoreWordsCollection;
+export const firestoreLeaderboard = firebaseInterfaces.firestore.firestoreLeaderboardDocument;